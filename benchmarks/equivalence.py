@@ -0,0 +1,326 @@
+"""
+Numerical-equivalence checks: each reference implementation (benchmarks/reference.py for the
+loops that were vectorized) against its fast paths, on the same synthetic match (or the legacy
+stubs). No weights and no GPU are needed.
+
+    python -m benchmarks.equivalence
+    python -m benchmarks.equivalence --frames 20000 --report data/output/equivalence.json
+    python -m benchmarks.equivalence --only physics_streaming ball_kalman
+
+Every check reports, per output field, how many values it compared, how many exist in only
+one of the outputs (or are NaN in only one), and the max / mean / 95th-percentile absolute
+deviation of the rest. A check passes when every field is within the check's tolerances
+(EQUIVALENCE_TOLERANCES, overridable under `equivalence.tolerances` in config.yaml). The
+command exits with status 1 if any check fails.
+"""
+
+import argparse
+import json
+import os
+import numpy as np
+from utils.logger import logger
+from utils.config_loader import cfg
+from utils.track_file import tracks_from_legacy_stubs
+from utils.track_store import to_columnar, to_frames
+from core.trackers import Tracker, BallKalmanTracker
+from core.annotation import MiniCourt
+from core.analysis.physics import PhysicsEngine
+from core.detection.court_decoder import CourtHeatmapDecoder
+from benchmarks.synthetic import SyntheticCourt, synthetic_tracks, stub_tracks
+from benchmarks.reference import reference_mini_court_positions, reference_speed_and_distance
+from constants import (
+    BENCHMARK_FRAME_SIZE,
+    BALL_KALMAN_LAG,
+    STREAM_CHUNK_SIZE,
+    STREAM_LOOKAHEAD,
+    STREAM_CONTEXT,
+    EQUIVALENCE_FRAMES,
+    EQUIVALENCE_HEATMAPS,
+    EQUIVALENCE_HEATMAP_SIGMA,
+    EQUIVALENCE_TRUTH_RADIUS,
+    EQUIVALENCE_DEFAULT_TOLERANCE,
+    EQUIVALENCE_BALL_KALMAN_STUB_TOLERANCE,
+    EQUIVALENCE_TOLERANCES
+)
+
+METRICS = ("max_abs", "mean_abs", "p95_abs", "mismatch_ratio")
+
+
+class EquivalenceHarness:
+    def __init__(self, num_frames=EQUIVALENCE_FRAMES, seed=0, stubs=None, tolerances=None):
+        """stubs: (player_stub, ball_stub) paths to check on instead of a synthetic match.
+        tolerances: per-check overrides of EQUIVALENCE_TOLERANCES ({check: {metric: limit}})."""
+        self.court = SyntheticCourt(BENCHMARK_FRAME_SIZE)
+        self.seed = seed
+        defaults = dict(EQUIVALENCE_TOLERANCES)
+        if stubs:
+            self.players, self.ball = stub_tracks(num_frames, *stubs)
+            self.ball_truth = None
+            defaults["ball_kalman"] = EQUIVALENCE_BALL_KALMAN_STUB_TOLERANCE
+        else:
+            self.players, self.ball, self.ball_truth = synthetic_tracks(num_frames, self.court, seed=seed, ball_truth=True)
+        self.fps = cfg.get('video', {}).get('fps', 24.0)
+        self.lag = cfg.get('ball_tracking', {}).get('lag', BALL_KALMAN_LAG)
+        self.tolerances = {**defaults, **(tolerances or {})}
+        self._frame = np.zeros((self.court.height, self.court.width, 3), dtype=np.uint8)
+
+        self.checks = {
+            "ball_array": self._check_ball_array,
+            "ball_kalman": self._check_ball_kalman,
+            "ball_kalman_online": self._check_ball_kalman_online,
+            "physics_reference": self._check_physics_reference,
+            "physics_streaming": self._check_physics_streaming,
+            "mini_court_keypoint_reference": self._check_mini_court_reference,
+            "court_peak": lambda: self._check_court_decoder(subpixel=False),
+            "court_peak_subpixel": lambda: self._check_court_decoder(subpixel=True),
+        }
+        for method in ("keypoint", "homography"):
+            self.checks[f"mini_court_{method}_streaming"] = lambda method=method: self._check_mini_court_streaming(method)
+
+    def run(self, only=None):
+        """Runs the checks (all, or those named in `only`). Returns {check: result}."""
+        names = only or list(self.checks)
+        unknown = set(names) - set(self.checks)
+        if unknown:
+            raise ValueError(f"Unknown equivalence checks {sorted(unknown)}, expected some of {sorted(self.checks)}")
+        return {name: self.run_check(name) for name in names}
+
+    def run_check(self, name):
+        reference, candidate, description = self.checks[name]()
+        tolerance = self.tolerances.get(name, EQUIVALENCE_DEFAULT_TOLERANCE)
+        fields = {field: compare_values(reference[field], candidate.get(field, {}), tolerance) for field in reference}
+        passed = all(stats["passed"] for stats in fields.values())
+
+        logger.info(f"[equivalence] {'PASS' if passed else 'FAIL'} {name}: {description}")
+        for field, stats in fields.items():
+            log = logger.info if stats["passed"] else logger.warning
+            failed = f" <- over tolerance: {', '.join(stats['failed_on'])}" if stats["failed_on"] else ""
+            log(f"[equivalence]     {field:<28} {stats['compared']:>7} compared, {stats['mismatched']:>5} mismatched | "
+                f"max {stats['max_abs']:.3g}, mean {stats['mean_abs']:.3g}, p95 {stats['p95_abs']:.3g}{failed}")
+        return {"description": description, "passed": passed, "tolerance": tolerance, "fields": fields}
+
+    # --- Inputs ---
+    def _raw_ball(self):
+        return tracks_from_legacy_stubs([], self.ball)["ball"]
+
+    def _ball_array(self):
+        positions = np.full((len(self.ball), 4), np.nan)
+        for frame_num, ball_dict in enumerate(self.ball):
+            if 1 in ball_dict:
+                positions[frame_num] = ball_dict[1]
+        return positions
+
+    def _prepared_tracks(self, projected=False):
+        """Fresh legacy-layout tracks as the batch pipeline has them before projection (or, if projected, before physics)."""
+        tracks = tracks_from_legacy_stubs(self.players, self.ball)
+        tracks["ball"] = Tracker(ball_filter="interpolate").interpolate_ball_positions(tracks["ball"])
+        tracker = Tracker()
+        tracks = tracker.add_position_to_tracks(tracker.choose_and_filter_players(self.court.keypoints, tracks))
+        self.chosen_players = tracker.chosen_players
+        if projected:
+            MiniCourt(self._frame).convert_bounding_boxes_to_mini_court_coordinates(tracks, self.court.keypoints)
+        return tracks
+
+    def _windows(self, num_frames):
+        """(context_start, emit_start, stop) of each window the streaming pipeline finalizes."""
+        for emit_start in range(0, num_frames, STREAM_CHUNK_SIZE):
+            yield max(0, emit_start - STREAM_CONTEXT), emit_start, min(num_frames, emit_start + STREAM_CHUNK_SIZE + STREAM_LOOKAHEAD)
+
+    # --- Checks: each returns (reference fields, candidate fields, description) ---
+    def _check_ball_array(self):
+        reference = Tracker(ball_filter="interpolate").interpolate_ball_positions(self._raw_ball())
+        candidate = Tracker.interpolate_ball_array(self._ball_array())
+        return ({"ball.bbox": _frame_values(reference)}, {"ball.bbox": _array_values(candidate)},
+                "interpolate_ball_positions (per-frame dicts) vs. interpolate_ball_array (the tracker's array path)")
+
+    def _check_ball_kalman(self):
+        reference = _frame_values(Tracker(ball_filter="interpolate").interpolate_ball_positions(self._raw_ball()))
+        candidate = _frame_values(Tracker(ball_filter="kalman").interpolate_ball_positions(self._raw_ball()))
+        if self.ball_truth is None:
+            return ({"ball.bbox": reference}, {"ball.bbox": candidate},
+                    "pandas interpolation vs. the Kalman smoother (different models: statistical agreement, all frames)")
+
+        # Only where pandas is right: elsewhere it is following a false positive, and disagreeing is the point
+        frames = [frame_num for frame_num, box in reference.items()
+                  if np.abs(np.asarray(box) - self.ball_truth[frame_num]).max() <= EQUIVALENCE_TRUTH_RADIUS]
+        return ({"ball.bbox": {frame_num: reference[frame_num] for frame_num in frames}},
+                {"ball.bbox": {frame_num: candidate[frame_num] for frame_num in frames if frame_num in candidate}},
+                f"pandas interpolation vs. the Kalman smoother, on the {len(frames)}/{len(reference)} frames where "
+                f"pandas is within {EQUIVALENCE_TRUTH_RADIUS:g}px of the true ball")
+
+    def _check_ball_kalman_online(self):
+        reference = BallKalmanTracker().smooth_array(self._ball_array())
+        ball_filter = BallKalmanTracker(lag=self.lag)
+        candidate = []
+        for box in self._ball_array():
+            candidate += ball_filter.update(None if np.isnan(box[0]) else box)
+        candidate += ball_filter.flush()
+        candidate = np.array([np.full(4, np.nan) if box is None else box for box in candidate])
+        return ({"ball.bbox": _array_values(reference)}, {"ball.bbox": _array_values(candidate)},
+                f"offline RTS smoother vs. online fixed-lag smoother (lag {self.lag})")
+
+    def _check_mini_court_reference(self):
+        reference = reference_mini_court_positions(MiniCourt(self._frame), self._prepared_tracks(), self.court.keypoints)
+        candidate = MiniCourt(self._frame, "keypoint").convert_bounding_boxes_to_mini_court_coordinates(
+            to_columnar(self._prepared_tracks()), self.court.keypoints)
+        return (_track_values(reference, "mini_court_position"), _track_values(candidate, "mini_court_position"),
+                "keypoint projection: original per-frame loop vs. the batched pass (TrackStore)")
+
+    def _check_mini_court_streaming(self, method):
+        reference = MiniCourt(self._frame, method).convert_bounding_boxes_to_mini_court_coordinates(
+            self._prepared_tracks(), self.court.keypoints)
+        candidate = self._prepared_tracks()
+        mini_court = MiniCourt(self._frame, method)
+        # The windows share the frame dicts, so each one writes its frames straight into candidate
+        for context_start, emit_start, stop in self._windows(len(candidate["players"])):
+            window = {obj: frames[context_start:stop] for obj, frames in candidate.items()}
+            mini_court.convert_bounding_boxes_to_mini_court_coordinates(
+                window, self.court.keypoints, start_frame=emit_start - context_start, player_ids=self.chosen_players)
+        return (_track_values(reference, "mini_court_position"), _track_values(candidate, "mini_court_position"),
+                f"{method} projection: whole match vs. streaming windows "
+                f"({STREAM_CHUNK_SIZE} frames + {STREAM_CONTEXT} context + {STREAM_LOOKAHEAD} lookahead)")
+
+    def _check_physics_reference(self):
+        width = MiniCourt(self._frame).court_drawing_width
+        reference = reference_speed_and_distance(self._prepared_tracks(projected=True), self.fps, width)
+        candidate = PhysicsEngine(self.fps, width).add_speed_and_distance_to_tracks(
+            to_columnar(self._prepared_tracks(projected=True)))
+        return (_physics_values(reference), _physics_values(candidate),
+                "speed & distance: original per-frame loop vs. the vectorized core (TrackStore)")
+
+    def _check_physics_streaming(self):
+        width = MiniCourt(self._frame).court_drawing_width
+        reference = PhysicsEngine(self.fps, width).add_speed_and_distance_to_tracks(self._prepared_tracks(projected=True))
+        candidate = self._prepared_tracks(projected=True)
+        physics = PhysicsEngine(self.fps, width)
+        for context_start, emit_start, _ in self._windows(len(candidate["players"])):
+            emitted = {"players": candidate["players"][context_start:emit_start + STREAM_CHUNK_SIZE]}
+            physics.add_speed_and_distance_to_tracks(emitted, start_frame=emit_start - context_start)
+        return (_physics_values(reference), _physics_values(candidate),
+                "speed & distance: whole match vs. streaming windows with carried running totals")
+
+    def _check_court_decoder(self, subpixel):
+        reference, candidate = {}, {}
+        hough = CourtHeatmapDecoder("hough")
+        peak = CourtHeatmapDecoder("peak", subpixel=subpixel)
+        rng = np.random.default_rng(self.seed)
+        scale = np.array([self.court.width / CourtHeatmapDecoder.INPUT_WIDTH,
+                          self.court.height / CourtHeatmapDecoder.INPUT_HEIGHT])
+        for image in range(EQUIVALENCE_HEATMAPS):
+            heatmaps = _synthetic_heatmaps(self.court.keypoints.reshape(-1, 2) / scale, rng)
+            # Keypoints in video pixels, as predict_batch returns them
+            for values, decoder in ((reference, hough), (candidate, peak)):
+                points = decoder.decode_heatmaps(heatmaps[None])[0] * scale
+                values.update({(image, kps_num): point for kps_num, point in enumerate(points)})
+        mode = "sub-pixel centroid" if subpixel else "integer argmax"
+        return ({"court.keypoints": reference}, {"court.keypoints": candidate},
+                f"court heatmap decoding: HoughCircles vs. batched peak ({mode})")
+
+
+def _synthetic_heatmaps(points, rng):
+    """(14, H, W) sigmoid-like heatmaps with a Gaussian blob per keypoint (court view jittered, a few keypoints missing)."""
+    height, width = CourtHeatmapDecoder.INPUT_HEIGHT, CourtHeatmapDecoder.INPUT_WIDTH
+    centers = points + rng.normal(0, 15, 2) + rng.normal(0, 1.0, points.shape)
+    visible = rng.random(len(points)) > 0.1
+    ys, xs = np.mgrid[0:height, 0:width].astype(np.float32)
+    heatmaps = rng.uniform(0, 0.1, (len(points), height, width)).astype(np.float32)
+    for kps_num, (cx, cy) in enumerate(centers):
+        if visible[kps_num]:
+            blob = np.exp(-((xs - cx) ** 2 + (ys - cy) ** 2) / (2 * EQUIVALENCE_HEATMAP_SIGMA ** 2))
+            np.maximum(heatmaps[kps_num], blob, out=heatmaps[kps_num])
+    return heatmaps
+
+
+def _frame_values(ball_frames):
+    """{frame: bbox} from per-frame ball dicts."""
+    return {frame_num: ball_dict[1]["bbox"] for frame_num, ball_dict in enumerate(ball_frames) if 1 in ball_dict}
+
+
+def _array_values(ball_positions):
+    """{frame: bbox} from an (n, 4) array (NaN = no ball)."""
+    return {frame_num: box for frame_num, box in enumerate(ball_positions) if not np.isnan(box[0])}
+
+
+def _track_values(tracks, field):
+    """{"<object>.<field>": {(frame, track_id): value}} for players and ball."""
+    values = {}
+    for obj, frames in to_frames(tracks).items():
+        values[f"{obj}.{field}"] = {(frame_num, track_id): info[field]
+                                    for frame_num, frame_dict in enumerate(frames)
+                                    for track_id, info in frame_dict.items() if field in info}
+    return values
+
+
+def _physics_values(tracks):
+    return {**_track_values({"players": tracks["players"]}, "speed"),
+            **_track_values({"players": tracks["players"]}, "distance")}
+
+
+def compare_values(reference, candidate, tolerance):
+    """Deviation stats of two {key: value} maps, and whether they are within tolerance ({metric: limit}).
+
+    A key counts as mismatched when only one side has a finite value for it. Deviations are the
+    largest absolute component difference of each key both sides have.
+    """
+    keys = reference.keys() | candidate.keys()
+    deviations = []
+    mismatched = 0
+    for key in keys:
+        a = np.asarray(reference[key], dtype=np.float64) if key in reference else None
+        b = np.asarray(candidate[key], dtype=np.float64) if key in candidate else None
+        a_finite = a is not None and np.isfinite(a).all()
+        b_finite = b is not None and np.isfinite(b).all()
+        if a_finite and b_finite:
+            deviations.append(np.abs(a - b).max())
+        elif a_finite or b_finite:
+            mismatched += 1
+
+    deviations = np.array(deviations)
+    stats = {
+        "compared": len(deviations),
+        "mismatched": mismatched,
+        "mismatch_ratio": mismatched / len(keys) if keys else 0.0,
+        "max_abs": float(deviations.max()) if len(deviations) else 0.0,
+        "mean_abs": float(deviations.mean()) if len(deviations) else 0.0,
+        "p95_abs": float(np.percentile(deviations, 95)) if len(deviations) else 0.0,
+    }
+    stats["failed_on"] = [metric for metric in METRICS if metric in tolerance and stats[metric] > tolerance[metric]]
+    stats["passed"] = not stats["failed_on"]
+    return stats
+
+
+def main():
+    eq_cfg = cfg.get('equivalence', {})
+    parser = argparse.ArgumentParser(description="Check the fast code paths against the reference implementations.")
+    parser.add_argument("--frames", type=int, default=eq_cfg.get('frames', EQUIVALENCE_FRAMES),
+                        help="Synthetic match length (frames)")
+    parser.add_argument("--stubs", action="store_true", help="Use the legacy player/ball stubs from config.yaml")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic match seed")
+    parser.add_argument("--only", nargs="+", help="Run only these checks")
+    parser.add_argument("--report", help="Write the full results to this JSON file")
+    args = parser.parse_args()
+
+    stubs = None
+    if args.stubs:
+        stubs = (cfg['paths'].get('legacy_player_stub'), cfg['paths'].get('legacy_ball_stub'))
+        if not all(path and os.path.exists(path) for path in stubs):
+            logger.error(f"Legacy stubs not found: {stubs}")
+            raise SystemExit(2)
+
+    harness = EquivalenceHarness(args.frames, seed=args.seed, stubs=stubs, tolerances=eq_cfg.get('tolerances'))
+    results = harness.run(args.only)
+    failed = [name for name, result in results.items() if not result["passed"]]
+    logger.info(f"[equivalence] {len(results) - len(failed)}/{len(results)} checks passed"
+                + (f"; failed: {', '.join(failed)}" if failed else ""))
+
+    if args.report:
+        os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+        with open(args.report, "w") as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"[equivalence] Report written to {args.report}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
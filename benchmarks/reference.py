@@ -0,0 +1,125 @@
+"""
+Reference implementations for the equivalence checks: the per-frame loops that mini-court
+projection and speed/distance ran before they were vectorized, kept as they were so the fast
+paths are checked against the original behaviour rather than against themselves.
+
+Both take legacy per-frame dict tracks, write their results into them and return them.
+"""
+
+from utils.bbox_utils import (
+    get_foot_position,
+    get_closest_keypoint_index,
+    get_height_of_bbox,
+    get_center_of_bbox,
+    measure_distance
+)
+from constants import (
+    DOUBLE_LINE_WIDTH,
+    PLAYER_1_HEIGHT_METERS,
+    PLAYER_2_HEIGHT_METERS,
+    HEIGHT_WINDOW_BEFORE,
+    HEIGHT_WINDOW_AFTER,
+    SPEED_FRAME_WINDOW
+)
+
+
+def reference_mini_court_positions(mini_court, tracks, original_court_key_points, player_ids=None):
+    """Closest-keypoint + player-height projection, one player and one frame at a time."""
+    player_heights = {1: PLAYER_1_HEIGHT_METERS, 2: PLAYER_2_HEIGHT_METERS}
+
+    # Dynamically map Tracker IDs to 1 and 2
+    unique_ids = set()
+    if player_ids is not None:
+        unique_ids.update(player_ids)
+    else:
+        for frame_dict in tracks["players"]:
+            unique_ids.update(frame_dict.keys())
+    unique_ids = list(unique_ids)
+    id_map = {tid: (1 if idx == 0 else 2) for idx, tid in enumerate(unique_ids)}
+
+    for frame_num, player_dict in enumerate(tracks["players"]):
+        ball_dict = tracks["ball"][frame_num]
+
+        ball_position = None
+        if 1 in ball_dict and 'bbox' in ball_dict[1]:
+            ball_position = get_center_of_bbox(ball_dict[1]['bbox'])
+
+        closest_player_id_to_ball = None
+        if ball_position and player_dict:
+            closest_player_id_to_ball = min(
+                player_dict.keys(),
+                key=lambda x: measure_distance(ball_position, get_center_of_bbox(player_dict[x]['bbox']))
+            )
+
+        for player_id, player in player_dict.items():
+            bbox = player['bbox']
+            foot_position = get_foot_position(bbox)
+
+            closest_key_point_index = get_closest_keypoint_index(foot_position, original_court_key_points, [0, 2, 12, 13])
+            closest_key_point = (original_court_key_points[closest_key_point_index*2],
+                                 original_court_key_points[closest_key_point_index*2+1])
+
+            frame_index_min = max(0, frame_num - HEIGHT_WINDOW_BEFORE)
+            frame_index_max = min(len(tracks["players"]), frame_num + HEIGHT_WINDOW_AFTER)
+            bboxes_heights_in_pixels = [
+                get_height_of_bbox(tracks["players"][i][player_id]['bbox'])
+                for i in range(frame_index_min, frame_index_max)
+                if player_id in tracks["players"][i]
+            ]
+            max_player_height_in_pixels = max(bboxes_heights_in_pixels) if bboxes_heights_in_pixels else get_height_of_bbox(bbox)
+
+            mapped_id = id_map.get(player_id, 1)
+
+            player["mini_court_position"] = mini_court.get_mini_court_coordinates(
+                foot_position, closest_key_point, closest_key_point_index,
+                max_player_height_in_pixels, player_heights.get(mapped_id, 1.88)
+            )
+
+            if closest_player_id_to_ball == player_id and ball_position is not None:
+                closest_kp_idx_ball = get_closest_keypoint_index(ball_position, original_court_key_points, [0, 2, 12, 13])
+                closest_kp_ball = (original_court_key_points[closest_kp_idx_ball*2],
+                                   original_court_key_points[closest_kp_idx_ball*2+1])
+
+                tracks["ball"][frame_num][1]["mini_court_position"] = mini_court.get_mini_court_coordinates(
+                    ball_position, closest_kp_ball, closest_kp_idx_ball,
+                    max_player_height_in_pixels, player_heights.get(mapped_id, 1.88)
+                )
+
+    return tracks
+
+
+def reference_speed_and_distance(tracks, fps, mini_court_width, frame_window=SPEED_FRAME_WINDOW):
+    """Running distance and windowed speed per player, one frame at a time."""
+    meters_per_pixel = DOUBLE_LINE_WIDTH / mini_court_width
+    total_distance = {}
+    last_speed = {}
+
+    for frame_num in range(len(tracks["players"])):
+        for track_id, player in tracks["players"][frame_num].items():
+            if track_id not in total_distance:
+                total_distance[track_id] = 0.0
+                last_speed[track_id] = 0.0
+
+            # 1. Calculate Frame-by-Frame Distance (Total Distance)
+            if frame_num > 0 and track_id in tracks["players"][frame_num - 1]:
+                prev_pos = tracks["players"][frame_num - 1][track_id].get("mini_court_position")
+                curr_pos = player.get("mini_court_position")
+
+                if prev_pos and curr_pos:
+                    total_distance[track_id] += measure_distance(prev_pos, curr_pos) * meters_per_pixel
+
+            # 2. Calculate Windowed Speed (km/h)
+            if frame_num >= frame_window:
+                prev_window_player = tracks["players"][frame_num - frame_window].get(track_id)
+                if prev_window_player:
+                    prev_window_pos = prev_window_player.get("mini_court_position")
+                    curr_pos = player.get("mini_court_position")
+
+                    if prev_window_pos and curr_pos:
+                        dist_meters = measure_distance(prev_window_pos, curr_pos) * meters_per_pixel
+                        last_speed[track_id] = dist_meters / (frame_window / fps) * 3.6
+
+            player['distance'] = total_distance[track_id]
+            player['speed'] = last_speed[track_id]
+
+    return tracks
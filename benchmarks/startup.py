@@ -0,0 +1,150 @@
+"""
+Startup benchmark: how long a fresh interpreter takes to import the pipeline and to re-render a
+short clip from the cache, its peak RSS, and which heavy dependencies it imported on the way.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeats 5 --frames 96 --report data/output/benchmarks/startup.json
+
+Each scenario runs `repeats` times, each time in a new interpreter, and reports median times and the highest RSS.
+Neither importing core.pipeline nor a re-render (`pipeline.rerender`, fed from a synthetic clip
+whose tracks and court keypoints are seeded into a scratch cache) may import torch,
+ultralytics, supervision or pandas; if one does, or a scenario fails, the command exits with
+status 1.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from utils.logger import logger
+from utils.config_loader import cfg
+from utils.track_file import tracks_from_legacy_stubs
+from utils.video_utils import save_video
+from benchmarks.synthetic import SyntheticCourt, synthetic_tracks, render_frames
+from constants import BENCHMARK_FRAME_SIZE, STARTUP_REPEATS, STARTUP_FRAMES, STARTUP_FORBIDDEN_MODULES
+
+# Runs in the fresh interpreter: times the import (and the run), then prints one JSON line last
+_CHILD = r"""
+import json, os, sys, time
+start = time.perf_counter()
+import core.pipeline
+imported = time.perf_counter()
+spec = json.loads(sys.argv[1])
+if spec["video"]:
+    from utils.config_loader import cfg
+    for section, values in spec["overrides"].items():
+        cfg[section].update(values)
+    core.pipeline.Pipeline(spec["video"], spec["output"]).run()
+done = time.perf_counter()
+# Linux carries ru_maxrss over from the parent through fork + exec; VmHWM is this process' own peak
+if os.path.exists("/proc/self/status"):
+    with open("/proc/self/status") as f:
+        peak_mb = next(int(line.split()[1]) for line in f if line.startswith("VmHWM:")) / 1024
+else:
+    import resource
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024)   # macOS: bytes
+print(json.dumps({
+    "import_s": imported - start,
+    "run_s": done - imported,
+    "peak_rss_mb": peak_mb,
+    "modules": len(sys.modules),
+    "heavy_modules": sorted(name for name in spec["forbidden"] if name in sys.modules),
+}))
+"""
+
+
+def run_scenario(name, spec, repeats):
+    """Runs one scenario `repeats` times in fresh interpreters. Medians of the times, max of the RSS."""
+    runs = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, "-c", _CHILD, json.dumps(spec)], capture_output=True, text=True)
+        wall_s = time.perf_counter() - start
+        if result.returncode != 0:
+            return {"scenario": name, "status": "failed", "error": result.stderr.strip().splitlines()[-1:]}
+        runs.append({**json.loads(result.stdout.strip().splitlines()[-1]), "wall_s": wall_s})
+
+    heavy = sorted({module for run in runs for module in run["heavy_modules"]})
+    return {
+        "scenario": name,
+        "status": "ok" if not heavy else "heavy_imports",
+        "wall_s": round(statistics.median(run["wall_s"] for run in runs), 4),
+        "import_s": round(statistics.median(run["import_s"] for run in runs), 4),
+        "run_s": round(statistics.median(run["run_s"] for run in runs), 4),
+        "peak_rss_mb": round(max(run["peak_rss_mb"] for run in runs), 1),
+        "modules": max(run["modules"] for run in runs),
+        "heavy_modules": heavy,
+    }
+
+
+def seed_rerender_cache(workdir, num_frames):
+    """Writes a synthetic clip and caches its tracks and court keypoints. Returns the re-render scenario spec."""
+    from core.pipeline import Pipeline
+
+    court = SyntheticCourt(BENCHMARK_FRAME_SIZE)
+    player_frames, ball_frames = synthetic_tracks(num_frames, court)
+    video = os.path.join(workdir, "clip.avi")
+    save_video(render_frames(court, player_frames, ball_frames, num_frames), video, fps=cfg.get('video', {}).get('fps', 24.0))
+
+    # The child applies the same overrides, so it computes the same cache keys
+    overrides = {
+        "paths": {"stub_path": workdir, "unified_stub": None, "legacy_player_stub": None, "legacy_ball_stub": None},
+        "pipeline": {"rerender": True, "streaming": False, "live": False},
+        "profiling": {"enabled": False},
+    }
+    for section, values in overrides.items():
+        cfg.setdefault(section, {}).update(values)
+    pipeline = Pipeline(video, os.path.join(workdir, "rerendered.avi"))
+    pipeline._save_cached_tracks(tracks_from_legacy_stubs(player_frames, ball_frames))
+    pipeline._save_cached_court_keypoints(pipeline._court_mode(), court.keypoints)
+    return {"video": video, "output": pipeline.output_video_path, "overrides": overrides}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time pipeline startup in fresh interpreters and check for heavy imports.")
+    parser.add_argument("--repeats", type=int, default=STARTUP_REPEATS, help="Fresh interpreters per scenario")
+    parser.add_argument("--frames", type=int, default=STARTUP_FRAMES, help="Length of the re-rendered synthetic clip")
+    parser.add_argument("--max-import-s", type=float, default=None,
+                        help="Also fail when importing core.pipeline takes longer than this (median seconds)")
+    parser.add_argument("--report", default=None, help="Write the results as JSON here")
+    args = parser.parse_args()
+
+    forbidden = list(STARTUP_FORBIDDEN_MODULES)
+    with tempfile.TemporaryDirectory(prefix="startup-bench-") as workdir:
+        rerender = seed_rerender_cache(workdir, args.frames)
+        results = [
+            run_scenario("import", {"video": None, "forbidden": forbidden}, args.repeats),
+            run_scenario("rerender", {**rerender, "forbidden": forbidden}, args.repeats),
+        ]
+
+    failed = False
+    for result in results:
+        if result["status"] == "failed":
+            logger.error(f"[startup] {result['scenario']} failed: {' '.join(result['error'])}")
+            failed = True
+            continue
+        logger.info(f"[startup] {result['scenario']}: {result['wall_s']:.2f}s process, {result['import_s']:.2f}s import, "
+                    f"{result['run_s']:.2f}s run, peak RSS {result['peak_rss_mb']:.0f} MB, {result['modules']} modules")
+        if result["heavy_modules"]:
+            logger.error(f"[startup] {result['scenario']} imported {', '.join(result['heavy_modules'])}")
+            failed = True
+    import_result = results[0]
+    if args.max_import_s is not None and import_result["status"] != "failed" and import_result["import_s"] > args.max_import_s:
+        logger.error(f"[startup] Importing core.pipeline took {import_result['import_s']:.2f}s (limit {args.max_import_s:.2f}s)")
+        failed = True
+
+    if args.report:
+        os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+        with open(args.report, "w") as f:
+            json.dump({"frames": args.frames, "repeats": args.repeats, "results": results}, f, indent=2)
+        logger.info(f"[startup] Report written to {args.report}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+Model-free benchmarks of the CPU stages: ball filtering, player filtering, mini-court
+projection, physics, annotation and video encode/decode, on synthetic matches (or the legacy
+stubs) of several lengths. No weights and no GPU are needed.
+
+    python -m benchmarks.suite                            # synthetic matches of 1k, 10k and 100k frames
+    python -m benchmarks.suite --scales 1000 5000 --repeats 5
+    python -m benchmarks.suite --stubs                    # the legacy stubs, repeated to each scale
+    python -m benchmarks.suite --save-baseline            # store this run as the baseline
+
+Each scale runs the stages as a chain, like the batch pipeline, `repeats` times; a stage reports
+its best pass. Every run is appended to the history file (one JSON object per line) and
+compared with the stored baseline: a stage whose time per frame grew by more than the
+tolerance is flagged as a regression, and the command exits with status 1.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+import numpy as np
+from utils.logger import logger
+from utils.config_loader import cfg
+from utils.track_file import tracks_from_legacy_stubs
+from utils.track_store import to_columnar
+from utils.video_utils import iter_video, save_video
+from core.trackers import Tracker
+from core.annotation import Annotator, MiniCourt
+from core.analysis.physics import PhysicsEngine
+from benchmarks.synthetic import SyntheticCourt, synthetic_tracks, stub_tracks, render_frames
+from constants import (
+    BENCHMARK_SCALES,
+    BENCHMARK_REPEATS,
+    BENCHMARK_FRAME_SIZE,
+    BENCHMARK_FRAME_POOL,
+    BENCHMARK_MAX_VIDEO_FRAMES,
+    BENCHMARK_REGRESSION_TOLERANCE,
+    BENCHMARK_MIN_REGRESSION_S
+)
+
+STAGES = ("ball_interpolate", "ball_kalman", "player_filter", "mini_court_keypoint", "mini_court_homography",
+          "physics", "annotation", "encode", "decode")
+
+
+class BenchmarkSuite:
+    def __init__(self, repeats=BENCHMARK_REPEATS, frame_size=BENCHMARK_FRAME_SIZE, seed=0, stubs=None):
+        """stubs: (player_stub, ball_stub) paths to benchmark on instead of synthetic tracks."""
+        self.repeats = max(1, repeats)
+        self.court = SyntheticCourt(frame_size)
+        self.seed = seed
+        self.stubs = stubs
+        self.fps = cfg.get('video', {}).get('fps', 24.0)
+        self.columnar = cfg.get('pipeline', {}).get('columnar_tracks', False)
+        self.ball_filter = cfg.get('ball_tracking', {}).get('filter', 'interpolate')
+        self.annotator = Annotator(workers=cfg.get('pipeline', {}).get('render_workers', 1))
+        self._elapsed = {}
+        self._frames = {}
+
+    def run(self, scales=BENCHMARK_SCALES):
+        """Benchmarks every stage at every scale. Returns the run record (see record())."""
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Untimed warm-up, so first-call costs (imports, caches) do not land on the first scale
+            self._run_pass(*self._tracks(BENCHMARK_FRAME_POOL), os.path.join(tmp_dir, "warmup.avi"))
+        for scale in scales:
+            players, ball = self._tracks(scale)
+            samples = {}
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                for _ in range(self.repeats):
+                    self._elapsed = {}
+                    self._run_pass(players, ball, os.path.join(tmp_dir, "benchmark.avi"))
+                    for stage, seconds in self._elapsed.items():
+                        samples.setdefault(stage, []).append(seconds)
+            results[str(scale)] = {stage: _summarize(self._frames[stage], samples[stage]) for stage in STAGES}
+            for stage in STAGES:
+                result = results[str(scale)][stage]
+                logger.info(f"[bench] {scale:>7} frames | {stage:<22} {result['best_s']:8.3f}s "
+                            f"({result['frames']} frames, {result['us_per_frame']:9.1f} us/frame, {result['fps']:.0f} fps)")
+        return self.record(results)
+
+    def record(self, results):
+        """The run as a JSON-serializable dict, with enough context to tell runs apart."""
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "source": "stubs" if self.stubs else "synthetic",
+            "seed": self.seed,
+            "frame_size": [self.court.width, self.court.height],
+            "repeats": self.repeats,
+            "columnar_tracks": self.columnar,
+            "ball_filter": self.ball_filter,
+            "render_workers": self.annotator.workers,
+            "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                        "numpy": np.__version__, "cpu_count": os.cpu_count()},
+            "results": results,
+        }
+
+    def _tracks(self, num_frames):
+        if self.stubs:
+            return stub_tracks(num_frames, *self.stubs)
+        return synthetic_tracks(num_frames, self.court, seed=self.seed)
+
+    def _timed(self, stage, frames, fn, *args, **kwargs):
+        """Runs fn, adding its wall time to `stage` in this pass."""
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self._elapsed[stage] = self._elapsed.get(stage, 0.0) + time.perf_counter() - start
+        self._frames[stage] = frames
+        return result
+
+    def _run_pass(self, players, ball, video_path):
+        """One pass of the stage chain over fresh copies of the tracks (the stages write into them)."""
+        num_frames = len(players)
+        keypoints = self.court.keypoints
+        tracks = tracks_from_legacy_stubs(players, ball)
+
+        # 1. Ball filters (the configured one feeds the later stages)
+        filtered = {name: self._timed(f"ball_{name}", num_frames, Tracker(ball_filter=name).interpolate_ball_positions,
+                                      tracks["ball"])
+                    for name in ("interpolate", "kalman")}
+        tracks["ball"] = filtered[self.ball_filter]
+        if self.columnar:
+            tracks = to_columnar(tracks)
+
+        # 2. Player filtering and positions
+        tracker = Tracker()
+        tracks = self._timed("player_filter", num_frames, lambda: tracker.add_position_to_tracks(
+            tracker.choose_and_filter_players(keypoints, tracks)))
+
+        # 3. Projection (the homography pass overwrites the keypoint pass' output) and physics
+        pool = render_frames(self.court, players, ball, BENCHMARK_FRAME_POOL)
+        mini_courts = {}
+        for method in ("keypoint", "homography"):
+            mini_courts[method] = MiniCourt(pool[0], method)
+            tracks = self._timed(f"mini_court_{method}", num_frames,
+                                 mini_courts[method].convert_bounding_boxes_to_mini_court_coordinates, tracks, keypoints)
+        mini_court = mini_courts["keypoint"]
+        physics = PhysicsEngine(self.fps, mini_court.court_drawing_width)
+        tracks = self._timed("physics", num_frames, physics.add_speed_and_distance_to_tracks, tracks)
+
+        # 4. Annotation, one pool of frames at a time (drawn in place, as the pipeline does)
+        video_frames = min(num_frames, BENCHMARK_MAX_VIDEO_FRAMES)
+        for start in range(0, video_frames, len(pool)):
+            stop = min(start + len(pool), video_frames)
+            self._timed("annotation", video_frames, lambda: self.annotator.draw_frames(
+                pool[:stop - start],
+                [tracks["players"][frame_num] for frame_num in range(start, stop)],
+                [tracks["ball"][frame_num] for frame_num in range(start, stop)],
+                [keypoints] * (stop - start), mini_court, in_place=True))
+
+        # 5. Video I/O of the annotated frames
+        frames = itertools.islice(itertools.cycle(pool), video_frames)
+        self._timed("encode", video_frames, save_video, frames, video_path, fps=self.fps)
+        self._timed("decode", video_frames, lambda: sum(1 for _ in iter_video(video_path)))
+
+
+def _summarize(frames, samples):
+    best = min(samples)
+    return {
+        "frames": frames,
+        "best_s": round(best, 6),
+        "median_s": round(statistics.median(samples), 6),
+        "us_per_frame": round(best / frames * 1e6, 3) if frames else None,
+        "fps": round(frames / best, 1) if best > 0 else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- History & regressions ---
+def compare(run, baseline, tolerance=BENCHMARK_REGRESSION_TOLERANCE, min_regression_s=BENCHMARK_MIN_REGRESSION_S):
+    """Per-stage changes vs. the baseline: a list of {"scale", "stage", "ratio", "status"} for every stage both ran.
+
+    status is "regression" when the time per frame grew by more than the tolerance (and by more
+    than min_regression_s in total), "improvement" when it shrank by more than the tolerance.
+    """
+    changes = []
+    for scale, stages in run["results"].items():
+        for stage, result in stages.items():
+            base = baseline["results"].get(scale, {}).get(stage)
+            if not base or not base["us_per_frame"] or not result["us_per_frame"]:
+                continue
+            ratio = result["us_per_frame"] / base["us_per_frame"]
+            slower_s = (result["us_per_frame"] - base["us_per_frame"]) * result["frames"] / 1e6
+            status = "unchanged"
+            if ratio > 1 + tolerance and slower_s > min_regression_s:
+                status = "regression"
+            elif ratio < 1 - tolerance:
+                status = "improvement"
+            changes.append({"scale": int(scale), "stage": stage, "ratio": round(ratio, 3), "status": status})
+    return changes
+
+
+def comparable(run, baseline):
+    """Runs are only compared when they timed the same data the same way."""
+    keys = ("source", "seed", "frame_size", "columnar_tracks", "ball_filter", "render_workers")
+    return all(run.get(key) == baseline.get(key) for key in keys)
+
+
+def append_history(run, history_path):
+    os.makedirs(os.path.dirname(history_path) or ".", exist_ok=True)
+    with open(history_path, "a") as f:
+        f.write(json.dumps(run) + "\n")
+
+
+def load_baseline(baseline_path):
+    if not baseline_path or not os.path.exists(baseline_path):
+        return None
+    with open(baseline_path) as f:
+        return json.load(f)
+
+
+def main():
+    bench_cfg = cfg.get('benchmark', {})
+    parser = argparse.ArgumentParser(description="Benchmark the CPU pipeline stages on synthetic or stub tracks.")
+    parser.add_argument("--scales", type=int, nargs="+", default=bench_cfg.get('scales', list(BENCHMARK_SCALES)),
+                        help="Match lengths (frames) to benchmark")
+    parser.add_argument("--repeats", type=int, default=bench_cfg.get('repeats', BENCHMARK_REPEATS),
+                        help="Passes per scale; each stage reports its best")
+    parser.add_argument("--stubs", action="store_true", help="Use the legacy player/ball stubs from config.yaml")
+    parser.add_argument("--seed", type=int, default=0, help="Synthetic match seed")
+    parser.add_argument("--history", default=bench_cfg.get('history_path', 'data/output/benchmarks/history.jsonl'))
+    parser.add_argument("--baseline", default=bench_cfg.get('baseline_path', 'benchmarks/baseline.json'))
+    parser.add_argument("--tolerance", type=float, default=bench_cfg.get('tolerance', BENCHMARK_REGRESSION_TOLERANCE),
+                        help="Per-frame slowdown (fraction) flagged as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the new baseline")
+    args = parser.parse_args()
+
+    stubs = None
+    if args.stubs:
+        stubs = (cfg['paths'].get('legacy_player_stub'), cfg['paths'].get('legacy_ball_stub'))
+        if not all(path and os.path.exists(path) for path in stubs):
+            logger.error(f"Legacy stubs not found: {stubs}")
+            raise SystemExit(2)
+
+    run = BenchmarkSuite(repeats=args.repeats, seed=args.seed, stubs=stubs).run(args.scales)
+
+    # Flag changes vs. the baseline, then record the run
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        logger.info(f"[bench] No baseline at {args.baseline}; store one with --save-baseline")
+    elif not comparable(run, baseline):
+        logger.warning("[bench] The baseline was measured on different data or settings; not comparing")
+    else:
+        run["baseline_commit"] = baseline.get("commit")
+        run["changes"] = compare(run, baseline, tolerance=args.tolerance)
+        if run["machine"] != baseline.get("machine"):
+            logger.warning("[bench] The baseline comes from a different machine or environment")
+        for change in run["changes"]:
+            if change["status"] == "regression":
+                logger.warning(f"[bench] REGRESSION {change['stage']} at {change['scale']} frames: "
+                               f"{change['ratio']:.2f}x the baseline time per frame")
+            elif change["status"] == "improvement":
+                logger.info(f"[bench] Improvement {change['stage']} at {change['scale']} frames: "
+                            f"{change['ratio']:.2f}x the baseline time per frame")
+    append_history(run, args.history)
+    logger.info(f"[bench] Run appended to {args.history}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+        logger.info(f"[bench] Baseline saved to {args.baseline}")
+    if any(change["status"] == "regression" for change in run.get("changes", [])):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Synthetic match data for benchmarks: a broadcast-style court, two players, three people off
+court and a ball rallying between the players, at any length and fully determined by the seed.
+
+Tracks come out in the legacy stub layout (per-frame {track_id: bbox} lists, ball not yet
+interpolated), the same as stubs/player_detections.pkl and stubs/ball_detections.pkl, so
+both sources feed the benchmarks the same way.
+"""
+
+import pickle
+import cv2
+import numpy as np
+from constants import (
+    DOUBLE_LINE_WIDTH,
+    HALF_COURT_LINE_HEIGHT,
+    DOUBLE_ALLY_DIFFERENCE,
+    NO_MANS_LAND_HEIGHT,
+    SINGLE_LINE_WIDTH,
+    PLAYER_1_HEIGHT_METERS,
+    PLAYER_2_HEIGHT_METERS
+)
+
+_LENGTH = HALF_COURT_LINE_HEIGHT * 2
+_LEFT, _RIGHT = DOUBLE_ALLY_DIFFERENCE, DOUBLE_ALLY_DIFFERENCE + SINGLE_LINE_WIDTH
+
+# The 14 court keypoints in court meters (x across, y from the far baseline), in the court detector's order
+COURT_POINTS_METERS = np.array([
+    (0, 0), (DOUBLE_LINE_WIDTH, 0), (0, _LENGTH), (DOUBLE_LINE_WIDTH, _LENGTH),
+    (_LEFT, 0), (_LEFT, _LENGTH), (_RIGHT, 0), (_RIGHT, _LENGTH),
+    (_LEFT, NO_MANS_LAND_HEIGHT), (_RIGHT, NO_MANS_LAND_HEIGHT),
+    (_LEFT, _LENGTH - NO_MANS_LAND_HEIGHT), (_RIGHT, _LENGTH - NO_MANS_LAND_HEIGHT),
+    (DOUBLE_LINE_WIDTH / 2, NO_MANS_LAND_HEIGHT), (DOUBLE_LINE_WIDTH / 2, _LENGTH - NO_MANS_LAND_HEIGHT),
+], dtype=np.float64)
+
+# Court lines as keypoint index pairs (doubles/singles sidelines, baselines, service lines, center line)
+_COURT_LINES = [(0, 1), (2, 3), (0, 2), (1, 3), (4, 5), (6, 7), (8, 9), (10, 11), (12, 13)]
+
+# People standing off court (umpire, line judges): court meters, as in a real broadcast
+_OFF_COURT_METERS = np.array([(-3.5, _LENGTH / 2), (-4.0, 8.0), (DOUBLE_LINE_WIDTH + 4.0, _LENGTH - 8.0)])
+
+_BALL_SIZE = 14
+_SHOT_FRAMES = 30
+
+
+class SyntheticCourt:
+    """A court seen from behind the near baseline, projected with a fixed perspective homography."""
+
+    def __init__(self, frame_size):
+        self.width, self.height = frame_size
+        w, h = self.width, self.height
+        corners_m = COURT_POINTS_METERS[:4].astype(np.float32)
+        # Far baseline narrow and high in the frame, near baseline wide and low
+        corners_px = np.float32([(0.31 * w, 0.25 * h), (0.69 * w, 0.25 * h), (0.14 * w, 0.88 * h), (0.86 * w, 0.88 * h)])
+        self.homography = cv2.getPerspectiveTransform(corners_m, corners_px)
+        self.keypoints = self.project(COURT_POINTS_METERS).reshape(-1)   # (28,) like CourtDetector.predict
+
+    def project(self, points_m):
+        """(n, 2) court meters -> (n, 2) pixels."""
+        points = np.asarray(points_m, dtype=np.float64).reshape(-1, 1, 2)
+        return cv2.perspectiveTransform(points, self.homography).reshape(-1, 2)
+
+    def boxes(self, feet_m, height_m, aspect=0.45):
+        """Person boxes standing at feet_m (n, 2) meters, height_m tall: (n, 4) pixel bboxes."""
+        feet = self.project(feet_m)
+        # Pixels per meter at each spot, from the projected court width there
+        scale = np.linalg.norm(self.project(feet_m + [1.0, 0.0]) - feet, axis=1)
+        h = height_m * scale
+        w = h * aspect
+        return np.stack([feet[:, 0] - w / 2, feet[:, 1] - h, feet[:, 0] + w / 2, feet[:, 1]], axis=1)
+
+    def background(self):
+        frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        frame[:] = (60, 110, 60)
+        outline = self.keypoints.reshape(-1, 2)[[0, 1, 3, 2]].astype(np.int32)
+        cv2.fillConvexPoly(frame, outline, (150, 90, 40))
+        points = self.keypoints.reshape(-1, 2).astype(np.int32)
+        for start, end in _COURT_LINES:
+            cv2.line(frame, tuple(points[start]), tuple(points[end]), (255, 255, 255), 3)
+        net = self.project([(-0.9, HALF_COURT_LINE_HEIGHT), (DOUBLE_LINE_WIDTH + 0.9, HALF_COURT_LINE_HEIGHT)]).astype(np.int32)
+        cv2.line(frame, tuple(net[0]), tuple(net[1]), (30, 30, 30), 5)
+        return frame
+
+
+def synthetic_tracks(num_frames, court, seed=0, ball_truth=False):
+    """Legacy-layout (player_frames, ball_frames) for num_frames frames of a rally.
+
+    ball_truth: also return the true ball bboxes, (num_frames, 4), before misses, false positives and noise.
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(num_frames)
+
+    # 1. Players: slow lateral shuffles behind each baseline plus jitter (ids 1 = near, 2 = far)
+    near = np.stack([DOUBLE_LINE_WIDTH / 2 + 3.5 * np.sin(t / 47.0), _LENGTH + 1.2 + 0.8 * np.sin(t / 31.0)], axis=1)
+    far = np.stack([DOUBLE_LINE_WIDTH / 2 + 3.5 * np.sin(t / 53.0 + 1.0), -1.2 - 0.8 * np.sin(t / 29.0)], axis=1)
+    near += rng.normal(0, 0.03, near.shape)
+    far += rng.normal(0, 0.03, far.shape)
+    near_boxes = court.boxes(near, PLAYER_1_HEIGHT_METERS)
+    far_boxes = court.boxes(far, PLAYER_2_HEIGHT_METERS)
+    off_boxes = court.boxes(_OFF_COURT_METERS, 1.75)
+
+    # 2. Ball: shots from one player's racket to the other's, arcing up in the image
+    shot, phase = np.divmod(t, _SHOT_FRAMES)
+    progress = phase / _SHOT_FRAMES
+    from_near = (shot % 2 == 0)[:, None]
+    near_hand = np.stack([near_boxes[:, 2], (near_boxes[:, 1] + near_boxes[:, 3]) / 2], axis=1)
+    far_hand = np.stack([far_boxes[:, 2], (far_boxes[:, 1] + far_boxes[:, 3]) / 2], axis=1)
+    start = np.where(from_near, near_hand, far_hand)
+    end = np.where(from_near, far_hand, near_hand)
+    center = start + (end - start) * progress[:, None]
+    center[:, 1] -= 0.12 * court.height * np.sin(np.pi * progress)
+    true_boxes = np.concatenate([center - _BALL_SIZE / 2, center + _BALL_SIZE / 2], axis=1)
+    # Detector output: misses, the odd false positive, pixel noise
+    detected = rng.random(num_frames) > 0.25
+    false_positive = rng.random(num_frames) < 0.02
+    center[false_positive] = rng.random((false_positive.sum(), 2)) * [court.width, court.height]
+    center += rng.normal(0, 1.5, center.shape)
+    ball_boxes = np.concatenate([center - _BALL_SIZE / 2, center + _BALL_SIZE / 2], axis=1)
+
+    # 3. Per-frame dicts, with the odd missed player and off-court person
+    player_seen = rng.random((num_frames, 2)) > 0.02
+    off_seen = rng.random((num_frames, len(off_boxes))) > 0.2
+    player_frames, ball_frames = [], []
+    for frame in range(num_frames):
+        frame_dict = {}
+        if player_seen[frame, 0]:
+            frame_dict[1] = near_boxes[frame].tolist()
+        if player_seen[frame, 1]:
+            frame_dict[2] = far_boxes[frame].tolist()
+        for index in np.flatnonzero(off_seen[frame]):
+            frame_dict[3 + int(index)] = off_boxes[index].tolist()
+        player_frames.append(frame_dict)
+        ball_frames.append({1: ball_boxes[frame].tolist()} if detected[frame] else {})
+    # Both players are on screen in the first frame, which is where the tracker picks them
+    player_frames[0].update({1: near_boxes[0].tolist(), 2: far_boxes[0].tolist()})
+    if ball_truth:
+        return player_frames, ball_frames, true_boxes
+    return player_frames, ball_frames
+
+
+def stub_tracks(num_frames, player_stub, ball_stub):
+    """Legacy-layout (player_frames, ball_frames) from the legacy stubs, repeated to num_frames frames."""
+    with open(player_stub, "rb") as f:
+        old_players = pickle.load(f)
+    with open(ball_stub, "rb") as f:
+        old_ball = pickle.load(f)
+    count = min(len(old_players), len(old_ball))
+    return ([old_players[frame % count] for frame in range(num_frames)],
+            [old_ball[frame % count] for frame in range(num_frames)])
+
+
+def render_frames(court, player_frames, ball_frames, count):
+    """The first `count` frames of the match: people as filled boxes, the ball as a disc."""
+    background = court.background()
+    frames = []
+    for frame_num in range(min(count, len(player_frames))):
+        frame = background.copy()
+        for bbox in player_frames[frame_num].values():
+            x1, y1, x2, y2 = map(int, bbox)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (40, 40, 200), -1)
+        for bbox in ball_frames[frame_num].values():
+            x1, y1, x2, y2 = bbox
+            cv2.circle(frame, (int((x1 + x2) / 2), int((y1 + y2) / 2)), _BALL_SIZE // 2, (40, 230, 230), -1)
+        frames.append(frame)
+    return frames
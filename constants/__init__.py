@@ -1,3 +1,4 @@
 from .detector_consts import *
 from .tracker_consts import *
-from .visual_consts import *
\ No newline at end of file
+from .visual_consts import *
+from .pipeline_consts import *
\ No newline at end of file
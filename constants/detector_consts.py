@@ -4,6 +4,43 @@
 DETECTION_BATCH_SIZE = 20
 DETECTION_CONFIDENCE_THRESHOLD = 0.25
 
+# --- Adaptive Detection Batching (Fused Player + Ball Pass) ---
+DETECTION_MIN_BATCH_SIZE = 1
+DETECTION_MAX_BATCH_SIZE = 64
+DETECTION_TARGET_BATCH_LATENCY = 2.0  # Max seconds per fused batch (both models); larger batches are shrunk
+DETECTION_MEMORY_HEADROOM = 0.15      # Stop growing batches once less than this share of GPU memory is free
+DETECTION_GROWTH_FACTOR = 1.5         # Batch growth per step while per-frame latency keeps improving
+
+# --- Trajectory-Guided Ball Search (ROI Mode) ---
+BALL_ROI_SIZE = 320             # Square crop (pixels) around the predicted ball, detected at native resolution
+BALL_ROI_BATCH_SIZE = 4         # Frames predicted ahead from one trajectory state (crops batched together)
+BALL_ROI_LOST_PATIENCE = 6      # Frames without a ball before the crop search gives way to the fallback
+BALL_FULL_FRAME_IMGSZ = 640     # Network input size of a full-frame pass (cost accounting)
+BALL_TILE_SIZE = 640            # 'tiled' fallback: native-resolution tile size (pixels)
+BALL_TILE_OVERLAP = 96          # 'tiled' fallback: tile overlap, so a ball on a seam is seen whole
+BALL_TILE_NMS_IOU = 0.5         # 'tiled' fallback: IoU above which duplicate boxes from overlapping tiles merge
+
+# --- Adaptive Keyframe Player Detection (Keyframe Mode) ---
+KEYFRAME_MAX_STRIDE = 8         # Max frames between player-model runs
+KEYFRAME_MOTION_BUDGET = 6.0    # Accumulated mean abs grey-level difference in player regions that forces a keyframe
+KEYFRAME_AUDIT_INTERVAL = 25    # Every Nth skipped frame is also detected densely to measure interpolation error
+KEYFRAME_MATCH_IOU = 0.1        # Min IoU to pair a box between two keyframes for interpolation
+MOTION_THUMBNAIL_WIDTH = 320    # Width (pixels) of the grey thumbnail used for motion energy
+
 # --- Class Names (Must match your YOLO model's class names) ---
 CLASS_PLAYER = "person"
 CLASS_BALL = "tennis ball"
+
+# --- Court Re-Detection (Periodic Mode) ---
+COURT_DETECTION_STRIDE = 48     # Frames between scheduled court detections (~2s at 24fps)
+COURT_DETECTION_BATCH_SIZE = 8  # Keyframes per CourtDetector forward pass
+SCENE_CHANGE_THRESHOLD = 30.0   # Mean abs grey-level difference (0-255) vs. the last keyframe that forces re-detection
+SCENE_THUMBNAIL_SIZE = (64, 36) # (width, height) of the thumbnail used for the scene-change metric
+
+# --- Court Keypoint Optical Flow (Flow Mode) ---
+FLOW_WIN_SIZE = 21              # Lucas-Kanade search window (pixels)
+FLOW_MAX_LEVEL = 3              # Lucas-Kanade pyramid levels
+FLOW_FB_THRESHOLD = 1.0         # Max forward-backward error (pixels) for a keypoint to count as tracked
+FLOW_MIN_TRACKED_RATIO = 0.6    # Re-detect when fewer than this share of detected keypoints is still tracked
+FLOW_MAX_DRIFT_PX = 3.0         # Re-detect when tracked keypoints stop agreeing on one court homography (mean residual)
+FLOW_MAX_INTERVAL = 240         # Re-detect at least this often (frames), whatever the flow says
@@ -0,0 +1,80 @@
+"""Constants related to pipeline scheduling (streaming windows, buffering)."""
+
+from .tracker_consts import INTERPOLATE_LIMIT, ROLLING_WINDOW, BFILL_LIMIT
+from .visual_consts import HEIGHT_WINDOW_BEFORE, HEIGHT_WINDOW_AFTER
+
+# --- Physics Window ---
+SPEED_FRAME_WINDOW = 12         # Frames used for windowed speed (0.5 seconds at 24fps)
+
+# --- Streaming Windows (Frames) ---
+STREAM_CHUNK_SIZE = 50          # Frames finalized and emitted per processing step
+# Future frames that must be seen before a frame's tracks are final (ball interpolation, height window)
+STREAM_LOOKAHEAD = max(HEIGHT_WINDOW_AFTER, INTERPOLATE_LIMIT + ROLLING_WINDOW // 2 + BFILL_LIMIT)
+# Past frames kept as context for the backward-looking windows (height window, physics, ball smoothing)
+STREAM_CONTEXT = max(HEIGHT_WINDOW_BEFORE, SPEED_FRAME_WINDOW, INTERPOLATE_LIMIT + ROLLING_WINDOW // 2)
+
+# --- Threaded Video I/O ---
+FRAME_QUEUE_SIZE = 32           # Max decoded/annotated frames buffered between I/O threads and compute
+
+# --- Rendering ---
+RENDER_CHUNKS_PER_WORKER = 4    # Contiguous frame chunks queued per render thread (load balancing)
+
+# --- Stage Cache ---
+TRACKS_CACHE_VERSION = 3        # Bump when tracking logic or the tracks layout changes to invalidate cached tracks
+COURT_CACHE_VERSION = 1         # Bump when court keypoint decoding or tracking changes to invalidate cached keypoints
+
+# --- Stage Graph (batch mode) ---
+# Bump a stage's version when its code changes: its persisted output, and everything downstream, is recomputed
+STAGE_VERSIONS = {"detect": 1, "filter": 1, "project": 1, "physics": 1, "encode": 1}
+# Constants the mini-court projection reads; changing one re-runs projection and everything after it
+PROJECTION_CONSTANTS = (
+    "DOUBLE_LINE_WIDTH", "HALF_COURT_LINE_HEIGHT", "DOUBLE_ALLY_DIFFERENCE", "NO_MANS_LAND_HEIGHT", "SINGLE_LINE_WIDTH",
+    "PLAYER_1_HEIGHT_METERS", "PLAYER_2_HEIGHT_METERS", "HEIGHT_WINDOW_BEFORE", "HEIGHT_WINDOW_AFTER",
+    "REFERENCE_KEYPOINT_INDICES", "HOMOGRAPHY_RANSAC_THRESHOLD",
+)
+
+# --- Live Mode ---
+LIVE_LATENCY_BUDGET_MS = 200    # End-to-end (capture -> emit) latency allowed per frame
+LIVE_COST_SMOOTHING = 0.2       # Weight of the newest frame in the moving average of processing cost
+LIVE_PROBE_INTERVAL = 24        # Degraded frames in a row before a full frame is tried again to re-measure its cost
+LIVE_STATS_INTERVAL = 240       # Frames between live latency log lines
+LIVE_LATENCY_WINDOW = 2400      # Most recent frame latencies kept for the percentiles (memory stays flat on long streams)
+
+# --- Batch Runner ---
+BATCH_VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+BATCH_STATE_FILE = "batch_state.jsonl"      # Append-only log of finished jobs (drives resume)
+BATCH_SUMMARY_FILE = "batch_summary.json"   # Per-video throughput of the batch
+
+# --- Profiling ---
+PROFILER_MAX_TRACE_EVENTS = 1_000_000   # Chrome trace events kept per run; later ones are counted as dropped
+
+# --- Benchmarks ---
+BENCHMARK_SCALES = (1_000, 10_000, 100_000)   # Frames per synthetic match
+BENCHMARK_REPEATS = 3                         # Passes per scale; each stage reports its best pass
+BENCHMARK_FRAME_SIZE = (1920, 1080)           # Synthetic video (width, height); the legacy stubs are 1080p too
+BENCHMARK_FRAME_POOL = 32                     # Distinct synthetic frames, annotated in place and cycled for video I/O
+BENCHMARK_MAX_VIDEO_FRAMES = 500              # Frames annotated / encoded / decoded per scale (cost is per frame)
+BENCHMARK_REGRESSION_TOLERANCE = 0.15         # Slowdown vs. the baseline (per frame) flagged as a regression
+BENCHMARK_MIN_REGRESSION_S = 0.01             # Total slowdown below this is timer noise, never flagged
+STARTUP_REPEATS = 3                           # Fresh interpreters per startup scenario (median time)
+STARTUP_FRAMES = 48                           # Synthetic clip re-rendered from the cache by the startup benchmark
+STARTUP_FORBIDDEN_MODULES = ("torch", "ultralytics", "supervision", "pandas")   # Never imported by startup or a re-render
+
+# --- Equivalence Checks ---
+EQUIVALENCE_FRAMES = 5_000                    # Synthetic match length the fast paths are checked on
+EQUIVALENCE_HEATMAPS = 24                     # Synthetic court heatmap sets per decoder check
+EQUIVALENCE_HEATMAP_SIGMA = 14.0              # Keypoint blob spread (heatmap pixels), about what the court model outputs
+EQUIVALENCE_TRUTH_RADIUS = 10.0               # Pixels: pandas ball output this close to the synthetic truth counts as right
+# Limits per metric (max_abs, mean_abs, p95_abs, mismatch_ratio); checks not listed must match exactly
+EQUIVALENCE_DEFAULT_TOLERANCE = {"max_abs": 1e-6, "mismatch_ratio": 0.0}
+# ball_kalman on the legacy stubs (no ground truth): every frame, including the false positives pandas keeps
+EQUIVALENCE_BALL_KALMAN_STUB_TOLERANCE = {"mean_abs": 13.5, "p95_abs": 50.0, "mismatch_ratio": 0.005}
+EQUIVALENCE_TOLERANCES = {
+    # Different ball models, compared on the frames where pandas is within EQUIVALENCE_TRUTH_RADIUS of the true ball
+    "ball_kalman": {"mean_abs": 6.5, "p95_abs": 8.5, "mismatch_ratio": 0.005},
+    # Fixed-lag vs. full smoothing: the lag cannot see across longer detection gaps (real footage misses about half)
+    "ball_kalman_online": {"mean_abs": 5.0, "p95_abs": 40.0, "mismatch_ratio": 0.01},
+    # Video pixels at 1080p (~3 per heatmap pixel). Hough can miss blobs cut by the border, where argmax still finds them
+    "court_peak": {"max_abs": 12.0, "mean_abs": 3.0, "mismatch_ratio": 0.02},
+    "court_peak_subpixel": {"max_abs": 12.0, "mean_abs": 3.0, "mismatch_ratio": 0.02},
+}
@@ -8,4 +8,12 @@ TRACKER_LOST_BUFFER = 30
 MAX_PIXEL_MOVE_PER_FRAME = 100  # Max pixels ball can move in 1 frame before deemed a false positive
 INTERPOLATE_LIMIT = 20          # Max frames to guess missing ball positions (~0.6s at 30fps)
 ROLLING_WINDOW = 5              # Window size for smoothing the ball's trajectory
-BFILL_LIMIT = 5                 # Edge padding limit
\ No newline at end of file
+BFILL_LIMIT = 5                 # Edge padding limit
+
+# --- Kalman Ball Filter ---
+BALL_KALMAN_LAG = 6                       # Fixed-lag smoothing window (frames of output latency) in online mode
+BALL_KALMAN_PROCESS_NOISE = 2.0           # Jerk noise intensity (px/frame^3)^2 of the constant-acceleration model
+BALL_KALMAN_MEASUREMENT_NOISE = 4.0       # Detection center/size noise (std, pixels)
+BALL_KALMAN_GATE = 13.8                   # Chi-square gate on the 2D center innovation (99.9%); replaces the pixel jump limit
+BALL_KALMAN_INITIAL_SPEED = 50.0          # Velocity std (px/frame) of a newly acquired track
+BALL_KALMAN_INITIAL_ACCELERATION = 10.0   # Acceleration std (px/frame^2) of a newly acquired track
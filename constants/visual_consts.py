@@ -29,6 +29,13 @@ RADAR_LINE_COLOR = (255, 255, 255)   # White court lines
 RADAR_PLAYER_COLOR = (0, 0, 255)     # Red dots for players
 RADAR_BALL_COLOR = (0, 255, 255)     # Yellow dot for the ball
 
+# --- Mini-Court Projection Window (Frames) ---
+HEIGHT_WINDOW_BEFORE = 20       # Past frames searched for a player's reference (max) bbox height
+HEIGHT_WINDOW_AFTER = 50        # Future frames searched for a player's reference (max) bbox height
+REFERENCE_KEYPOINT_INDICES = [0, 2, 12, 13]  # Baseline corner keypoints used as projection anchors
+HOMOGRAPHY_RANSAC_THRESHOLD = 5.0            # Max keypoint reprojection error (pixels) for homography inliers
+HOMOGRAPHY_CACHE_SIZE = 64                   # Keypoint sets whose fitted homography is kept (LRU)
+
 # --- Real World Court Dimensions (Meters) ---
 DOUBLE_LINE_WIDTH = 10.97
 HALF_COURT_LINE_HEIGHT = 11.88
@@ -1,51 +1,135 @@
-from utils.bbox_utils import measure_distance
+import numpy as np
+from utils.track_store import is_columnar
 from constants.visual_consts import DOUBLE_LINE_WIDTH
+from constants.pipeline_consts import SPEED_FRAME_WINDOW
 
 class PhysicsEngine:
     def __init__(self, fps, mini_court_width):
         self.fps = fps
         # 10.97 meters / radar_width_pixels = a constant uniform conversion ratio
         self.meters_per_pixel = DOUBLE_LINE_WIDTH / mini_court_width
+        # Running totals per track (speed: per frame window), carried between calls when processing a video in windows
+        self.total_distance = {}
+        self.last_speed = {}
 
-    def add_speed_and_distance_to_tracks(self, tracks, frame_window=12):
-        """Calculates distance and speed. Default window is 12 frames (0.5 seconds at 24fps) to smooth jitter."""
-        total_distance = {}
-        last_speed = {}
-
-        for frame_num in range(len(tracks["players"])):
-            for track_id, player in tracks["players"][frame_num].items():
-                if track_id not in total_distance:
-                    total_distance[track_id] = 0.0
-                    last_speed[track_id] = 0.0
-
-                # 1. Calculate Frame-by-Frame Distance (Total Distance)
-                if frame_num > 0 and track_id in tracks["players"][frame_num - 1]:
-                    prev_pos = tracks["players"][frame_num - 1][track_id].get("mini_court_position")
-                    curr_pos = player.get("mini_court_position")
-                    
-                    if prev_pos and curr_pos:
-                        dist_pixels = measure_distance(prev_pos, curr_pos)
-                        dist_meters = dist_pixels * self.meters_per_pixel
-                        total_distance[track_id] += dist_meters
-
-                # 2. Calculate Windowed Speed (km/h)
-                if frame_num >= frame_window:
-                    prev_window_player = tracks["players"][frame_num - frame_window].get(track_id)
-                    if prev_window_player:
-                        prev_window_pos = prev_window_player.get("mini_court_position")
-                        curr_pos = player.get("mini_court_position")
-                        
-                        if prev_window_pos and curr_pos:
-                            dist_pixels = measure_distance(prev_window_pos, curr_pos)
-                            dist_meters = dist_pixels * self.meters_per_pixel
-                            
-                            time_elapsed = frame_window / self.fps
-                            speed_mps = dist_meters / time_elapsed
-                            speed_kmh = speed_mps * 3.6  # Convert m/s to km/h
-                            last_speed[track_id] = speed_kmh
-
-                # 3. Store the physics data natively inside the tracks dictionary
-                player['distance'] = total_distance[track_id]
-                player['speed'] = last_speed[track_id]
-
-        return tracks
\ No newline at end of file
+    def add_speed_and_distance_to_tracks(self, tracks, frame_window=SPEED_FRAME_WINDOW, start_frame=0):
+        """Calculates distance and speed. Default window is 12 frames (0.5 seconds at 24fps) to smooth jitter.
+
+        With start_frame > 0, frames before it are treated as already-processed context
+        and the running totals continue from the previous call (streaming mode).
+        """
+        if start_frame == 0:
+            self.total_distance = {}
+            self.last_speed = {}
+
+        if is_columnar(tracks):
+            store = tracks["players"]
+            track_ids = store.track_ids()
+            positions, valid = store.dense("mini_court_position", track_ids)
+            _, present = store.dense("bbox", track_ids)
+        else:
+            track_ids, positions, valid, present = self._gather_positions(tracks["players"])
+
+        distance, speeds = self.compute_speed_and_distance(
+            track_ids, positions, valid, present, (frame_window,), start_frame
+        )
+        speed = speeds[frame_window]
+
+        # Store the physics data natively inside the tracks
+        if is_columnar(tracks):
+            write = present.copy()
+            write[:start_frame] = False
+            store.set_dense("distance", distance, track_ids, write)
+            store.set_dense("speed", speed, track_ids, write)
+        else:
+            columns = {track_id: col for col, track_id in enumerate(track_ids)}
+            for frame_num in range(start_frame, len(tracks["players"])):
+                for track_id, player in tracks["players"][frame_num].items():
+                    col = columns[track_id]
+                    player['distance'] = float(distance[frame_num, col])
+                    player['speed'] = float(speed[frame_num, col])
+
+        return tracks
+
+    def compute_speed_and_distance(self, track_ids, positions, valid, present, frame_windows=(SPEED_FRAME_WINDOW,), start_frame=0):
+        """Vectorized core over a whole match (or window) at once.
+
+        positions: (frames, tracks, 2) mini-court pixels, valid: position available,
+        present: track exists in the frame. Several speed windows are computed in one pass.
+        Returns (distance, {frame_window: speed}) as (frames, tracks) arrays in meters and km/h;
+        rows before start_frame are context and left as NaN.
+        """
+        num_frames, num_tracks = present.shape
+        active = present[start_frame:].any(axis=0)
+
+        # 1. Calculate Frame-by-Frame Distance (Total Distance), summed in frame order on top of the carried totals
+        step = np.zeros((num_frames, num_tracks))
+        if num_frames > 1:
+            moved = valid[1:] & valid[:-1]
+            step[1:][moved] = self._distance_meters(positions[1:], positions[:-1])[moved]
+        initial = np.array([self.total_distance.get(track_id, 0.0) for track_id in track_ids])
+        distance = np.full((num_frames, num_tracks), np.nan)
+        distance[start_frame:] = np.cumsum(np.vstack([initial[None], step[start_frame:]]), axis=0)[1:]
+
+        # 2. Calculate Windowed Speed (km/h); frames without a valid window hold the last speed
+        speeds = {}
+        for frame_window in frame_windows:
+            last_speed = self.last_speed.setdefault(frame_window, {})
+            computed = np.zeros((num_frames, num_tracks), dtype=bool)
+            raw_speed = np.zeros((num_frames, num_tracks))
+            if num_frames > frame_window:
+                computed[frame_window:] = valid[frame_window:] & valid[:-frame_window]
+                dist_meters = self._distance_meters(positions[frame_window:], positions[:-frame_window])
+                time_elapsed = frame_window / self.fps
+                raw_speed[frame_window:] = dist_meters / time_elapsed * 3.6  # m/s -> km/h
+
+            initial = np.array([last_speed.get(track_id, 0.0) for track_id in track_ids])
+            speed = np.full((num_frames, num_tracks), np.nan)
+            speed[start_frame:] = self._hold_last(raw_speed[start_frame:], computed[start_frame:], initial)
+            speeds[frame_window] = speed
+
+            for col in np.flatnonzero(active):
+                last_speed[track_ids[col]] = float(speed[-1, col])
+
+        for col in np.flatnonzero(active):
+            self.total_distance[track_ids[col]] = float(distance[-1, col])
+
+        return distance, speeds
+
+    def _distance_meters(self, p1, p2):
+        """Element-wise measure_distance converted to meters.
+
+        Uses correctly-rounded sqrt, so results can differ from the scalar `**0.5` (libm pow) by 1 ULP.
+        """
+        dx = p1[..., 0] - p2[..., 0]
+        dy = p1[..., 1] - p2[..., 1]
+        return np.sqrt(dx * dx + dy * dy) * self.meters_per_pixel
+
+    @staticmethod
+    def _hold_last(values, computed, initial):
+        """Forward-fills values along axis 0 wherever computed is False, starting from initial."""
+        values = np.vstack([initial[None], values])
+        computed = np.vstack([np.ones((1, values.shape[1]), dtype=bool), computed])
+        index = np.where(computed, np.arange(len(values))[:, None], 0)
+        np.maximum.accumulate(index, axis=0, out=index)
+        return values[index, np.arange(values.shape[1])][1:]
+
+    @staticmethod
+    def _gather_positions(player_frames):
+        """Packs legacy per-frame dicts into dense (frames, tracks) arrays."""
+        columns = {}
+        entries = []
+        for frame_num, player_dict in enumerate(player_frames):
+            for track_id, player in player_dict.items():
+                col = columns.setdefault(track_id, len(columns))
+                entries.append((frame_num, col, player.get("mini_court_position")))
+
+        positions = np.full((len(player_frames), len(columns), 2), np.nan)
+        valid = np.zeros((len(player_frames), len(columns)), dtype=bool)
+        present = np.zeros((len(player_frames), len(columns)), dtype=bool)
+        for frame_num, col, position in entries:
+            present[frame_num, col] = True
+            if position:
+                positions[frame_num, col] = position[:2]
+                valid[frame_num, col] = True
+        return list(columns), positions, valid, present
@@ -1,55 +1,103 @@
+import os
 import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from .entity_annotator import EntityAnnotator
 from utils.logger import logger
+from utils.profiler import profiler
 from constants.visual_consts import PLAYER_COLOR, BALL_COLOR
+from constants.pipeline_consts import RENDER_CHUNKS_PER_WORKER
 
 class Annotator:
-    def __init__(self):
+    def __init__(self, workers=1):
         logger.info("Initializing Video Annotator...")
         self.entity_annotator = EntityAnnotator()
+        # Rendering threads; OpenCV drawing releases the GIL, so frames render in parallel
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self._pool = None
         
-    def draw_annotations(self, video_frames, tracks, court_keypoints=None, mini_court=None):
+    def draw_annotations(self, video_frames, tracks, court_keypoints=None, mini_court=None, in_place=False):
+        """Annotates every frame. With in_place=True, frames are drawn on directly instead of copied."""
         logger.info("Drawing visual annotations onto video frames...")
-        output_video_frames = []
+        num_frames = len(video_frames)
+        # Court keypoints are either one set for the whole clip or one set per frame
+        if court_keypoints is not None and np.ndim(court_keypoints) == 2:
+            frame_keypoints = court_keypoints
+        else:
+            frame_keypoints = [court_keypoints] * num_frames
 
-        for frame_num, frame in enumerate(video_frames):
+        output_video_frames = self.draw_frames(
+            video_frames, tracks.get("players", []), tracks.get("ball", []), frame_keypoints, mini_court, in_place
+        )
+        logger.info("Annotation processing complete.")
+        return output_video_frames
+
+    def draw_frames(self, frames, player_dicts, ball_dicts, frame_keypoints, mini_court=None, in_place=False):
+        """Renders a frame range, split into contiguous chunks across the worker pool. Output keeps frame order."""
+        num_frames = len(frames)
+        output_video_frames = [None] * num_frames
+        if num_frames == 0:
+            return output_video_frames
+        if mini_court is not None:
+            # Build the shared radar layer once, before the workers need it
+            mini_court.get_overlay_layer(frames[0].shape)
+
+        def render(start, stop):
+            for frame_num in range(start, stop):
+                output_video_frames[frame_num] = self.draw_frame(
+                    frames[frame_num], player_dicts[frame_num], ball_dicts[frame_num],
+                    frame_keypoints[frame_num], mini_court, copy=not in_place
+                )
+
+        if self.workers == 1 or num_frames == 1:
+            render(0, num_frames)
+            return output_video_frames
+
+        # A few chunks per worker keeps them busy when frames differ in cost
+        chunk_size = -(-num_frames // (self.workers * RENDER_CHUNKS_PER_WORKER))
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="Annotator")
+        futures = [self._pool.submit(render, start, min(start + chunk_size, num_frames))
+                   for start in range(0, num_frames, chunk_size)]
+        for future in futures:
+            future.result()
+        return output_video_frames
+
+    @profiler.span()
+    def draw_frame(self, frame, player_dict, ball_dict, court_keypoints=None, mini_court=None, copy=True):
+        """Draws all overlays for a single frame. Returns an annotated copy (or the frame itself if copy=False)."""
+        if copy:
             frame = frame.copy()
-            player_dict = tracks.get("players", [])[frame_num]
-            ball_dict = tracks.get("ball", [])[frame_num]
+
+        # 1. Draw Court Keypoints
+        if court_keypoints is not None:
+            frame = self.entity_annotator.draw_court_keypoints(frame, court_keypoints)
+
+        # 2. Draw Players and Physics Stats (Speed & Distance)
+        for track_id, player in player_dict.items():
+            frame = self.entity_annotator.draw_ellipse(frame, player["bbox"], PLAYER_COLOR, track_id)
             
-            # 1. Draw Court Keypoints
-            if court_keypoints is not None:
-                frame = self.entity_annotator.draw_court_keypoints(frame, court_keypoints)
+            speed = player.get('speed')
+            distance = player.get('distance')
+            if speed is not None or distance is not None:
+                frame = self.entity_annotator.draw_player_speed_and_distance(frame, player["bbox"], speed, distance)
+        
+        # 3. Draw Ball
+        for track_id, ball in ball_dict.items():
+            frame = self.entity_annotator.draw_triangle(frame, ball["bbox"], BALL_COLOR)
 
-            # 2. Draw Players and Physics Stats (Speed & Distance)
-            for track_id, player in player_dict.items():
-                frame = self.entity_annotator.draw_ellipse(frame, player["bbox"], PLAYER_COLOR, track_id)
-                
-                speed = player.get('speed')
-                distance = player.get('distance')
-                if speed is not None or distance is not None:
-                    frame = self.entity_annotator.draw_player_speed_and_distance(frame, player["bbox"], speed, distance)
+        # 4. Draw the Mini Court Radar
+        if mini_court is not None:
+            frame = mini_court.draw_overlay(frame)
             
-            # 3. Draw Ball
+            for track_id, player in player_dict.items():
+                if "mini_court_position" in player:
+                    pos = player["mini_court_position"]
+                    cv2.circle(frame, (int(pos[0]), int(pos[1])), 5, PLAYER_COLOR, -1)
+                    
             for track_id, ball in ball_dict.items():
-                frame = self.entity_annotator.draw_triangle(frame, ball["bbox"], BALL_COLOR)
-
-            # 4. Draw the Mini Court Radar
-            if mini_court is not None:
-                frame = mini_court.draw_background_rectangle(frame)
-                frame = mini_court.draw_court(frame)
-                
-                for track_id, player in player_dict.items():
-                    if "mini_court_position" in player:
-                        pos = player["mini_court_position"]
-                        cv2.circle(frame, (int(pos[0]), int(pos[1])), 5, PLAYER_COLOR, -1)
-                        
-                for track_id, ball in ball_dict.items():
-                    if "mini_court_position" in ball:
-                        pos = ball["mini_court_position"]
-                        cv2.circle(frame, (int(pos[0]), int(pos[1])), 5, BALL_COLOR, -1)
-
-            output_video_frames.append(frame)
-            
-        logger.info("Annotation processing complete.")
-        return output_video_frames
\ No newline at end of file
+                if "mini_court_position" in ball:
+                    pos = ball["mini_court_position"]
+                    cv2.circle(frame, (int(pos[0]), int(pos[1])), 5, BALL_COLOR, -1)
+
+        return frame
@@ -109,4 +109,11 @@ class EntityAnnotator:
                 TEXT_COLOR,
                 2
             )
-        return frame
\ No newline at end of file
+        return frame
+
+    def draw_status_text(self, frame, text):
+        """Draws a line of status text on a white box in the top-left corner."""
+        text_size = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, FONT_SCALE, FONT_THICKNESS)[0]
+        cv2.rectangle(frame, (10, 10), (20 + text_size[0], 20 + text_size[1]), TEXT_BG_COLOR, cv2.FILLED)
+        cv2.putText(frame, text, (15, 15 + text_size[1]), cv2.FONT_HERSHEY_SIMPLEX, FONT_SCALE, TEXT_COLOR, FONT_THICKNESS)
+        return frame
@@ -1,23 +1,27 @@
+from collections import OrderedDict
 import cv2
 import numpy as np
 from utils.bbox_utils import (
     convert_meters_to_pixel_distance,
     convert_pixel_distance_to_meters,
-    get_foot_position,
-    get_closest_keypoint_index,
-    get_height_of_bbox,
-    measure_xy_distance,
-    get_center_of_bbox,
-    measure_distance
+    get_closest_keypoint_indices,
+    measure_xy_distance
 )
+from utils.logger import logger
+from utils.track_store import TrackStore, is_columnar
 from constants.visual_consts import (
     DOUBLE_LINE_WIDTH, HALF_COURT_LINE_HEIGHT, DOUBLE_ALLY_DIFFERENCE,
     NO_MANS_LAND_HEIGHT, SINGLE_LINE_WIDTH, 
-    PLAYER_1_HEIGHT_METERS, PLAYER_2_HEIGHT_METERS
+    PLAYER_1_HEIGHT_METERS, PLAYER_2_HEIGHT_METERS,
+    HEIGHT_WINDOW_BEFORE, HEIGHT_WINDOW_AFTER,
+    REFERENCE_KEYPOINT_INDICES, HOMOGRAPHY_RANSAC_THRESHOLD, HOMOGRAPHY_CACHE_SIZE
 )
 
 class MiniCourt:
-    def __init__(self, frame):
+    def __init__(self, frame, projection_method="keypoint"):
+        self.projection_method = projection_method
+        self._homography_cache = OrderedDict()   # LRU: per-frame keypoints would otherwise add one entry per frame
+        self._overlay_cache = {}
         self.drawing_rectangle_width = 250
         self.drawing_rectangle_height = 500
         self.buffer = 50
@@ -100,6 +104,55 @@ class MiniCourt:
 
         return frame
 
+    def draw_overlay(self, frame):
+        """Blends the static radar (background box + court) onto the frame in place, touching only its ROI."""
+        roi, _, color, opaque = self._get_overlay(frame.shape)
+        if roi is None:
+            return frame
+        region = frame[roi]
+        # Same arithmetic as draw_background_rectangle + draw_court, restricted to the box
+        blended = cv2.addWeighted(region, 0.5, color, 0.5, 0)
+        np.copyto(blended, color, where=opaque)
+        region[...] = blended
+        return frame
+
+    def get_overlay_layer(self, frame_shape):
+        """The pre-rendered radar as an ROI-sized BGRA layer: returns (roi slices, layer), or (None, None).
+
+        Alpha 255 marks the opaque court drawing, 128 the half-transparent white background.
+        """
+        return self._get_overlay(frame_shape)[:2]
+
+    def _get_overlay(self, frame_shape):
+        """Renders the overlay once per frame size. Returns (roi, layer, contiguous color, opaque mask)."""
+        height, width = frame_shape[:2]
+        if (height, width) in self._overlay_cache:
+            return self._overlay_cache[(height, width)]
+
+        # 1. Clip the background box to the frame
+        x0, y0 = max(self.start_x, 0), max(self.start_y, 0)
+        x1, y1 = min(self.end_x + 1, width), min(self.end_y + 1, height)
+        if x0 >= x1 or y0 >= y1:
+            self._overlay_cache[(height, width)] = (None, None, None, None)
+            return self._overlay_cache[(height, width)]
+
+        # 2. Draw the court on two scratch canvases; a pixel belongs to the drawing if either one changed
+        canvases = [np.full((y1, x1, 3), fill, np.uint8) for fill in (0, 255)]
+        for canvas in canvases:
+            self.draw_court(canvas)
+        dark, light = (canvas[y0:y1, x0:x1] for canvas in canvases)
+        drawn = (dark != 0).any(axis=2) | (light != 255).any(axis=2)
+
+        # 3. Pack color + alpha into one layer
+        layer = np.empty((y1 - y0, x1 - x0, 4), np.uint8)
+        layer[..., :3] = np.where(drawn[..., None], dark, 255)
+        layer[..., 3] = np.where(drawn, 255, 128)
+
+        self._overlay_cache[(height, width)] = (
+            (slice(y0, y1), slice(x0, x1)), layer, np.ascontiguousarray(layer[..., :3]), drawn[..., None]
+        )
+        return self._overlay_cache[(height, width)]
+
     def draw_background_rectangle(self, frame):
         shapes = np.zeros_like(frame, np.uint8)
         cv2.rectangle(shapes, (self.start_x, self.start_y), (self.end_x, self.end_y), (255, 255, 255), cv2.FILLED)
@@ -124,64 +177,223 @@ class MiniCourt:
         return (closest_mini_court_kp[0] + mini_court_x_dist,
                 closest_mini_court_kp[1] + mini_court_y_dist)
 
-    def convert_bounding_boxes_to_mini_court_coordinates(self, tracks, original_court_key_points):
-        player_heights = {1: PLAYER_1_HEIGHT_METERS, 2: PLAYER_2_HEIGHT_METERS}
+    def convert_bounding_boxes_to_mini_court_coordinates(self, tracks, original_court_key_points, start_frame=0, player_ids=None):
+        """Projects players (and the ball) onto the radar. Frames before start_frame are read-only context for the height window.
+
+        Runs as one batched pass over the whole match, using self.projection_method:
+        - "keypoint": closest baseline keypoint + player-height scaling (sliding-window max height)
+        - "homography": one cached court homography applied to every foot and ball center at once
+        original_court_key_points is either one (28,) set for the whole clip or a (num_frames, 28) array.
+        """
+        columnar = is_columnar(tracks)
+        players = tracks["players"] if columnar else TrackStore.from_frames(tracks["players"])
+        ball = tracks["ball"] if columnar else TrackStore.from_frames(tracks["ball"])
+        original_court_key_points = np.asarray(original_court_key_points, dtype=np.float64)
+
+        # Ball row (track id 1) of every frame, -1 when there is no ball
+        ball_rows = np.flatnonzero(ball.track_id == 1)
+        ball_row_of_frame = np.full(players.num_frames, -1)
+        ball_row_of_frame[ball.frame[ball_rows]] = ball_rows
+
+        if self.projection_method == "homography":
+            projected = self._project_with_homography(players, ball, ball_row_of_frame, original_court_key_points, player_ids)
+        else:
+            projected = self._project_with_keypoints(
+                players, ball, ball_row_of_frame, original_court_key_points, player_ids
+            )
+        player_positions, ball_frames, ball_positions = projected
+
+        # Write the results back (frames before start_frame are left untouched)
+        player_write = players.frame >= start_frame
+        ball_write = ball_frames >= start_frame
+        if columnar:
+            players.set("mini_court_position", player_positions[player_write], rows=player_write)
+            ball.set("mini_court_position", ball_positions[ball_write], rows=ball_row_of_frame[ball_frames[ball_write]])
+            return tracks
+
+        row = 0
+        for player_dict in tracks["players"]:
+            for player in player_dict.values():
+                if player_write[row]:
+                    player["mini_court_position"] = tuple(player_positions[row].tolist())
+                row += 1
+        for frame_num, position in zip(ball_frames[ball_write].tolist(), ball_positions[ball_write]):
+            tracks["ball"][frame_num][1]["mini_court_position"] = tuple(position.tolist())
+
+        return tracks
+
+    def _project_with_keypoints(self, players, ball, ball_row_of_frame, original_court_key_points, player_ids):
+        """Closest-keypoint + height-scaling projection. Returns (player_positions, ball_frames, ball_positions)."""
+        num_frames = players.num_frames
 
         # Dynamically map Tracker IDs to 1 and 2
         unique_ids = set()
-        for frame_dict in tracks["players"]:
-            unique_ids.update(frame_dict.keys())
+        if player_ids is not None:
+            unique_ids.update(player_ids)
+        else:
+            unique_ids.update(players.track_id.tolist())
         unique_ids = list(unique_ids)
         id_map = {tid: (1 if idx == 0 else 2) for idx, tid in enumerate(unique_ids)}
+        player_heights = {1: PLAYER_1_HEIGHT_METERS, 2: PLAYER_2_HEIGHT_METERS}
+        height_in_meters = np.array([player_heights.get(id_map.get(tid, 1), 1.88) for tid in players.track_id.tolist()])
+
+        # 1. Reference height: max bbox height of the same track within the surrounding frame window
+        bbox = players.get("bbox")
+        track_ids = players.track_ids()
+        track_cols, _ = players.track_columns(track_ids)
+        heights = np.full((num_frames, len(track_ids)), -np.inf)
+        heights[players.frame, track_cols] = bbox[:, 3] - bbox[:, 1]
+        window_max = _sliding_window_max(heights, HEIGHT_WINDOW_BEFORE, HEIGHT_WINDOW_AFTER)
+        max_player_height_in_pixels = window_max[players.frame, track_cols]
+
+        # 2. Project the players' feet
+        player_positions = self._project_points(
+            _foot_positions(bbox), _key_points_for(original_court_key_points, players.frame),
+            max_player_height_in_pixels, height_in_meters
+        )
+
+        # 3. Project the ball using the reference height of the player closest to it
+        ball_centers = _center_positions(ball.get("bbox"))
+        candidate = np.flatnonzero(ball_row_of_frame[players.frame] >= 0)
+        candidate_ball = ball_centers[ball_row_of_frame[players.frame[candidate]]]
+        dist_sq = ((candidate_ball - _center_positions(bbox[candidate])) ** 2).sum(axis=1)
+        # First (dict-order) closest player per frame
+        order = np.lexsort((candidate, dist_sq, players.frame[candidate]))
+        frames_sorted = players.frame[candidate[order]]
+        first = np.r_[True, frames_sorted[1:] != frames_sorted[:-1]]
+        closest_rows = candidate[order[first]]
+
+        ball_frames = players.frame[closest_rows]
+        ball_positions = self._project_points(
+            ball_centers[ball_row_of_frame[ball_frames]], _key_points_for(original_court_key_points, ball_frames),
+            max_player_height_in_pixels[closest_rows], height_in_meters[closest_rows]
+        )
+        return player_positions, ball_frames, ball_positions
+
+    def _project_with_homography(self, players, ball, ball_row_of_frame, original_court_key_points, player_ids):
+        """Court-plane homography projection: one perspectiveTransform call per distinct keypoint set.
+
+        Points whose keypoint set cannot be fitted (fewer than 4 keypoints, or RANSAC fails)
+        fall back to keypoint projection; every other point keeps its homography projection.
+        """
+        foot_positions = _foot_positions(players.get("bbox"))
+        ball_frames = np.flatnonzero(ball_row_of_frame >= 0)
+        ball_centers = _center_positions(ball.get("bbox"))[ball_row_of_frame[ball_frames]]
+
+        points = np.concatenate([foot_positions, ball_centers])
+        point_frames = np.concatenate([players.frame, ball_frames])
+        projected = np.empty_like(points)
+        fitted = np.ones(len(points), dtype=bool)
+
+        if original_court_key_points.ndim == 1:
+            key_point_sets, set_of_point = original_court_key_points[None], np.zeros(len(points), dtype=np.int64)
+        else:
+            # Group frames by identical keypoint set (byte-wise, so NaNs compare equal)
+            rows = np.ascontiguousarray(original_court_key_points)
+            _, first, inverse = np.unique(rows.view(np.dtype((np.void, rows.dtype.itemsize * rows.shape[1]))),
+                                          return_index=True, return_inverse=True)
+            key_point_sets, set_of_point = rows[first], inverse.reshape(-1)[point_frames]
+
+        failed_sets = 0
+        for set_index, key_points in enumerate(key_point_sets):
+            in_set = set_of_point == set_index
+            if not in_set.any():
+                continue
+            homography = self.get_homography(key_points)
+            if homography is None:
+                failed_sets += 1
+                fitted[in_set] = False
+                continue
+            projected[in_set] = cv2.perspectiveTransform(points[in_set].reshape(-1, 1, 2), homography).reshape(-1, 2)
+
+        num_players = len(foot_positions)
+        player_positions, ball_positions = projected[:num_players], projected[num_players:]
+        if not failed_sets:
+            return player_positions, ball_frames, ball_positions
+
+        # Fallback for the unfitted points only. Keypoint projection places the ball only in frames with a player
+        player_fitted, ball_fitted = fitted[:num_players], fitted[num_players:]
+        logger.warning(f"[mini_court] No homography for {failed_sets}/{len(key_point_sets)} keypoint sets; "
+                       f"{(~player_fitted).sum()} player and {(~ball_fitted).sum()} ball positions use keypoint projection.")
+        fallback_players, fallback_ball_frames, fallback_ball = self._project_with_keypoints(
+            players, ball, ball_row_of_frame, original_court_key_points, player_ids
+        )
+        player_positions[~player_fitted] = fallback_players[~player_fitted]
+        fallback_row = np.full(players.num_frames, -1)
+        fallback_row[fallback_ball_frames] = np.arange(len(fallback_ball_frames))
+        refill = ~ball_fitted & (fallback_row[ball_frames] >= 0)
+        ball_positions[refill] = fallback_ball[fallback_row[ball_frames[refill]]]
+        keep = ball_fitted | refill
+        return player_positions, ball_frames[keep], ball_positions[keep]
+
+    def get_homography(self, original_court_key_points):
+        """Fits (and caches) the image -> mini-court homography for one set of 14 court keypoints.
+
+        Returns None when fewer than 4 keypoints were detected. The last HOMOGRAPHY_CACHE_SIZE
+        keypoint sets are kept, so memory stays flat however many sets a match goes through.
+        """
+        original_court_key_points = np.asarray(original_court_key_points, dtype=np.float64)
+        cache_key = original_court_key_points.tobytes()
+        if cache_key in self._homography_cache:
+            self._homography_cache.move_to_end(cache_key)
+        else:
+            src = original_court_key_points.reshape(-1, 2)
+            dst = np.asarray(self.drawing_key_points, dtype=np.float64).reshape(-1, 2)
+            found = ~np.isnan(src).any(axis=1)
+            homography = None
+            if found.sum() >= 4:
+                homography, _ = cv2.findHomography(src[found], dst[found], cv2.RANSAC, HOMOGRAPHY_RANSAC_THRESHOLD)
+            self._homography_cache[cache_key] = homography
+            if len(self._homography_cache) > HOMOGRAPHY_CACHE_SIZE:
+                self._homography_cache.popitem(last=False)
+        return self._homography_cache[cache_key]
+
+    def _project_points(self, points, original_court_key_points, heights_in_pixels, heights_in_meters):
+        """Vectorized get_mini_court_coordinates for (n, 2) points, each anchored on its closest keypoint.
+
+        original_court_key_points is one (28,) set or one (n, 28) set per point.
+        """
+        keypoint_index = get_closest_keypoint_indices(points, original_court_key_points, REFERENCE_KEYPOINT_INDICES)
+        if original_court_key_points.ndim == 1:
+            closest_key_points = original_court_key_points.reshape(-1, 2)[keypoint_index]
+        else:
+            closest_key_points = original_court_key_points.reshape(len(points), -1, 2)[np.arange(len(points)), keypoint_index]
+        drawing_key_points = np.asarray(self.drawing_key_points, dtype=np.float64).reshape(-1, 2)[keypoint_index]
+
+        dist_meters = convert_pixel_distance_to_meters(
+            points - closest_key_points, heights_in_meters[:, None], heights_in_pixels[:, None]
+        )
+        return drawing_key_points + self.convert_meters_to_pixels(dist_meters)
+
+
+def _key_points_for(original_court_key_points, frames):
+    """Keypoints to use for rows in the given frames: the shared (28,) set, or each frame's row."""
+    if original_court_key_points.ndim == 1:
+        return original_court_key_points
+    return original_court_key_points[frames]
+
+
+def _foot_positions(bbox):
+    """Vectorized get_foot_position for an (n, 4) bbox array (int truncation included)."""
+    return np.stack([np.trunc((bbox[:, 0] + bbox[:, 2]) / 2), np.trunc(bbox[:, 3])], axis=1)
+
+
+def _center_positions(bbox):
+    """Vectorized get_center_of_bbox for an (n, 4) bbox array (int truncation included)."""
+    return np.stack([np.trunc((bbox[:, 0] + bbox[:, 2]) / 2), np.trunc((bbox[:, 1] + bbox[:, 3]) / 2)], axis=1)
+
+
+def _sliding_window_max(values, before, after):
+    """max(values[f - before : f + after]) along axis 0 for every f, in O(n) (van Herk / Gil-Werman)."""
+    num_frames = values.shape[0]
+    window = before + after
+    num_blocks = -(-(num_frames + window - 1) // window)
+
+    padded = np.full((num_blocks * window,) + values.shape[1:], -np.inf)
+    padded[before:before + num_frames] = values
+    blocks = padded.reshape((num_blocks, window) + values.shape[1:])
 
-        for frame_num, player_dict in enumerate(tracks["players"]):
-            ball_dict = tracks["ball"][frame_num]
-            
-            ball_position = None
-            if 1 in ball_dict and 'bbox' in ball_dict[1]:
-                ball_position = get_center_of_bbox(ball_dict[1]['bbox'])
-
-            closest_player_id_to_ball = None
-            if ball_position and player_dict:
-                closest_player_id_to_ball = min(
-                    player_dict.keys(), 
-                    key=lambda x: measure_distance(ball_position, get_center_of_bbox(player_dict[x]['bbox']))
-                )
-
-            for player_id, player in player_dict.items():
-                bbox = player['bbox']
-                foot_position = get_foot_position(bbox)
-
-                closest_key_point_index = get_closest_keypoint_index(foot_position, original_court_key_points, [0, 2, 12, 13])
-                closest_key_point = (original_court_key_points[closest_key_point_index*2], 
-                                     original_court_key_points[closest_key_point_index*2+1])
-
-                frame_index_min = max(0, frame_num - 20)
-                frame_index_max = min(len(tracks["players"]), frame_num + 50)
-                bboxes_heights_in_pixels = [
-                    get_height_of_bbox(tracks["players"][i][player_id]['bbox'])
-                    for i in range(frame_index_min, frame_index_max)
-                    if player_id in tracks["players"][i]
-                ]
-                max_player_height_in_pixels = max(bboxes_heights_in_pixels) if bboxes_heights_in_pixels else get_height_of_bbox(bbox)
-
-                mapped_id = id_map.get(player_id, 1)
-
-                mini_court_player_position = self.get_mini_court_coordinates(
-                    foot_position, closest_key_point, closest_key_point_index, 
-                    max_player_height_in_pixels, player_heights.get(mapped_id, 1.88)
-                )
-                player["mini_court_position"] = mini_court_player_position
-
-                if closest_player_id_to_ball == player_id and ball_position is not None:
-                    closest_kp_idx_ball = get_closest_keypoint_index(ball_position, original_court_key_points, [0, 2, 12, 13])
-                    closest_kp_ball = (original_court_key_points[closest_kp_idx_ball*2], 
-                                       original_court_key_points[closest_kp_idx_ball*2+1])
-                    
-                    mini_court_ball_position = self.get_mini_court_coordinates(
-                        ball_position, closest_kp_ball, closest_kp_idx_ball, 
-                        max_player_height_in_pixels, player_heights.get(mapped_id, 1.88)
-                    )
-                    tracks["ball"][frame_num][1]["mini_court_position"] = mini_court_ball_position
-
-        return tracks
\ No newline at end of file
+    prefix = np.maximum.accumulate(blocks, axis=1).reshape(padded.shape)
+    suffix = np.maximum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(padded.shape)
+    # Window f covers padded[f : f + window], which spans at most two blocks
+    return np.maximum(suffix[:num_frames], prefix[window - 1:window - 1 + num_frames])
@@ -0,0 +1,199 @@
+"""
+Batch runner: processes a directory or manifest of videos in one invocation, over a process pool.
+
+    python -m core.batch_runner data/input/ --output-dir data/output/batch --workers 2
+    python -m core.batch_runner manifest.txt    # one video path per line (relative to the manifest), '#' comments
+
+Each worker process builds one Pipeline and reuses it for every video it gets, so model
+weights are loaded once per worker instead of once per video. Every finished job is appended
+to <output-dir>/batch_state.jsonl right away. A re-run skips videos that already finished
+(same content fingerprint, output still present) and retries failed ones. Per-video
+throughput goes to <output-dir>/batch_summary.json.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from utils.logger import logger
+from utils.config_loader import cfg
+from utils.stub_manager import StubManager
+from constants import BATCH_VIDEO_EXTENSIONS, BATCH_STATE_FILE, BATCH_SUMMARY_FILE
+
+# The worker process' pipeline, built once by _init_worker
+_pipeline = None
+_jobs_run = 0
+
+
+def discover_jobs(source, output_dir):
+    """Jobs ({"video", "output"}) for a directory of videos or a manifest file, in a stable order."""
+    if os.path.isdir(source):
+        videos = sorted(os.path.join(source, name) for name in os.listdir(source)
+                        if name.lower().endswith(BATCH_VIDEO_EXTENSIONS))
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source) as f:
+            lines = [line.strip() for line in f]
+        videos = [os.path.join(base, line) for line in lines if line and not line.startswith("#")]
+
+    jobs, names = [], set()
+    for video in videos:
+        # Outputs are named after the video; same-named videos from different folders get a suffix
+        stem = name = os.path.splitext(os.path.basename(video))[0]
+        suffix = 1
+        while name in names:
+            suffix += 1
+            name = f"{stem}_{suffix}"
+        names.add(name)
+        jobs.append({"video": os.path.abspath(video), "output": os.path.abspath(os.path.join(output_dir, f"{name}.avi"))})
+    return jobs
+
+
+def load_state(state_path):
+    """Latest record per video from the state log."""
+    records = {}
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line cut short by a crash; that job simply runs again
+                    continue
+                records[record["video"]] = record
+    return records
+
+
+def is_done(job, record):
+    return (record is not None and record["status"] == "done" and os.path.exists(job["output"])
+            and record["fingerprint"] == StubManager.fingerprint(job["video"]))
+
+
+def _init_worker():
+    """Builds this worker's pipeline (models load on its first video that needs them, then stay loaded)."""
+    global _pipeline
+    from core.pipeline import Pipeline
+    # Batch jobs always run as files; unkeyed legacy stubs could match another video's frame count
+    cfg['pipeline']['live'] = False
+    for key in ('unified_stub', 'legacy_player_stub', 'legacy_ball_stub'):
+        cfg['paths'][key] = None
+    _pipeline = Pipeline(None, None)
+
+
+def _run_job(job):
+    global _jobs_run
+    _jobs_run += 1
+    record = {**job, "fingerprint": StubManager.fingerprint(job["video"]), "worker": os.getpid(),
+              "worker_job": _jobs_run, "error": None}
+
+    cap = cv2.VideoCapture(job["video"])
+    record["frames"] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    start = time.perf_counter()
+    try:
+        _pipeline.set_video(job["video"], job["output"])
+        _pipeline.run()
+        record["status"] = "done"
+    except Exception as e:
+        logger.exception(f"[batch] {job['video']} failed")
+        record["status"] = "failed"
+        record["error"] = repr(e)
+    record["seconds"] = round(time.perf_counter() - start, 3)
+    record["fps"] = round(record["frames"] / record["seconds"], 2) if record["seconds"] else 0.0
+    return record
+
+
+class BatchRunner:
+    def __init__(self, output_dir, workers=1):
+        self.output_dir = output_dir
+        self.workers = max(1, workers)
+        self.state_path = os.path.join(output_dir, BATCH_STATE_FILE)
+        os.makedirs(output_dir, exist_ok=True)
+
+    def run(self, jobs):
+        """Runs every job not already done. Returns the summary dict (also written to batch_summary.json)."""
+        # 1. Resume: skip jobs that finished in an earlier run
+        state = load_state(self.state_path)
+        todo = [job for job in jobs if not is_done(job, state.get(job["video"]))]
+        logger.info(f"[batch] {len(jobs)} videos, {len(jobs) - len(todo)} already done, "
+                    f"{len(todo)} to run on {min(self.workers, len(todo))} workers")
+
+        # 2. Schedule over the pool (spawned workers: CUDA does not survive fork); log each result as it lands
+        start = time.perf_counter()
+        if todo:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(todo)), mp_context=context,
+                                     initializer=_init_worker) as pool, open(self.state_path, "a") as state_file:
+                futures = {pool.submit(_run_job, job): job for job in todo}
+                for future in as_completed(futures):
+                    try:
+                        record = future.result()
+                    except Exception as e:
+                        # The worker process itself died (e.g. killed out of memory)
+                        record = {**futures[future], "fingerprint": None, "status": "failed", "error": repr(e),
+                                  "frames": 0, "seconds": 0.0, "fps": 0.0}
+                    state[record["video"]] = record
+                    state_file.write(json.dumps(record) + "\n")
+                    state_file.flush()
+                    logger.info(f"[batch] {record['status']}: {record['video']} "
+                                f"({record['frames']} frames in {record['seconds']:.1f}s, {record['fps']:.1f} fps)")
+
+        # 3. Summary of the whole batch, including jobs done by earlier runs
+        summary = self._summarize(jobs, state, time.perf_counter() - start, {job["video"] for job in todo})
+        with open(os.path.join(self.output_dir, BATCH_SUMMARY_FILE), "w") as f:
+            json.dump(summary, f, indent=2)
+        logger.info(f"[batch] {summary['done']}/{len(jobs)} done, {summary['failed']} failed | this run: "
+                    f"{summary['run_frames']} frames in {summary['run_seconds']:.1f}s ({summary['run_fps']:.1f} fps overall)")
+        return summary
+
+    @staticmethod
+    def _summarize(jobs, state, wall_seconds, ran):
+        videos = []
+        for job in jobs:
+            record = state.get(job["video"], {})
+            videos.append({
+                "video": job["video"],
+                "output": job["output"],
+                "status": record.get("status", "pending"),
+                "resumed": job["video"] not in ran,
+                "frames": record.get("frames"),
+                "seconds": record.get("seconds"),
+                "fps": record.get("fps"),
+                # A worker's first video also pays for loading the models
+                "includes_model_load": record.get("worker_job") == 1,
+                "error": record.get("error"),
+            })
+        run_frames = sum(video["frames"] or 0 for video in videos if not video["resumed"] and video["status"] == "done")
+        return {
+            "videos": videos,
+            "done": sum(video["status"] == "done" for video in videos),
+            "failed": sum(video["status"] == "failed" for video in videos),
+            "run_frames": run_frames,
+            "run_seconds": round(wall_seconds, 3),
+            "run_fps": round(run_frames / wall_seconds, 2) if wall_seconds else 0.0,
+        }
+
+
+def main():
+    batch_cfg = cfg.get('batch', {})
+    parser = argparse.ArgumentParser(description="Process a directory or manifest of videos over a process pool.")
+    parser.add_argument("source", help="Directory of videos, or a manifest file with one video path per line")
+    parser.add_argument("--output-dir", default=batch_cfg.get('output_dir', 'data/output/batch'),
+                        help="Annotated videos, the resume state and the summary go here")
+    parser.add_argument("--workers", type=int, default=batch_cfg.get('workers', 1),
+                        help="Worker processes; each loads its own copy of the models")
+    args = parser.parse_args()
+
+    jobs = discover_jobs(args.source, args.output_dir)
+    if not jobs:
+        logger.error(f"No videos found in {args.source}")
+        return
+    BatchRunner(args.output_dir, workers=args.workers).run(jobs)
+
+
+if __name__ == "__main__":
+    main()
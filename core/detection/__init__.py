@@ -1,2 +1,28 @@
-from .detector import Detector
-from .court_detector import CourtDetector
+# Exports resolve on first access (PEP 562): the detectors pull in torch and ultralytics,
+# which runs from cached tracks and court keypoints never need.
+_EXPORTS = {
+    "Detector": ".detector",
+    "FrameDetections": ".detections",
+    "BallSearch": ".ball_search",
+    "KeyframeScheduler": ".keyframe_scheduler",
+    "DetectionStage": ".detection_stage",
+    "CourtDetector": ".court_detector",
+    "CourtHeatmapDecoder": ".court_decoder",
+    "CourtKeypointTrack": ".court_tracker",
+    "CourtFlowTracker": ".court_tracker",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    import importlib
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
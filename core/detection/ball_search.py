@@ -0,0 +1,215 @@
+from collections import deque
+import cv2
+import numpy as np
+from .detections import FrameDetections
+from constants import (
+    CLASS_BALL,
+    MAX_PIXEL_MOVE_PER_FRAME,
+    DETECTION_CONFIDENCE_THRESHOLD,
+    BALL_ROI_SIZE,
+    BALL_ROI_BATCH_SIZE,
+    BALL_ROI_LOST_PATIENCE,
+    BALL_FULL_FRAME_IMGSZ,
+    BALL_TILE_SIZE,
+    BALL_TILE_OVERLAP,
+    BALL_TILE_NMS_IOU
+)
+
+
+class BallSearch:
+    """Trajectory-guided ball detection: the ball model only sees a crop around where the ball should be.
+
+    The window is centered on a constant-velocity prediction from the last detections and is
+    detected at native resolution (imgsz = crop size), so it is both cheaper than a full
+    frame and better for small balls, which a full-frame pass downscales. A crop miss keeps the
+    prediction going; only after `lost_patience` consecutive misses does the search switch to the
+    fallback ("full" frame or native-resolution "tiled"), until the fallback finds the ball again.
+    Frames must be fed in order: the trajectory carries over between calls.
+    """
+
+    FALLBACKS = ("full", "tiled")
+
+    def __init__(self, ball_detector, conf=DETECTION_CONFIDENCE_THRESHOLD, fallback="full",
+                 roi_size=BALL_ROI_SIZE, lost_patience=BALL_ROI_LOST_PATIENCE):
+        if fallback not in self.FALLBACKS:
+            raise ValueError(f"Unknown ball search fallback '{fallback}'. Choose from {self.FALLBACKS}.")
+        self.ball_detector = ball_detector
+        self.conf = conf
+        self.fallback = fallback
+        self.roi_size = roi_size
+        self.lost_patience = lost_patience
+        self.reset()
+
+    def reset(self):
+        self.frame_num = 0
+        self._history = deque(maxlen=2)   # (frame_num, center) of the last ball detections
+
+        # Inference counts and network input pixels (a proxy for cost) per kind of search
+        self.roi_inferences = 0
+        self.fallback_inferences = 0
+        self.pixels = 0
+        self.full_frame_pixels = 0
+
+    # --- Detection ---
+    def detect_batch(self, frames):
+        """FrameDetections (in frame coordinates) for consecutive frames.
+
+        If inference fails midway (e.g. out of memory) the trajectory and the counters are rolled back, so the
+        caller can retry the frames.
+        """
+        state = self.snapshot()
+        try:
+            return self._detect_batch(frames)
+        except BaseException:
+            self.restore(state)
+            raise
+
+    def snapshot(self):
+        """The trajectory and the counters, for restore() if the frames have to be run again."""
+        return (self.frame_num, deque(self._history, maxlen=self._history.maxlen), self.roi_inferences,
+                self.fallback_inferences, self.pixels, self.full_frame_pixels)
+
+    def restore(self, state):
+        (self.frame_num, history, self.roi_inferences,
+         self.fallback_inferences, self.pixels, self.full_frame_pixels) = state
+        self._history = deque(history, maxlen=history.maxlen)
+
+    def _detect_batch(self, frames):
+        results = [None] * len(frames)
+        start = 0
+        while start < len(frames):
+            chunk = frames[start:start + BALL_ROI_BATCH_SIZE]
+            windows = [self._predict_window(self.frame_num + i, frame.shape) for i, frame in enumerate(chunk)]
+
+            # 1. Crop search for frames with a prediction (stop at the first frame without one)
+            num_roi = next((i for i, window in enumerate(windows) if window is None), len(chunk))
+            if num_roi == 0:
+                # 2. Ball lost (past lost_patience misses or out of frame): search the whole chunk with the fallback
+                for i, detections in enumerate(self._fallback_search(chunk)):
+                    self._record(self.frame_num + i, detections)
+                    results[start + i] = detections
+                self._advance(chunk)
+                start += len(chunk)
+                continue
+
+            chunk, windows = chunk[:num_roi], windows[:num_roi]
+            roi_detections = self._roi_search(chunk, windows)
+            for i, detections in enumerate(roi_detections):
+                self._record(self.frame_num + i, detections)
+                results[start + i] = detections
+            self._advance(chunk)
+            start += len(chunk)
+        return results
+
+    def _roi_search(self, frames, windows):
+        crops = [frame[y0:y1, x0:x1] for frame, (x0, y0, x1, y1) in zip(frames, windows)]
+        detections = self.ball_detector.detect_batch(crops, conf=self.conf, imgsz=self.roi_size)
+        self.roi_inferences += len(crops)
+        self.pixels += len(crops) * self.roi_size ** 2
+        return [det.shifted(x0, y0) for det, (x0, y0, _, _) in zip(detections, windows)]
+
+    def _fallback_search(self, frames):
+        if self.fallback == "full":
+            self.fallback_inferences += len(frames)
+            self.pixels += sum(_letterbox_pixels(frame.shape, BALL_FULL_FRAME_IMGSZ) for frame in frames)
+            return self.ball_detector.detect_batch(frames, conf=self.conf)
+
+        # Tiled: overlapping native-resolution tiles, batched together, merged back with NMS
+        tiles, owners = [], []
+        for index, frame in enumerate(frames):
+            for x0, y0, x1, y1 in _tile_windows(frame.shape, BALL_TILE_SIZE, BALL_TILE_OVERLAP):
+                tiles.append((frame[y0:y1, x0:x1], x0, y0))
+                owners.append(index)
+        tile_detections = self.ball_detector.detect_batch([tile for tile, _, _ in tiles], conf=self.conf,
+                                                          imgsz=BALL_TILE_SIZE)
+        self.fallback_inferences += len(tiles)
+        self.pixels += len(tiles) * BALL_TILE_SIZE ** 2
+
+        per_frame = [[] for _ in frames]
+        for owner, (_, x0, y0), detections in zip(owners, tiles, tile_detections):
+            per_frame[owner].append(detections.shifted(x0, y0))
+        return [_merge_tiles(parts) for parts in per_frame]
+
+    # --- Trajectory ---
+    def _predict_window(self, frame_num, frame_shape):
+        """(x0, y0, x1, y1) crop centered on the predicted ball position, or None if the ball is lost.
+
+        The ball is lost once lost_patience consecutive frames have passed without a detection.
+        """
+        if not self._history or frame_num - self._history[-1][0] > self.lost_patience:
+            return None
+        last_frame, last_center = self._history[-1]
+        velocity = np.zeros(2)
+        if len(self._history) == 2:
+            prev_frame, prev_center = self._history[0]
+            velocity = (last_center - prev_center) / (last_frame - prev_frame)
+            speed = np.hypot(*velocity)
+            if speed > MAX_PIXEL_MOVE_PER_FRAME:
+                velocity *= MAX_PIXEL_MOVE_PER_FRAME / speed
+        center = last_center + velocity * (frame_num - last_frame)
+
+        height, width = frame_shape[:2]
+        if not (0 <= center[0] < width and 0 <= center[1] < height):
+            return None
+        # Clamp the window inside the frame (keeping its size, so crops batch together)
+        crop_w, crop_h = min(self.roi_size, width), min(self.roi_size, height)
+        x0 = int(np.clip(center[0] - crop_w / 2, 0, width - crop_w))
+        y0 = int(np.clip(center[1] - crop_h / 2, 0, height - crop_h))
+        return x0, y0, x0 + crop_w, y0 + crop_h
+
+    def _record(self, frame_num, detections):
+        box = self._best_ball(detections)
+        if box is not None:
+            self._history.append((frame_num, np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2], dtype=np.float64)))
+
+    def _advance(self, frames):
+        self.frame_num += len(frames)
+        for frame in frames:
+            self.full_frame_pixels += _letterbox_pixels(frame.shape, BALL_FULL_FRAME_IMGSZ)
+
+    @staticmethod
+    def _best_ball(detections):
+        """Highest-confidence ball box, or None."""
+        class_ids = [cls_id for cls_id, name in detections.names.items() if name == CLASS_BALL]
+        is_ball = np.isin(detections.class_id, class_ids)
+        if not is_ball.any():
+            return None
+        best = np.flatnonzero(is_ball)[np.argmax(detections.confidence[is_ball])]
+        return detections.xyxy[best]
+
+    def summary(self):
+        total = self.roi_inferences + self.fallback_inferences
+        cost = self.pixels / self.full_frame_pixels if self.full_frame_pixels else 0.0
+        return (f"[ball search] {self.frame_num} frames | {self.roi_inferences}/{total} ROI inferences, "
+                f"{self.fallback_inferences} {self.fallback} fallback | ~{cost:.0%} of full-frame input pixels")
+
+
+def _letterbox_pixels(frame_shape, imgsz):
+    """Network input pixels of a full frame letterboxed to imgsz (rectangular, stride-32 padding)."""
+    height, width = frame_shape[:2]
+    scale = imgsz / max(height, width)
+    return imgsz * int(np.ceil(min(height, width) * scale / 32) * 32)
+
+
+def _tile_windows(frame_shape, tile_size, overlap):
+    """Overlapping tile_size windows covering the whole frame."""
+    height, width = frame_shape[:2]
+    step = tile_size - overlap
+    xs = list(range(0, max(width - tile_size, 0) + 1, step))
+    ys = list(range(0, max(height - tile_size, 0) + 1, step))
+    if xs[-1] + tile_size < width:
+        xs.append(width - tile_size)
+    if ys[-1] + tile_size < height:
+        ys.append(height - tile_size)
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height)) for y in ys for x in xs]
+
+
+def _merge_tiles(parts):
+    """Concatenates per-tile detections and suppresses duplicates from overlapping tiles."""
+    merged = FrameDetections.concatenate(parts)
+    if len(merged) < 2:
+        return merged
+    boxes = np.column_stack([merged.xyxy[:, :2], merged.xyxy[:, 2:] - merged.xyxy[:, :2]]).tolist()
+    keep = np.asarray(cv2.dnn.NMSBoxes(boxes, merged.confidence.tolist(), 0.0, BALL_TILE_NMS_IOU)).reshape(-1)
+    keep.sort()
+    return FrameDetections(merged.xyxy[keep], merged.confidence[keep], merged.class_id[keep], merged.names)
@@ -0,0 +1,82 @@
+import cv2
+import numpy as np
+
+
+class CourtHeatmapDecoder:
+    """Turns the court model's keypoint heatmaps into coordinates. Needs no model (and no torch),
+    so decoders can be compared on their own."""
+
+    # The model expects input at this resolution
+    INPUT_WIDTH = 640
+    INPUT_HEIGHT = 360
+    # Scaling between model output and original video resolution
+    SCALE = 2  
+    # Heatmap post-processing
+    NUM_KEYPOINTS = 14
+    HEATMAP_THRESHOLD = 170  # On the 0-255 scale, as used by the Hough path
+    PEAK_WINDOW_RADIUS = 12  # Half-size of the window used for sub-pixel centroid refinement
+    DECODERS = ("hough", "peak")
+
+    def __init__(self, decoder="hough", subpixel=True):
+        if decoder not in self.DECODERS:
+            raise ValueError(f"Unknown court keypoint decoder '{decoder}', expected one of {self.DECODERS}")
+        self.decoder = decoder
+        self.subpixel = subpixel
+
+    def decode_heatmaps(self, heatmaps, decoder=None):
+        """Turns (batch, 14, H, W) sigmoid heatmaps into (batch, 14, 2) peak coordinates (NaN if missing)."""
+        decoder = decoder or self.decoder
+        if decoder == "hough":
+            return np.stack([self._decode_hough(heatmap) for heatmap in heatmaps])
+        return self._decode_peaks(heatmaps, self.subpixel)
+
+    def _decode_hough(self, heatmaps):
+        """Reference decoder: threshold + cv2.HoughCircles on each channel separately."""
+        points = []
+        for kps_num in range(self.NUM_KEYPOINTS):
+            heatmap = (heatmaps[kps_num] * 255).astype(np.uint8)
+            _, heatmap = cv2.threshold(heatmap, self.HEATMAP_THRESHOLD, 255, cv2.THRESH_BINARY)
+            circles = cv2.HoughCircles(
+                heatmap, cv2.HOUGH_GRADIENT, dp=1, minDist=20,
+                param1=50, param2=2, minRadius=10, maxRadius=25
+            )
+            if circles is not None:
+                points.append([circles[0][0][0], circles[0][0][1]])
+            else:
+                # Use NaN for missing keypoints
+                points.append([np.nan, np.nan])
+        return np.array(points, dtype=np.float64)
+
+    def _decode_peaks(self, heatmaps, subpixel=True):
+        """Batched decoder: thresholded argmax over all channels at once, optionally refined to the
+        weighted centroid of the above-threshold response around the peak."""
+        heatmaps = (np.asarray(heatmaps) * 255).astype(np.uint8)
+        batch, channels, height, width = heatmaps.shape
+        flat = heatmaps.reshape(batch, channels, -1)
+
+        peak = flat.argmax(axis=2)
+        found = np.take_along_axis(flat, peak[..., None], axis=2)[..., 0] > self.HEATMAP_THRESHOLD
+        peak_y, peak_x = np.divmod(peak, width)
+        points = np.stack([peak_x, peak_y], axis=-1).astype(np.float64)
+
+        if subpixel:
+            r = self.PEAK_WINDOW_RADIUS
+            offsets = np.arange(-r, r + 1)
+            ys = peak_y[..., None, None] + offsets[:, None]
+            xs = peak_x[..., None, None] + offsets[None, :]
+            inside = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+            ys, xs = np.clip(ys, 0, height - 1), np.clip(xs, 0, width - 1)
+            b = np.arange(batch)[:, None, None, None]
+            c = np.arange(channels)[None, :, None, None]
+            window = heatmaps[b, c, ys, xs].astype(np.float64)
+            # Only above-threshold pixels inside the image count towards the centroid
+            weights = np.where(inside & (window > self.HEATMAP_THRESHOLD), window - self.HEATMAP_THRESHOLD, 0.0)
+            total = weights.sum(axis=(2, 3))
+            refined = total > 0
+            cx = (weights * xs).sum(axis=(2, 3))
+            cy = (weights * ys).sum(axis=(2, 3))
+            points[refined, 0] = cx[refined] / total[refined]
+            points[refined, 1] = cy[refined] / total[refined]
+
+        points[~found] = np.nan
+        return points
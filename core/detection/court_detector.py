@@ -4,6 +4,8 @@ import torch.nn.functional as F
 import cv2
 import numpy as np
 from utils.logger import logger
+from utils.profiler import profiler
+from .court_decoder import CourtHeatmapDecoder
 
 
 class ConvBlock(nn.Module):
@@ -87,17 +89,12 @@ class CourtDetectorNet(nn.Module):
         return x
 
 
-class CourtDetector:
+class CourtDetector(CourtHeatmapDecoder):
     """Loads the TrackNet-based court detector and predicts 14 keypoints via heatmaps."""
 
-    # The model expects input at this resolution
-    INPUT_WIDTH = 640
-    INPUT_HEIGHT = 360
-    # Scaling between model output and original video resolution
-    SCALE = 2  
-
-    def __init__(self, model_path, device='cpu'):
+    def __init__(self, model_path, device='cpu', decoder="hough", subpixel=True):
         logger.info(f"Loading TrackNet Court Detector from {model_path}")
+        super().__init__(decoder, subpixel)
         self.device = device
         self.model = CourtDetectorNet(out_channels=15)
         self.model.load_state_dict(torch.load(model_path, map_location=device))
@@ -107,39 +104,26 @@ class CourtDetector:
 
     def predict(self, image):
         """Processes a single frame and returns 14 court keypoints dynamically scaled."""
-        # 1. Get the actual original video dimensions
-        original_h, original_w = image.shape[:2]
-        
-        # 2. Calculate dynamic scale ratios (Original vs Model Input)
-        width_ratio = original_w / self.INPUT_WIDTH
-        height_ratio = original_h / self.INPUT_HEIGHT
+        return self.predict_batch([image])[0]
+
+    @profiler.span()
+    def predict_batch(self, images):
+        """Runs one forward pass over a batch of frames. Returns a (batch, 28) array of keypoints (NaN if missing)."""
+        # 1. Get the actual original video dimensions & dynamic scale ratios (Original vs Model Input)
+        ratios = np.array([
+            (image.shape[1] / self.INPUT_WIDTH, image.shape[0] / self.INPUT_HEIGHT) for image in images
+        ])
 
         # Resize to model input size
-        img = cv2.resize(image, (self.INPUT_WIDTH, self.INPUT_HEIGHT))
-        inp = (img.astype(np.float32) / 255.0)
-        inp = torch.tensor(np.rollaxis(inp, 2, 0)).unsqueeze(0)
+        inp = np.stack([cv2.resize(image, (self.INPUT_WIDTH, self.INPUT_HEIGHT)) for image in images])
+        inp = torch.from_numpy(inp.astype(np.float32) / 255.0).permute(0, 3, 1, 2)
 
         # Run inference
         with torch.no_grad():
-            out = self.model(inp.float().to(self.device))[0]
-        pred = torch.sigmoid(out).detach().cpu().numpy()
-
-        # Extract keypoints from heatmaps
-        points = []
-        for kps_num in range(14):
-            heatmap = (pred[kps_num] * 255).astype(np.uint8)
-            _, heatmap = cv2.threshold(heatmap, 170, 255, cv2.THRESH_BINARY)
-            circles = cv2.HoughCircles(
-                heatmap, cv2.HOUGH_GRADIENT, dp=1, minDist=20,
-                param1=50, param2=2, minRadius=10, maxRadius=25
-            )
-            if circles is not None:
-                # 3. Apply the dynamic ratios instead of the hardcoded SCALE=2
-                x_pred = circles[0][0][0] * width_ratio
-                y_pred = circles[0][0][1] * height_ratio
-                points.extend([x_pred, y_pred])
-            else:
-                # Use NaN for missing keypoints
-                points.extend([np.nan, np.nan])
-
-        return np.array(points)
\ No newline at end of file
+            out = self.model(inp.to(self.device))
+        pred = torch.sigmoid(out[:, :self.NUM_KEYPOINTS]).detach().cpu().numpy()
+
+        # Extract keypoints from heatmaps (in heatmap pixels), then apply the dynamic ratios
+        points = self.decode_heatmaps(pred)
+        points *= ratios[:, None, :]
+        return points.reshape(len(images), -1)
@@ -0,0 +1,193 @@
+import cv2
+import numpy as np
+from utils.logger import logger
+from constants import (
+    COURT_DETECTION_STRIDE,
+    COURT_DETECTION_BATCH_SIZE,
+    SCENE_CHANGE_THRESHOLD,
+    SCENE_THUMBNAIL_SIZE,
+    FLOW_WIN_SIZE,
+    FLOW_MAX_LEVEL,
+    FLOW_FB_THRESHOLD,
+    FLOW_MIN_TRACKED_RATIO,
+    FLOW_MAX_DRIFT_PX,
+    FLOW_MAX_INTERVAL
+)
+
+
+class CourtKeypointTrack:
+    """Per-frame court keypoints from sparse, batched CourtDetector runs.
+
+    The detector runs on keyframes: every `stride` frames, plus early whenever a cheap
+    scene-change metric (mean abs difference of grey thumbnails vs. the last keyframe) fires.
+    Keypoints are linearly interpolated between keyframes of the same scene and never
+    across a scene change.
+    """
+
+    def __init__(self, court_detector, stride=COURT_DETECTION_STRIDE, batch_size=COURT_DETECTION_BATCH_SIZE,
+                 scene_change_threshold=SCENE_CHANGE_THRESHOLD):
+        self.court_detector = court_detector
+        self.stride = stride
+        self.batch_size = batch_size
+        self.scene_change_threshold = scene_change_threshold
+
+    @staticmethod
+    def scene_thumbnail(frame):
+        grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(grey, SCENE_THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+    def scene_change_score(self, thumbnail, reference_thumbnail):
+        return float(np.mean(np.abs(thumbnail - reference_thumbnail)))
+
+    def detect(self, frames):
+        """Returns a (num_frames, 28) array of court keypoints for an iterable of frames."""
+        key_frames, key_points, scene_starts = [], [], []
+        batch_frames, batch_indices = [], []
+        reference_thumbnail = None
+        last_key_frame = None
+        num_frames = 0
+
+        def flush():
+            if batch_frames:
+                key_points.extend(self.court_detector.predict_batch(batch_frames))
+                key_frames.extend(batch_indices)
+                batch_frames.clear()
+                batch_indices.clear()
+
+        for frame_num, frame in enumerate(frames):
+            num_frames += 1
+            thumbnail = self.scene_thumbnail(frame)
+            scene_change = (reference_thumbnail is not None and
+                            self.scene_change_score(thumbnail, reference_thumbnail) > self.scene_change_threshold)
+            if last_key_frame is None or scene_change or frame_num - last_key_frame >= self.stride:
+                if last_key_frame is None or scene_change:
+                    scene_starts.append(frame_num)
+                reference_thumbnail = thumbnail
+                last_key_frame = frame_num
+                batch_frames.append(frame)
+                batch_indices.append(frame_num)
+                if len(batch_frames) >= self.batch_size:
+                    flush()
+            last_frame, last_frame_num = frame, frame_num
+
+        if num_frames == 0:
+            return np.empty((0, 28))
+        # Anchor the end of the video so the tail is interpolated, not held
+        if last_key_frame != last_frame_num:
+            batch_frames.append(last_frame)
+            batch_indices.append(last_frame_num)
+        flush()
+
+        logger.info(f"Court detected on {len(key_frames)}/{num_frames} frames "
+                    f"({len(scene_starts) - 1} scene changes).")
+        return self.interpolate(num_frames, np.array(key_frames), np.array(key_points), np.array(scene_starts))
+
+    @staticmethod
+    def interpolate(num_frames, key_frames, key_points, scene_starts):
+        """Linear interpolation of keyframe keypoints within each scene (held flat at scene edges)."""
+        frames = np.arange(num_frames)
+        scene_of_frame = np.searchsorted(scene_starts, frames, side="right") - 1
+        scene_of_key = scene_of_frame[key_frames]
+
+        keypoints = np.full((num_frames, key_points.shape[1]), np.nan)
+        for scene in np.unique(scene_of_key):
+            in_scene = scene_of_frame == scene
+            scene_keys = scene_of_key == scene
+            for coord in range(key_points.shape[1]):
+                values = key_points[scene_keys, coord]
+                found = ~np.isnan(values)
+                if found.any():
+                    keypoints[in_scene, coord] = np.interp(frames[in_scene], key_frames[scene_keys][found], values[found])
+        return keypoints
+
+
+class CourtFlowTracker:
+    """Online per-frame court keypoints: sparse Lucas-Kanade flow between full detections.
+
+    The 14 keypoints found by CourtDetector.predict are carried from frame to frame with
+    pyramidal LK flow (forward-backward checked). The tracked points must still agree on a
+    single court-plane homography from the detected ("anchor") points; that homography also
+    fills in keypoints whose flow was lost. The full detector runs again only when too few
+    keypoints survive, the homography residual (drift) grows too large, or max_interval passes.
+    """
+
+    def __init__(self, court_detector, min_tracked_ratio=FLOW_MIN_TRACKED_RATIO, max_drift=FLOW_MAX_DRIFT_PX,
+                 max_interval=FLOW_MAX_INTERVAL):
+        self.court_detector = court_detector
+        self.min_tracked_ratio = min_tracked_ratio
+        self.max_drift = max_drift
+        self.max_interval = max_interval
+        self.lk_params = dict(
+            winSize=(FLOW_WIN_SIZE, FLOW_WIN_SIZE),
+            maxLevel=FLOW_MAX_LEVEL,
+            criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 30, 0.01)
+        )
+        self.frames = 0
+        self.detections = 0
+        self.reset()
+
+    def reset(self):
+        self._prev_grey = None
+        self._anchor = None
+        self._points = None
+        self._since_detection = 0
+
+    def detect(self, frames):
+        """Returns a (num_frames, 28) array of court keypoints for an iterable of frames."""
+        keypoints = [self.update(frame) for frame in frames]
+        logger.info(f"Court detected on {self.detections}/{self.frames} frames (optical flow in between).")
+        return np.array(keypoints).reshape(-1, 28)
+
+    def update(self, frame):
+        """Returns the (28,) court keypoints for the next frame of the video."""
+        grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.frames += 1
+
+        points = None
+        if self._prev_grey is not None and self._since_detection < self.max_interval:
+            points = self._propagate(grey)
+        if points is None:
+            points = self._redetect(frame)
+
+        self._prev_grey = grey
+        return points.reshape(-1).copy()
+
+    def _redetect(self, frame):
+        self.detections += 1
+        self._anchor = np.asarray(self.court_detector.predict(frame), dtype=np.float64).reshape(-1, 2)
+        self._points = self._anchor.copy()
+        self._since_detection = 0
+        return self._points
+
+    def _propagate(self, grey):
+        """Flows the current keypoints into `grey`. Returns None when a re-detection is needed."""
+        detected = ~np.isnan(self._anchor).any(axis=1)
+        tracked = np.flatnonzero(~np.isnan(self._points).any(axis=1))
+        if len(tracked) < 4:
+            return None
+
+        # 1. Forward-backward checked LK flow
+        prev = self._points[tracked].astype(np.float32).reshape(-1, 1, 2)
+        nxt, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_grey, grey, prev, None, **self.lk_params)
+        back, status_back, _ = cv2.calcOpticalFlowPyrLK(grey, self._prev_grey, nxt, None, **self.lk_params)
+        fb_error = np.linalg.norm((back - prev).reshape(-1, 2), axis=1)
+        ok = (status.ravel() == 1) & (status_back.ravel() == 1) & (fb_error < FLOW_FB_THRESHOLD)
+        if ok.sum() < max(4, int(np.ceil(self.min_tracked_ratio * detected.sum()))):
+            return None
+
+        # 2. Drift check: the surviving points must still fit one homography from the anchor
+        anchor = self._anchor[tracked[ok]].reshape(-1, 1, 2)
+        moved = nxt[ok].astype(np.float64).reshape(-1, 1, 2)
+        homography, _ = cv2.findHomography(anchor, moved, 0)
+        if homography is None:
+            return None
+        residual = np.linalg.norm((cv2.perspectiveTransform(anchor, homography) - moved).reshape(-1, 2), axis=1)
+        if residual.mean() > self.max_drift:
+            return None
+
+        # 3. Regularize through the homography (also recovers keypoints whose flow was lost)
+        points = np.full_like(self._anchor, np.nan)
+        points[detected] = cv2.perspectiveTransform(self._anchor[detected].reshape(-1, 1, 2), homography).reshape(-1, 2)
+        self._points = points
+        self._since_detection += 1
+        return points
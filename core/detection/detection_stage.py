@@ -0,0 +1,172 @@
+import itertools
+import math
+import time
+import torch
+from utils.logger import logger
+from constants import (
+    DETECTION_BATCH_SIZE,
+    DETECTION_MIN_BATCH_SIZE,
+    DETECTION_MAX_BATCH_SIZE,
+    DETECTION_TARGET_BATCH_LATENCY,
+    DETECTION_MEMORY_HEADROOM,
+    DETECTION_GROWTH_FACTOR
+)
+
+
+class DetectionStage:
+    """Player + ball detection fused into one pass over the video.
+
+    Every frame batch goes through both models back to back, so frames are read and
+    batched once, and results are reduced to FrameDetections immediately.
+
+    The batch size adapts while running:
+    - it grows while per-frame latency keeps improving;
+    - it settles at the best size once gains stop or GPU memory runs short;
+    - it shrinks whenever a batch exceeds the latency budget;
+    - it halves on an out-of-memory error and the same frames are retried.
+
+    With a ball_search, the ball model runs through it (trajectory-guided crops) instead of on full frames;
+    with a player_scheduler, the player model only runs on its keyframes.
+    """
+
+    def __init__(self, player_detector, ball_detector, player_conf, ball_conf,
+                 batch_size=DETECTION_BATCH_SIZE, min_batch_size=DETECTION_MIN_BATCH_SIZE,
+                 max_batch_size=DETECTION_MAX_BATCH_SIZE, target_latency=DETECTION_TARGET_BATCH_LATENCY,
+                 ball_search=None, player_scheduler=None):
+        self.player_detector = player_detector
+        self.ball_detector = ball_detector
+        self.player_conf = player_conf
+        self.ball_conf = ball_conf
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.ball_search = ball_search
+        self.player_scheduler = player_scheduler
+
+        self._best = None        # (per-frame seconds, batch size) of the fastest full batch so far
+        self._settled = False
+        self._warmed_up = False
+
+        self.frames = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.oom_retries = 0
+
+    def detect_frames(self, frames):
+        """Returns (player_detections, ball_detections), one FrameDetections per frame each."""
+        player_detections, ball_detections = [], []
+        for _, p_det, b_det in self.iter_detections(frames):
+            player_detections.append(p_det)
+            ball_detections.append(b_det)
+        return player_detections, ball_detections
+
+    def iter_detections(self, frames):
+        """Yields (frame, player_detections, ball_detections) per frame, in order. Accepts any iterable."""
+        logger.info(f"Running fused player + ball detection (initial batch size {self.batch_size})")
+        frames = iter(frames)
+        next_log = 100
+        while True:
+            batch = list(itertools.islice(frames, self.batch_size))
+            if not batch:
+                break
+            player_detections, ball_detections = self._detect_batch(batch)
+            yield from zip(batch, player_detections, ball_detections)
+
+            # Log progress for large videos
+            if self.frames >= next_log:
+                logger.info(f"Processed {self.frames} frames (batch size {self.batch_size})...")
+                next_log = self.frames + 100 * (1 + self.frames // 1000)
+        logger.info(self.summary())
+        if self.player_scheduler is not None:
+            logger.info(self.player_scheduler.summary())
+        if self.ball_search is not None:
+            logger.info(self.ball_search.summary())
+
+    def _detect_batch(self, batch):
+        player_detections, ball_detections = [], []
+        start = 0
+        while start < len(batch):
+            frames = batch[start:start + self.batch_size]
+            # The player pass commits its state before the ball pass runs, so an OOM in either rolls back both
+            states = [(part, part.snapshot()) for part in (self.player_scheduler, self.ball_search) if part is not None]
+            try:
+                batch_start = time.perf_counter()
+                if self.player_scheduler is not None:
+                    p_det = self.player_scheduler.detect_batch(frames)
+                else:
+                    p_det = self.player_detector.detect_batch(frames, conf=self.player_conf)
+                if self.ball_search is not None:
+                    b_det = self.ball_search.detect_batch(frames)
+                else:
+                    b_det = self.ball_detector.detect_batch(frames, conf=self.ball_conf)
+                elapsed = time.perf_counter() - batch_start
+            except RuntimeError as e:
+                if "out of memory" not in str(e).lower() or len(frames) <= self.min_batch_size:
+                    raise
+                for part, state in states:
+                    part.restore(state)
+                self._on_out_of_memory(len(frames))
+                continue
+
+            player_detections += p_det
+            ball_detections += b_det
+            start += len(frames)
+            self._adapt(len(frames), elapsed)
+        return player_detections, ball_detections
+
+    def _on_out_of_memory(self, failed_size):
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+        self.batch_size = max(self.min_batch_size, failed_size // 2)
+        # Never grow back to a size that did not fit
+        self.max_batch_size = self.batch_size
+        self.oom_retries += 1
+        logger.warning(f"Detection ran out of memory at batch size {failed_size}; retrying with {self.batch_size}.")
+
+    def _adapt(self, num_frames, elapsed):
+        """Picks the next batch size from the latency of the batch that just finished."""
+        self.frames += num_frames
+        self.batches += 1
+        self.seconds += elapsed
+
+        # 1. Ignore the first batch (model warm-up) and short tail batches
+        if not self._warmed_up:
+            self._warmed_up = True
+            return
+        if num_frames < self.batch_size:
+            return
+
+        # 2. Over the latency budget: shrink proportionally and stop growing
+        if elapsed > self.target_latency:
+            self.batch_size = max(self.min_batch_size, int(self.batch_size * self.target_latency / elapsed))
+            self.max_batch_size = min(self.max_batch_size, self.batch_size)
+            self._settled = True
+            return
+        if self._settled:
+            return
+
+        # 3. Grow while the per-frame cost keeps dropping (by >5%), then settle on the best size seen
+        per_frame = elapsed / num_frames
+        if self._best is None or per_frame < self._best[0] * 0.95:
+            self._best = (per_frame, self.batch_size)
+            if self.batch_size < self.max_batch_size and not self._memory_short():
+                self.batch_size = min(self.max_batch_size, math.ceil(self.batch_size * DETECTION_GROWTH_FACTOR))
+            else:
+                self._settled = True
+        else:
+            self.batch_size = self._best[1]
+            self._settled = True
+
+    @staticmethod
+    def _memory_short():
+        """True when free GPU memory is below the headroom (always False on CPU)."""
+        if not torch.cuda.is_available():
+            return False
+        free, total = torch.cuda.mem_get_info()
+        return free < DETECTION_MEMORY_HEADROOM * total
+
+    def summary(self):
+        fps = self.frames / self.seconds if self.seconds else 0.0
+        return (f"[detect] {self.frames} frames in {self.batches} batches | {fps:.1f} fps (both models) | "
+                f"batch size {self.batch_size} | {self.oom_retries} out-of-memory retries")
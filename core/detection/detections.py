@@ -0,0 +1,55 @@
+import numpy as np
+
+
+class FrameDetections:
+    """Compact detections of one frame, reduced from an ultralytics Results object.
+
+    xyxy: (n, 4) float32 boxes, confidence: (n,) float32, class_id: (n,) int,
+    names: the model's {class_id: class_name} map (shared, not copied).
+    Holds no image, tensors or device memory, so whole videos of detections stay small.
+    """
+
+    __slots__ = ("xyxy", "confidence", "class_id", "names")
+
+    def __init__(self, xyxy, confidence, class_id, names):
+        self.xyxy = xyxy
+        self.confidence = confidence
+        self.class_id = class_id
+        self.names = names
+
+    @classmethod
+    def from_result(cls, result):
+        # Same arrays (and dtypes) supervision's Detections.from_ultralytics extracts
+        boxes = result.boxes
+        return cls(
+            boxes.xyxy.cpu().numpy(),
+            boxes.conf.cpu().numpy(),
+            boxes.cls.cpu().numpy().astype(int),
+            result.names
+        )
+
+    @classmethod
+    def empty(cls, names):
+        return cls(np.empty((0, 4), np.float32), np.empty(0, np.float32), np.empty(0, int), names)
+
+    @classmethod
+    def concatenate(cls, parts):
+        """Joins detections of the same model (e.g. from several crops of one frame)."""
+        return cls(
+            np.concatenate([part.xyxy for part in parts]),
+            np.concatenate([part.confidence for part in parts]),
+            np.concatenate([part.class_id for part in parts]),
+            parts[0].names
+        )
+
+    def shifted(self, dx, dy):
+        """Detections moved by (dx, dy), e.g. from crop to frame coordinates."""
+        offset = np.array([dx, dy, dx, dy], dtype=self.xyxy.dtype)
+        return FrameDetections(self.xyxy + offset, self.confidence, self.class_id, self.names)
+
+    def __len__(self):
+        return len(self.xyxy)
+
+    @property
+    def nbytes(self):
+        return self.xyxy.nbytes + self.confidence.nbytes + self.class_id.nbytes
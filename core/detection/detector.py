@@ -1,6 +1,8 @@
 from ultralytics import YOLO
+from .detections import FrameDetections
 from constants import DETECTION_BATCH_SIZE, DETECTION_CONFIDENCE_THRESHOLD
 from utils.logger import logger
+from utils.profiler import profiler
 
 class Detector:
     def __init__(self, model_path):
@@ -16,8 +18,19 @@ class Detector:
             if i % (batch_size * 5) == 0 and i > 0:
                 logger.info(f"Processed {i}/{len(frames)} frames...")
                 
-            detections_batch = self.model.predict(frames[i:i+batch_size], conf=conf, verbose=False)
-            detections += detections_batch
+            detections += self.detect_batch(frames[i:i+batch_size], conf=conf)
             
         logger.info("Detection phase complete.")
-        return detections
\ No newline at end of file
+        return detections
+
+    @profiler.span()
+    def detect_batch(self, frames, conf=DETECTION_CONFIDENCE_THRESHOLD, imgsz=None):
+        """Runs a single model call on one batch of frames (no progress logging).
+
+        Results are reduced to FrameDetections right away, so the ultralytics Results
+        (with their copies of the frames) are freed after every batch. imgsz overrides the
+        network input size (e.g. native resolution for small crops).
+        """
+        options = {"imgsz": imgsz} if imgsz is not None else {}
+        results = self.model.predict(frames, conf=conf, verbose=False, **options)
+        return [FrameDetections.from_result(result) for result in results]
\ No newline at end of file
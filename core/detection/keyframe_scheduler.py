@@ -0,0 +1,209 @@
+import cv2
+import numpy as np
+from utils.bbox_utils import get_iou_matrix
+from .detections import FrameDetections
+from constants import (
+    DETECTION_CONFIDENCE_THRESHOLD,
+    SCENE_CHANGE_THRESHOLD,
+    KEYFRAME_MAX_STRIDE,
+    KEYFRAME_MOTION_BUDGET,
+    KEYFRAME_AUDIT_INTERVAL,
+    KEYFRAME_MATCH_IOU,
+    MOTION_THUMBNAIL_WIDTH
+)
+
+
+class KeyframeScheduler:
+    """Runs the player model on keyframes only and interpolates boxes in between.
+
+    A frame becomes a keyframe when the motion accumulated since the last keyframe
+    exceeds `motion_budget`. Motion is the mean abs grey-level frame difference inside the
+    last keyframe's boxes, on a thumbnail. A frame also becomes a keyframe at `max_stride`,
+    on a scene cut, and at the end of every batch. So fast rallies are detected densely and
+    slow stretches sparsely.
+
+    Skipped frames get boxes interpolated between the surrounding keyframes. ByteTrack still
+    sees every frame and keeps IDs continuous. Every `audit_interval`-th skipped frame is
+    also detected, to measure what skipping costs against dense detection.
+    Frames must be fed in order.
+    """
+
+    def __init__(self, detector, conf=DETECTION_CONFIDENCE_THRESHOLD, max_stride=KEYFRAME_MAX_STRIDE,
+                 motion_budget=KEYFRAME_MOTION_BUDGET, audit_interval=KEYFRAME_AUDIT_INTERVAL):
+        self.detector = detector
+        self.conf = conf
+        self.max_stride = max_stride
+        self.motion_budget = motion_budget
+        self.audit_interval = audit_interval
+        self.reset()
+
+    def reset(self):
+        self._prev_thumbnail = None
+        self._last_keyframe = None      # FrameDetections of the latest keyframe
+        self.frames = 0
+        self.keyframes = 0
+        self.audits = 0
+        self._skipped = 0
+        self._audit_ious = []           # IoU of each audited (dense) box with its interpolated match, 0 if unmatched
+        self._audit_false = 0           # Interpolated boxes with no dense counterpart
+
+    def detect_batch(self, frames):
+        """FrameDetections for consecutive frames; the model only runs on keyframes (and audits).
+
+        If inference fails (e.g. out of memory) the scheduler state is rolled back, so the caller can retry the frames.
+        """
+        state = self.snapshot()
+        try:
+            return self._detect_batch(frames)
+        except BaseException:
+            self.restore(state)
+            raise
+
+    def snapshot(self):
+        """Everything detect_batch advances, for restore() if the frames have to be run again."""
+        return (self._prev_thumbnail, self._last_keyframe, self.frames, self.keyframes, self.audits, self._skipped,
+                len(self._audit_ious), self._audit_false)
+
+    def restore(self, state):
+        (self._prev_thumbnail, self._last_keyframe, self.frames, self.keyframes, self.audits, self._skipped,
+         num_ious, self._audit_false) = state
+        del self._audit_ious[num_ious:]
+
+    def _detect_batch(self, frames):
+        # 1. Pick keyframes from motion alone (no inference needed yet)
+        keyframes, audits = self._select_keyframes(frames)
+
+        # 2. One batched model call for keyframes + audit frames
+        run = sorted(keyframes | audits)
+        detected = dict(zip(run, self.detector.detect_batch([frames[i] for i in run], conf=self.conf)))
+
+        # 3. Interpolate skipped frames between the surrounding keyframes
+        results = [None] * len(frames)
+        # Frames before this batch's first keyframe interpolate from the previous batch's last one
+        previous = (-1, self._last_keyframe)
+        for index in sorted(keyframes):
+            for skipped in range(previous[0] + 1, index):
+                t = (skipped - previous[0]) / (index - previous[0])
+                results[skipped] = interpolate_detections(previous[1], detected[index], t)
+                if skipped in audits:
+                    self._audit(results[skipped], detected[skipped])
+                    results[skipped] = detected[skipped]
+            results[index] = detected[index]
+            previous = (index, detected[index])
+
+        self._last_keyframe = detected[max(keyframes)]
+        self.frames += len(frames)
+        self.keyframes += len(keyframes)
+        self.audits += len(audits)
+        return results
+
+    def _select_keyframes(self, frames):
+        keyframes, audits = set(), set()
+        # Motion is measured where players were at the last keyframe (whole frame before the first one)
+        boxes = self._last_keyframe.xyxy if self._last_keyframe is not None else np.empty((0, 4))
+        motion = 0.0
+        since_keyframe = 0
+        for index, frame in enumerate(frames):
+            thumbnail, scale = _motion_thumbnail(frame)
+            since_keyframe += 1
+            if self._prev_thumbnail is None:
+                keyframes.add(index)
+            else:
+                difference = cv2.absdiff(thumbnail, self._prev_thumbnail)
+                if float(difference.mean()) > SCENE_CHANGE_THRESHOLD:
+                    # Scene cut: never interpolate across it
+                    keyframes.update(i for i in (index - 1, index) if i >= 0)
+                else:
+                    motion += _region_motion(difference, boxes * scale)
+                    if motion >= self.motion_budget or since_keyframe >= self.max_stride:
+                        keyframes.add(index)
+            if index in keyframes:
+                motion, since_keyframe = 0.0, 0
+            self._prev_thumbnail = thumbnail
+        # The last frame anchors the interpolation of this batch's tail
+        keyframes.add(len(frames) - 1)
+
+        # Count skipped frames (and pick audits among them) only now that no frame can still become a keyframe
+        for index in range(len(frames)):
+            if index not in keyframes:
+                self._skipped += 1
+                if self.audit_interval and self._skipped % self.audit_interval == 0:
+                    audits.add(index)
+        return keyframes, audits
+
+    def _audit(self, interpolated, dense):
+        """Compares interpolated boxes with a dense detection of the same frame (greedy IoU matching)."""
+        matches, unmatched_a, unmatched_b = match_boxes(interpolated, dense, min_iou=0.0)
+        ious = get_iou_matrix(interpolated.xyxy, dense.xyxy)
+        self._audit_ious += [float(ious[a, b]) for a, b in matches] + [0.0] * len(unmatched_b)
+        self._audit_false += len(unmatched_a)
+
+    def summary(self):
+        skipped = self.frames - self.keyframes - self.audits
+        share = skipped / self.frames if self.frames else 0.0
+        text = (f"[keyframes] {self.frames} frames | {self.keyframes} keyframes + {self.audits} audits | "
+                f"{skipped} player inferences skipped ({share:.0%})")
+        if self._audit_ious:
+            ious = np.array(self._audit_ious)
+            text += (f" | vs dense on {self.audits} audited frames: mean IoU {ious.mean():.2f}, "
+                     f"recall@0.5 {np.mean(ious >= 0.5):.0%}, {self._audit_false} spurious boxes")
+        return text
+
+
+def match_boxes(a, b, min_iou=KEYFRAME_MATCH_IOU):
+    """Greedy highest-IoU matching of two FrameDetections (same class only).
+
+    Returns (matched index pairs, unmatched indices of a, unmatched indices of b).
+    """
+    ious = get_iou_matrix(a.xyxy, b.xyxy)
+    ious[a.class_id[:, None] != b.class_id[None, :]] = -1.0
+    matches, matched_a, matched_b = [], set(), set()
+    for flat in np.argsort(-ious, axis=None, kind="stable"):
+        i, j = divmod(int(flat), ious.shape[1])
+        if ious[i, j] <= 0.0 or ious[i, j] < min_iou:
+            break
+        if i not in matched_a and j not in matched_b:
+            matches.append((i, j))
+            matched_a.add(i)
+            matched_b.add(j)
+    return (matches, [i for i in range(len(a)) if i not in matched_a],
+            [j for j in range(len(b)) if j not in matched_b])
+
+
+def interpolate_detections(start, end, t):
+    """Boxes at fraction t between two keyframes: matched boxes move linearly, unmatched ones
+    stay with their own keyframe until halfway."""
+    matches, only_start, only_end = match_boxes(start, end)
+    xyxy, confidence, class_id = [], [], []
+    for i, j in matches:
+        xyxy.append((1 - t) * start.xyxy[i] + t * end.xyxy[j])
+        confidence.append((1 - t) * start.confidence[i] + t * end.confidence[j])
+        class_id.append(start.class_id[i])
+    source, rows = (start, only_start) if t < 0.5 else (end, only_end)
+    for i in rows:
+        xyxy.append(source.xyxy[i])
+        confidence.append(source.confidence[i])
+        class_id.append(source.class_id[i])
+    if not xyxy:
+        return FrameDetections.empty(start.names)
+    return FrameDetections(np.array(xyxy, dtype=start.xyxy.dtype), np.array(confidence, dtype=start.confidence.dtype),
+                           np.array(class_id, dtype=start.class_id.dtype), start.names)
+
+
+def _motion_thumbnail(frame):
+    """Grey, downscaled frame for the motion metric, and the scale applied."""
+    scale = MOTION_THUMBNAIL_WIDTH / frame.shape[1]
+    size = (MOTION_THUMBNAIL_WIDTH, max(1, round(frame.shape[0] * scale)))
+    grey = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(grey, size, interpolation=cv2.INTER_AREA), scale
+
+
+def _region_motion(difference, boxes):
+    """Mean frame difference inside the given (thumbnail-scale) boxes; whole frame if there are none."""
+    if len(boxes) == 0:
+        return float(difference.mean())
+    height, width = difference.shape
+    mask = np.zeros((height, width), dtype=bool)
+    for x1, y1, x2, y2 in np.round(boxes).astype(int):
+        mask[max(y1, 0):min(y2, height), max(x1, 0):min(x2, width)] = True
+    return float(difference[mask].mean()) if mask.any() else 0.0
@@ -1,86 +1,734 @@
 import os
+import time
 import pickle
-from utils.video_utils import read_video, save_video
+import itertools
+import numpy as np
+from collections import deque
+from utils.video_utils import read_video, iter_video, save_video, video_frame_count
+from utils.video_stream import FrameSource, FrameSink, LiveFrameSource
+from utils.latency import LatencyBudget, LatencyStats, FULL
+from utils.profiler import profiler
+from utils.track_store import to_columnar, to_frames
+from utils.track_file import TRACK_FILE_SUFFIX, is_track_file, load_tracks, tracks_from_legacy_stubs
+from utils.stub_manager import StubManager
+from utils.stage_graph import StageGraph
 from utils.logger import logger
 from utils.config_loader import cfg
-from core.trackers import Tracker
+from core.trackers import Tracker, BallKalmanTracker
 from core.annotation import Annotator
-from core.detection import CourtDetector
+from core.detection import CourtKeypointTrack, CourtFlowTracker
 from core.analysis import PhysicsEngine
 from core.annotation import MiniCourt
+import constants
+from constants import visual_consts
+from constants import (
+    DETECTION_BATCH_SIZE,
+    DETECTION_MAX_BATCH_SIZE,
+    DETECTION_TARGET_BATCH_LATENCY,
+    KEYFRAME_MAX_STRIDE,
+    KEYFRAME_MOTION_BUDGET,
+    STREAM_CHUNK_SIZE,
+    STREAM_LOOKAHEAD,
+    STREAM_CONTEXT,
+    COURT_DETECTION_STRIDE,
+    COURT_DETECTION_BATCH_SIZE,
+    SCENE_CHANGE_THRESHOLD,
+    FLOW_MIN_TRACKED_RATIO,
+    FLOW_MAX_DRIFT_PX,
+    FLOW_MAX_INTERVAL,
+    CLASS_PLAYER,
+    CLASS_BALL,
+    TRACKER_ACTIVATION_THRESHOLD,
+    TRACKER_LOST_BUFFER,
+    MAX_PIXEL_MOVE_PER_FRAME,
+    INTERPOLATE_LIMIT,
+    ROLLING_WINDOW,
+    BFILL_LIMIT,
+    BALL_KALMAN_LAG,
+    BALL_KALMAN_PROCESS_NOISE,
+    BALL_KALMAN_MEASUREMENT_NOISE,
+    BALL_KALMAN_GATE,
+    LIVE_LATENCY_BUDGET_MS,
+    LIVE_STATS_INTERVAL,
+    TRACKS_CACHE_VERSION,
+    COURT_CACHE_VERSION,
+    STAGE_VERSIONS,
+    PROJECTION_CONSTANTS
+)
 
 class Pipeline:
     def __init__(self, input_video_path: str, output_video_path: str):
         self.input_video_path = input_video_path
         self.output_video_path = output_video_path        
-        self.tracker = Tracker()
-        self.annotator = Annotator()
-        self.court_detector = CourtDetector(cfg['models']['court_detector']['model_path'])
-        # We will load our YOLO trackers and ResNet court detectors here in Phase 2
+        self.tracker = Tracker(ball_filter=cfg.get('ball_tracking', {}).get('filter', 'interpolate'))
+        cache_cfg = cfg.get('cache', {})
+        self.stub_manager = StubManager(
+            os.path.join(cfg['paths'].get('stub_path', 'stubs/'), 'cache'),
+            max_bytes=int(cache_cfg.get('max_size_mb', 2048) * 1024 * 1024)
+        )
+        self.annotator = Annotator(workers=cfg.get('pipeline', {}).get('render_workers', 1))
+        # Models are only loaded when they actually have to run (see court_detector and _get_detection_stage):
+        # a run from cached tracks and court keypoints never imports torch or ultralytics
+        self._court_detector = None
+        self.player_detector = None
+        self.ball_detector = None
+        self.detection_stage = None
         logger.info("Tennis Analysis Pipeline initialized.")
 
+    @property
+    def court_detector(self):
+        """The court keypoint model, loaded on first use."""
+        if self._court_detector is None:
+            from core.detection.court_detector import CourtDetector
+            court_cfg = cfg['models']['court_detector']
+            self._court_detector = CourtDetector(
+                court_cfg['model_path'],
+                decoder=court_cfg.get('decoder', 'hough'),
+                subpixel=court_cfg.get('subpixel', True)
+            )
+        return self._court_detector
+
+    def set_video(self, input_video_path: str, output_video_path: str):
+        """Points the pipeline at another video. Loaded models are kept; per-video tracking state starts fresh."""
+        self.input_video_path = input_video_path
+        self.output_video_path = output_video_path
+        self.tracker = Tracker(ball_filter=self.tracker.ball_filter)
+        if self.detection_stage is not None:
+            for per_video in (self.detection_stage.ball_search, self.detection_stage.player_scheduler):
+                if per_video is not None:
+                    per_video.reset()
+
     def run(self):
+        """Runs the configured mode (batch, streaming, live or re-render), profiled if `profiling.enabled`."""
+        profiling = cfg.get('profiling', {})
+        if profiling.get('enabled', False):
+            profiler.enable(spans=profiling.get('spans', False), memory=profiling.get('memory', False))
+        try:
+            if cfg.get('pipeline', {}).get('rerender', False):
+                return self.run_rerender()
+            if cfg.get('pipeline', {}).get('live', False):
+                return self.run_live()
+            if cfg.get('pipeline', {}).get('streaming', False):
+                return self.run_streaming()
+            return self.run_batch()
+        finally:
+            if profiler.enabled:
+                profiler.save(profiling.get('report_path'), profiling.get('trace_path'))
+                profiler.disable()
+
+    def run_batch(self):
+        """Runs the stage graph (see _build_stage_graph) up to the encoded video. Stages whose inputs
+        and params are unchanged since an earlier run are loaded from the cache instead of recomputed."""
         logger.info("--- Starting Tennis Analysis Pipeline ---")
-        
+        graph = self._build_stage_graph()
+        to_run = [name for name, action in graph.plan("encode").items() if action == "run"]
+        logger.info(f"Stages to run: {', '.join(to_run) if to_run else 'none, the output is up to date'}")
+        graph.run("encode")
+        logger.info("---Pipeline Completed Successfully---")
+
+    def _build_stage_graph(self):
+        """The batch pipeline as a DAG: decode -> detect -> track, decode -> court, then filter -> project -> physics -> render -> encode.
+
+        Frames (decode, render) are never persisted. Tracks and court keypoints keep their own
+        content-addressed cache entries (shared with streaming and re-render runs); every other
+        stage is keyed by its params and its inputs' keys.
+        """
+        graph = StageGraph(self.stub_manager)
+        graph.add("decode", self._decode_stage, persist=False,
+                  params=lambda: {"video": StubManager.fingerprint(self.input_video_path)})
+        graph.add("detect", self._detect_stage, inputs=("decode",), version=STAGE_VERSIONS["detect"],
+                  params=self._detect_params)
+        graph.add("track", self._track_stage, inputs=("decode", "detect"), key=self._tracks_cache_key,
+                  cache_name="tracks", suffix=TRACK_FILE_SUFFIX)
+        graph.add("court", self._court_stage, inputs=("decode",), key=lambda: self._court_cache_key(self._court_mode()))
+        graph.add("filter", self._filter_stage, inputs=("track", "court"), version=STAGE_VERSIONS["filter"],
+                  params=lambda: {"columnar": cfg.get('pipeline', {}).get('columnar_tracks', False)})
+        graph.add("project", self._project_stage, inputs=("filter", "court", "decode"), version=STAGE_VERSIONS["project"],
+                  params=lambda: {"projection": cfg.get('mini_court', {}).get('projection', 'keypoint'),
+                                  "constants": _constants(*PROJECTION_CONSTANTS)})
+        graph.add("physics", self._physics_stage, inputs=("project", "decode"), version=STAGE_VERSIONS["physics"],
+                  params=lambda: {"fps": cfg.get('video', {}).get('fps', 24.0),
+                                  "constants": _constants("SPEED_FRAME_WINDOW", "DOUBLE_LINE_WIDTH")})
+        graph.add("render", self._render_stage, inputs=("decode", "physics", "court"), persist=False,
+                  params=lambda: {"constants": _constants(*_upper_names(visual_consts))})
+        graph.add("encode", self._encode_stage, inputs=("render",), version=STAGE_VERSIONS["encode"],
+                  params=lambda: {"output": os.path.abspath(self.output_video_path), "fps": cfg.get('video', {}).get('fps', 24.0)},
+                  valid=lambda encoded: StubManager.fingerprint(encoded["path"]) == encoded["fingerprint"])
+        return graph
+
+    # --- Batch stages (see _build_stage_graph) ---
+    def _decode_stage(self, inputs):
         video_frames = read_video(self.input_video_path)
-        if not video_frames: return
+        if not video_frames:
+            raise ValueError(f"No frames could be read from {self.input_video_path}")
+        return video_frames
+
+    def _detect_stage(self, inputs):
+        video_frames = inputs["decode"]
+        logger.info("Running AI inference (this may take a few minutes)...")
+        with profiler.stage("detection", frames=len(video_frames)):
+            return self._get_detection_stage().detect_frames(video_frames)
+
+    def _detect_params(self):
+        models = cfg['models']
+        return {
+            "player_model": StubManager.fingerprint(models['player_tracker']['model_path']),
+            "ball_model": StubManager.fingerprint(models['ball_tracker']['model_path']),
+            "player_conf": models['player_tracker']['confidence_threshold'],
+            "ball_conf": models['ball_tracker']['confidence_threshold'],
+            "ball_search": cfg.get('ball_detection', {}),
+            "player_schedule": cfg.get('player_detection', {}),
+        }
 
-        # 1. Base Tracking
-        tracks = self._get_tracks(video_frames)
-        
-        # 2. Court Detection & Filtering
+    def _track_stage(self, inputs):
+        """Tracks from matching unkeyed stubs if there are any, otherwise ByteTrack over the (cached or fresh) detections."""
+        video_frames = inputs["decode"]
+        tracks = self._import_legacy_tracks(num_frames=len(video_frames))
+        if tracks is None:
+            player_detections, ball_detections = inputs["detect"]
+            with profiler.stage("tracking", frames=len(video_frames)):
+                tracks = self.tracker.get_object_tracks(player_detections, ball_detections)
+        return tracks
+
+    def _court_stage(self, inputs):
+        video_frames = inputs["decode"]
         logger.info("Detecting court lines...")
-        court_keypoints = self.court_detector.predict(video_frames[0])
-        tracks = self.tracker.choose_and_filter_players(court_keypoints, tracks)
-        tracks = self.tracker.add_position_to_tracks(tracks)
-        
-        # 3. Phase 4: Mini-Court Projection
+        with profiler.stage("court", frames=len(video_frames)):
+            return self._detect_court(video_frames)
+
+    def _filter_stage(self, inputs):
+        tracks = inputs["track"]
+        tracks = to_columnar(tracks) if cfg.get('pipeline', {}).get('columnar_tracks', False) else to_frames(tracks)
+        court_keypoints = inputs["court"]
+        with profiler.stage("tracking"):
+            tracks = self.tracker.choose_and_filter_players(court_keypoints, tracks)
+            return self.tracker.add_position_to_tracks(tracks)
+
+    def _project_stage(self, inputs):
+        tracks, court_keypoints, video_frames = inputs["filter"], inputs["court"], inputs["decode"]
         logger.info("Projecting tracking coordinates to 2D Mini-Court...")
-        mini_court = MiniCourt(video_frames[0])
-        tracks = mini_court.convert_bounding_boxes_to_mini_court_coordinates(tracks, court_keypoints)
+        with profiler.stage("projection", frames=len(video_frames)):
+            mini_court = MiniCourt(video_frames[0], cfg.get('mini_court', {}).get('projection', 'keypoint'))
+            return mini_court.convert_bounding_boxes_to_mini_court_coordinates(tracks, court_keypoints)
 
-       # 4. Phase 5: Physics & Analytics
+    def _physics_stage(self, inputs):
+        tracks, video_frames = inputs["project"], inputs["decode"]
         logger.info("Calculating player real-world speeds and distances...")
-        
-        # FIX: Use the global 'cfg' we imported at the top of the file
-        fps = cfg.get('video', {}).get('fps', 24.0) 
-        
-        physics = PhysicsEngine(fps, mini_court.court_drawing_width)
-        tracks = physics.add_speed_and_distance_to_tracks(tracks)
-        # 5. Draw Everything
-        annotated_frames = self.annotator.draw_annotations(
-            video_frames, 
-            tracks, 
-            court_keypoints=court_keypoints,
-            mini_court=mini_court
-        )
-        
+        fps = cfg.get('video', {}).get('fps', 24.0)
+        with profiler.stage("physics", frames=len(video_frames)):
+            mini_court = MiniCourt(video_frames[0], cfg.get('mini_court', {}).get('projection', 'keypoint'))
+            physics = PhysicsEngine(fps, mini_court.court_drawing_width)
+            return physics.add_speed_and_distance_to_tracks(tracks)
+
+    def _render_stage(self, inputs):
+        # Tracks and keypoints first: their stages read the frames, which are then drawn on in place
+        tracks, court_keypoints = inputs["physics"], inputs["court"]
+        video_frames = inputs["decode"]
+        with profiler.stage("annotation", frames=len(video_frames)):
+            mini_court = MiniCourt(video_frames[0], cfg.get('mini_court', {}).get('projection', 'keypoint'))
+            return self.annotator.draw_annotations(
+                video_frames,
+                tracks,
+                court_keypoints=court_keypoints,
+                mini_court=mini_court,
+                in_place=True
+            )
+
+    def _encode_stage(self, inputs):
+        annotated_frames = inputs["render"]
         logger.info("Pipeline processing complete. Moving to save step.")
-        save_video(annotated_frames, self.output_video_path, fps=fps)
+        save_video(annotated_frames, self.output_video_path, fps=cfg.get('video', {}).get('fps', 24.0))
+        return {"path": self.output_video_path, "fingerprint": StubManager.fingerprint(self.output_video_path)}
+
+    def run_streaming(self):
+        """Single-pass variant of run(). Frames are decoded, processed, annotated and encoded
+        as a stream, so peak memory is bounded by the temporal windows, not the video length."""
+        logger.info("--- Starting Tennis Analysis Pipeline (streaming) ---")
+
+        # Threaded I/O overlaps decode and encode with compute through bounded queues
+        threaded_io = cfg.get('pipeline', {}).get('threaded_io', False)
+        source = FrameSource(self.input_video_path) if threaded_io else None
+        frames = iter(source) if source is not None else iter_video(self.input_video_path)
+        first_frame = next(frames, None)
+        if first_frame is None: return
+        frames = itertools.chain([first_frame], frames)
+
+        # 1. Court Detection (per frame in 'flow' mode, otherwise first frame only) & Mini-Court setup
+        logger.info("Detecting court lines...")
+        if cfg.get('court_detection', {}).get('mode', 'static') == 'periodic':
+            logger.warning("Periodic court detection needs the whole clip; streaming falls back to 'static'.")
+        court_mode = self._court_mode()
+        court_flow = None
+        with profiler.stage("court"):
+            court_keypoints = self._load_cached_court_keypoints(court_mode)
+            if court_keypoints is None and court_mode == 'flow':
+                court_flow = self._make_court_flow_tracker()
+            elif court_keypoints is None:
+                court_keypoints = self.court_detector.predict(first_frame)
+                self._save_cached_court_keypoints(court_mode, court_keypoints)
+        mini_court = MiniCourt(first_frame, cfg.get('mini_court', {}).get('projection', 'keypoint'))
+
+        fps = cfg.get('video', {}).get('fps', 24.0)
+        physics = PhysicsEngine(fps, mini_court.court_drawing_width)
+
+        # 2. Everything else is lazily pulled through by the video writer
+        annotated_frames = self._stream_annotated_frames(frames, court_keypoints, mini_court, physics, court_flow)
+        if source is None:
+            save_video(annotated_frames, self.output_video_path, fps=fps)
+        else:
+            try:
+                with FrameSink(self.output_video_path, fps=fps) as sink:
+                    for frame in annotated_frames:
+                        sink.write(frame)
+            finally:
+                source.close()
+            logger.info(source.stats.summary())
+            logger.info(sink.stats.summary())
         logger.info("---Pipeline Completed Successfully---")
 
-    def _get_tracks(self, video_frames):
-        """Runs tracking, loads unified stub, or migrates old legacy stubs."""
-        
-        # Load exactly what is in the config, no magic strings
+    def run_live(self):
+        """Live variant of run_streaming(): frames arrive at source rate and are emitted one by one, with no lookahead.
+
+        Each frame is planned against the latency budget (see LatencyBudget): run in full, degraded
+        (no ball detection, so the ball filter coasts, and no court re-detection, so the last
+        court keypoints are reused) or dropped. The source itself skips frames that arrive while
+        one is still being processed.
+        """
+        logger.info("--- Starting Tennis Analysis Pipeline (live) ---")
+        live_cfg = cfg.get('live', {})
+        models = cfg['models']
+        # 1. Models first, then the feed: it does not wait for anyone
+        stage = self._get_detection_stage()
+        source = LiveFrameSource(self.input_video_path, fps=live_cfg.get('fps'))
+        frames = iter(source)
+        first = next(frames, None)
+        if first is None:
+            source.close()
+            return
+        first_frame, _ = first
+
+        # 2. Court & mini-court from the first frame ('flow' mode keeps following the court while frames run in full)
+        court_flow = self._make_court_flow_tracker() if cfg.get('court_detection', {}).get('mode') == 'flow' else None
+        court_keypoints = None if court_flow is not None else self.court_detector.predict(first_frame)
+        mini_court = MiniCourt(first_frame, cfg.get('mini_court', {}).get('projection', 'keypoint'))
+        physics = PhysicsEngine(source.fps, mini_court.court_drawing_width)
+        # The only online ball smoother; no lag, since every frame of lag is latency
+        ball_filter = BallKalmanTracker(lag=0)
+
+        budget = LatencyBudget(live_cfg.get('latency_budget_ms', LIVE_LATENCY_BUDGET_MS) / 1000)
+        stats = LatencyStats()
+        show_latency = live_cfg.get('show_latency', True)
+        context = {"players": [], "ball": [], "raw_ball": [], "keypoints": []}
+        self.tracker.chosen_players = None
+
+        # 3. Per frame: plan, detect, track, annotate, hand to the encoder thread
+        try:
+            with FrameSink(self.output_video_path, fps=source.fps) as sink:
+                for frame, captured in itertools.chain([first], frames):
+                    level = budget.plan(time.perf_counter() - captured)
+                    if level is None:
+                        stats.dropped += 1
+                        continue
+                    start = time.perf_counter()
+
+                    with profiler.stage("detection", frames=1):
+                        p_det = stage.player_detector.detect_batch([frame], conf=models['player_tracker']['confidence_threshold'])[0]
+                        b_det = None
+                        if level == FULL:
+                            b_det = stage.ball_detector.detect_batch([frame], conf=models['ball_tracker']['confidence_threshold'])[0]
+                    if court_flow is not None and (level == FULL or court_keypoints is None):
+                        with profiler.stage("court", frames=1):
+                            court_keypoints = court_flow.update(frame)
+                    with profiler.stage("tracking", frames=1):
+                        player_dict, ball_dict = self.tracker.track_frame(p_det, b_det)
+                        box, = ball_filter.update(ball_dict.get(1, {}).get("bbox"))
+
+                    pending = deque([(frame, player_dict, _ball_dict(box), court_keypoints)])
+                    annotated, = self._finalize_window(pending, context, 1, mini_court, physics, None)
+
+                    now = time.perf_counter()
+                    budget.observe(level, now - start)
+                    stats.record(now - captured, level)
+                    if show_latency:
+                        text = f"latency {(now - captured) * 1000:.0f} ms" + ("" if level == FULL else " | degraded")
+                        self.annotator.entity_annotator.draw_status_text(annotated, text)
+                    sink.write(annotated)
+
+                    if stats.emitted % LIVE_STATS_INTERVAL == 0:
+                        logger.info(stats.summary(last=LIVE_STATS_INTERVAL))
+        finally:
+            source.close()
+        logger.info(source.summary())
+        logger.info(sink.stats.summary())
+        logger.info(stats.summary())
+        logger.info("---Pipeline Completed Successfully---")
+        return stats
+
+    def run_rerender(self):
+        """Re-annotates the video from cached tracks and court keypoints only, with bounded memory.
+
+        No model is loaded, so torch and ultralytics are never imported. Both caches must hold
+        entries for this video and these settings, i.e. from an earlier run with
+        `pipeline.rerender` off (in the same batch/streaming mode).
+        """
+        logger.info("--- Starting Tennis Analysis Pipeline (re-render from cache) ---")
+        # 1. Cached inputs only: unkeyed stubs are not migrated and nothing is detected
+        with profiler.stage("cache"):
+            tracks = self.stub_manager.get("tracks", self._tracks_cache_key(), suffix=TRACK_FILE_SUFFIX)
+            court_keypoints = self._load_cached_court_keypoints(self._court_mode())
+        missing = [name for name, value in (("tracks", tracks), ("court keypoints", court_keypoints)) if value is None]
+        if missing:
+            raise RuntimeError(f"Re-render needs cached {' and '.join(missing)} for {self.input_video_path}; "
+                               "run the pipeline once with pipeline.rerender off first.")
+
+        frames = iter_video(self.input_video_path)
+        first_frame = next(frames, None)
+        if first_frame is None: return
+        frames = itertools.chain([first_frame], frames)
+
+        # 2. Filtering, projection & physics over the whole clip (tracks only, no frames)
+        num_frames = len(tracks["players"])
+        tracks = to_columnar(tracks) if cfg.get('pipeline', {}).get('columnar_tracks', False) else to_frames(tracks)
+        with profiler.stage("tracking"):
+            tracks = self.tracker.choose_and_filter_players(court_keypoints, tracks)
+            tracks = self.tracker.add_position_to_tracks(tracks)
+        with profiler.stage("projection", frames=num_frames):
+            mini_court = MiniCourt(first_frame, cfg.get('mini_court', {}).get('projection', 'keypoint'))
+            tracks = mini_court.convert_bounding_boxes_to_mini_court_coordinates(tracks, court_keypoints)
+        fps = cfg.get('video', {}).get('fps', 24.0)
+        with profiler.stage("physics", frames=num_frames):
+            physics = PhysicsEngine(fps, mini_court.court_drawing_width)
+            tracks = physics.add_speed_and_distance_to_tracks(tracks)
+
+        # 3. Decode, annotate and encode chunk by chunk
+        save_video(self._rerender_frames(frames, tracks, court_keypoints, mini_court), self.output_video_path, fps=fps)
+        logger.info("---Pipeline Completed Successfully---")
+
+    def _rerender_frames(self, frames, tracks, court_keypoints, mini_court):
+        """Generator annotating STREAM_CHUNK_SIZE frames at a time against the finished tracks."""
+        per_frame_keypoints = np.ndim(court_keypoints) == 2
+        start = 0
+        while True:
+            chunk = list(itertools.islice(frames, STREAM_CHUNK_SIZE))
+            if not chunk:
+                return
+            stop = start + len(chunk)
+            frame_keypoints = court_keypoints[start:stop] if per_frame_keypoints else [court_keypoints] * len(chunk)
+            with profiler.stage("annotation", frames=len(chunk)):
+                annotated = self.annotator.draw_frames(chunk, tracks["players"][start:stop], tracks["ball"][start:stop],
+                                                       frame_keypoints, mini_court=mini_court, in_place=True)
+            yield from annotated
+            start = stop
+
+    def _court_mode(self):
+        """The court detection mode that actually runs: streaming has no whole clip for 'periodic', so uses 'static'."""
+        mode = cfg.get('court_detection', {}).get('mode', 'static')
+        if mode == 'periodic' and cfg.get('pipeline', {}).get('streaming', False):
+            return 'static'
+        return mode if mode in ('periodic', 'flow') else 'static'
+
+    def _court_cache_key(self, mode):
+        """Content address of the court keypoints: input video, court model, decoder and detection settings."""
+        court_model = cfg['models']['court_detector']
+        settings = None
+        if mode != 'static':
+            settings = [cfg.get('court_detection', {}), COURT_DETECTION_STRIDE, SCENE_CHANGE_THRESHOLD,
+                        FLOW_MIN_TRACKED_RATIO, FLOW_MAX_DRIFT_PX, FLOW_MAX_INTERVAL]
+        return StubManager.make_key(
+            "court",
+            version=COURT_CACHE_VERSION,
+            video=StubManager.fingerprint(self.input_video_path),
+            model=StubManager.fingerprint(court_model['model_path']),
+            decoder=[court_model.get('decoder', 'hough'), court_model.get('subpixel', True)],
+            mode=mode,
+            settings=settings,
+        )
+
+    def _load_cached_court_keypoints(self, mode):
+        court_keypoints = self.stub_manager.get("court", self._court_cache_key(mode))
+        if court_keypoints is not None:
+            logger.info("Loaded court keypoints from cache.")
+        return court_keypoints
+
+    def _save_cached_court_keypoints(self, mode, court_keypoints):
+        self.stub_manager.put("court", self._court_cache_key(mode), np.asarray(court_keypoints))
+
+    def _detect_court(self, video_frames):
+        """Court keypoints for the clip: one (28,) set from the first frame ('static' mode) or a
+        (num_frames, 28) per-frame track from periodic, scene-change-aware re-detection ('periodic')
+        or optical-flow propagation between detections ('flow')."""
+        court_cfg = cfg.get('court_detection', {})
+        mode = court_cfg.get('mode', 'static')
+        if mode == 'flow':
+            return self._make_court_flow_tracker().detect(video_frames)
+        if mode != 'periodic':
+            return self.court_detector.predict(video_frames[0])
+
+        court_track = CourtKeypointTrack(
+            self.court_detector,
+            stride=court_cfg.get('stride', COURT_DETECTION_STRIDE),
+            batch_size=court_cfg.get('batch_size', COURT_DETECTION_BATCH_SIZE),
+            scene_change_threshold=court_cfg.get('scene_change_threshold', SCENE_CHANGE_THRESHOLD)
+        )
+        return court_track.detect(video_frames)
+
+    def _make_court_flow_tracker(self):
+        court_cfg = cfg.get('court_detection', {})
+        return CourtFlowTracker(
+            self.court_detector,
+            min_tracked_ratio=court_cfg.get('flow_min_tracked_ratio', FLOW_MIN_TRACKED_RATIO),
+            max_drift=court_cfg.get('flow_max_drift', FLOW_MAX_DRIFT_PX),
+            max_interval=court_cfg.get('flow_max_interval', FLOW_MAX_INTERVAL)
+        )
+
+    def _stream_annotated_frames(self, frames, court_keypoints, mini_court, physics, court_flow=None):
+        """Generator yielding annotated frames. Holds at most STREAM_CHUNK_SIZE + STREAM_LOOKAHEAD frames
+        (plus the ball filter lag with the Kalman filter).
+
+        Court keypoints are the fixed court_keypoints (one set, or one per frame), or come per frame
+        from court_flow when given; those are cached at the end of the stream.
+        """
+        # The frame count (from the container header) keeps unkeyed stubs of another clip out
+        cached_tracks = self._load_cached_tracks(num_frames=video_frame_count(self.input_video_path))
+
+        if cached_tracks is not None:
+            # Stubs already hold interpolated ball positions
+            raw_tracks = _zip_tracks(frames, cached_tracks)
+            stub_tracks = None
+        else:
+            logger.info("No stubs found. Running streaming AI inference...")
+            raw_tracks = self._stream_raw_tracks(frames)
+            stub_tracks = {"players": [], "ball": []}
+
+        pending = deque()
+        context = {"players": [], "ball": [], "raw_ball": [], "keypoints": []}
+        self.tracker.chosen_players = None
+        per_frame_keypoints = court_keypoints is not None and np.ndim(court_keypoints) == 2
+        flow_keypoints = []
+
+        for frame_num, (frame, player_dict, ball_dict) in enumerate(raw_tracks):
+            if court_flow is not None:
+                with profiler.stage("court", frames=1):
+                    frame_keypoints = court_flow.update(frame)
+                flow_keypoints.append(frame_keypoints)
+            elif per_frame_keypoints:
+                frame_keypoints = court_keypoints[frame_num]
+            else:
+                frame_keypoints = court_keypoints
+            pending.append((frame, player_dict, ball_dict, frame_keypoints))
+            if len(pending) >= STREAM_CHUNK_SIZE + STREAM_LOOKAHEAD:
+                yield from self._finalize_window(pending, context, STREAM_CHUNK_SIZE, mini_court, physics, stub_tracks)
+
+        # Flush the tail once no more lookahead is coming
+        while pending:
+            yield from self._finalize_window(pending, context, STREAM_CHUNK_SIZE, mini_court, physics, stub_tracks)
+
+        if stub_tracks is not None:
+            self._save_cached_tracks(stub_tracks)
+        if court_flow is not None:
+            self._save_cached_court_keypoints('flow', np.array(flow_keypoints).reshape(-1, 28))
+
+    def _stream_raw_tracks(self, frames):
+        """Runs fused detection + ByteTrack batch by batch, yielding (frame, player_dict, ball_dict).
+
+        The ball is raw, unless the Kalman ball filter is on: then it is already smoothed online,
+        and every frame comes out `lag` frames late.
+        """
+        detections = profiler.iter_stage("detection", self._get_detection_stage().iter_detections(frames))
+        if self.tracker.ball_filter != "kalman":
+            for frame, p_det, b_det in detections:
+                with profiler.stage("tracking", frames=1):
+                    player_dict, ball_dict = self.tracker.track_frame(p_det, b_det)
+                yield frame, player_dict, ball_dict
+            return
+
+        ball_filter = BallKalmanTracker(lag=cfg.get('ball_tracking', {}).get('lag', BALL_KALMAN_LAG))
+        delayed = deque()
+        for frame, p_det, b_det in detections:
+            with profiler.stage("tracking", frames=1):
+                player_dict, ball_dict = self.tracker.track_frame(p_det, b_det)
+                delayed.append((frame, player_dict))
+                boxes = ball_filter.update(ball_dict.get(1, {}).get("bbox"))
+            for box in boxes:
+                yield (*delayed.popleft(), _ball_dict(box))
+        for box in ball_filter.flush():
+            yield (*delayed.popleft(), _ball_dict(box))
+        logger.info(ball_filter.summary())
+
+    def _get_detection_stage(self):
+        """Loads both YOLO detectors on first use and wraps them in one fused, adaptively batched pass."""
+        if self.detection_stage is None:
+            from core.detection import Detector, DetectionStage, BallSearch, KeyframeScheduler
+            models = cfg['models']
+            detection_cfg = cfg.get('detection', {})
+            self.player_detector = Detector(models['player_tracker']['model_path'])
+            self.ball_detector = Detector(models['ball_tracker']['model_path'])
+            ball_cfg = cfg.get('ball_detection', {})
+            ball_search = None
+            if ball_cfg.get('mode', 'full') == 'roi':
+                ball_search = BallSearch(
+                    self.ball_detector,
+                    conf=models['ball_tracker']['confidence_threshold'],
+                    fallback=ball_cfg.get('fallback', 'full')
+                )
+            player_cfg = cfg.get('player_detection', {})
+            player_scheduler = None
+            if player_cfg.get('mode', 'dense') == 'keyframe':
+                player_scheduler = KeyframeScheduler(
+                    self.player_detector,
+                    conf=models['player_tracker']['confidence_threshold'],
+                    max_stride=player_cfg.get('max_stride', KEYFRAME_MAX_STRIDE),
+                    motion_budget=player_cfg.get('motion_budget', KEYFRAME_MOTION_BUDGET)
+                )
+            self.detection_stage = DetectionStage(
+                self.player_detector,
+                self.ball_detector,
+                player_conf=models['player_tracker']['confidence_threshold'],
+                ball_conf=models['ball_tracker']['confidence_threshold'],
+                batch_size=detection_cfg.get('batch_size', DETECTION_BATCH_SIZE),
+                max_batch_size=detection_cfg.get('max_batch_size', DETECTION_MAX_BATCH_SIZE),
+                target_latency=detection_cfg.get('target_batch_latency', DETECTION_TARGET_BATCH_LATENCY),
+                ball_search=ball_search,
+                player_scheduler=player_scheduler
+            )
+        return self.detection_stage
+
+    def _finalize_window(self, pending, context, count, mini_court, physics, stub_tracks):
+        """Processes context + pending frames and emits the first `count` pending frames annotated."""
+        n_context = len(context["players"])
+        count = min(count, len(pending))
+
+        # 1. Ball interpolation over the whole window (context gives the smoother its past)
+        with profiler.stage("tracking"):
+            window_ball = context["ball"]
+            pending_ball = [ball_dict for _, _, ball_dict, _ in pending]
+            if stub_tracks is not None and self.tracker.ball_filter != "kalman":
+                interpolated = self.tracker.interpolate_ball_positions(context["raw_ball"] + pending_ball)
+                window_ball = window_ball + interpolated[n_context:]
+            else:
+                window_ball = window_ball + [dict(ball_dict) for ball_dict in pending_ball]
+
+            tracks = {
+                "players": context["players"] + [player_dict for _, player_dict, _, _ in pending],
+                "ball": window_ball,
+            }
+            # Per-frame (window, 28) court keypoints
+            court_keypoints = np.array(context["keypoints"] + [frame_keypoints for *_, frame_keypoints in pending])
+
+            # 2. Filtering, projection & physics; context frames are only read
+            tracks = self.tracker.choose_and_filter_players(court_keypoints, tracks, self.tracker.chosen_players)
+            tracks = self.tracker.add_position_to_tracks(tracks)
+        with profiler.stage("projection", frames=count):
+            tracks = mini_court.convert_bounding_boxes_to_mini_court_coordinates(
+                tracks, court_keypoints, start_frame=n_context, player_ids=self.tracker.chosen_players
+            )
+        # Physics keeps running totals, so it must only advance through the frames emitted now
+        with profiler.stage("physics", frames=count):
+            emitted = {"players": tracks["players"][:n_context + count]}
+            physics.add_speed_and_distance_to_tracks(emitted, start_frame=n_context)
+
+        # 3. Slide the context forward, then render the finalized frames in parallel (in place: nothing else reads them)
+        finalized = []
+        for i in range(count):
+            frame, raw_players, raw_ball, frame_keypoints = pending.popleft()
+            player_dict = tracks["players"][n_context + i]
+            ball_dict = tracks["ball"][n_context + i]
+
+            if stub_tracks is not None:
+                stub_tracks["players"].append({tid: {"bbox": info["bbox"]} for tid, info in raw_players.items()})
+                stub_tracks["ball"].append({bid: {"bbox": info["bbox"]} for bid, info in ball_dict.items()})
+
+            context["players"].append(player_dict)
+            context["ball"].append(ball_dict)
+            context["raw_ball"].append(raw_ball)
+            context["keypoints"].append(frame_keypoints)
+            finalized.append((frame, player_dict, ball_dict, frame_keypoints))
+
+        for key in context:
+            del context[key][:-STREAM_CONTEXT]
+
+        with profiler.stage("annotation", frames=count):
+            annotated = self.annotator.draw_frames(*zip(*finalized), mini_court=mini_court, in_place=True)
+        yield from annotated
+
+    def _tracks_cache_key(self):
+        """Content address of the tracking stage: input video, model weights and every setting that shapes the tracks."""
+        models = cfg['models']
+        return StubManager.make_key(
+            "tracks",
+            version=TRACKS_CACHE_VERSION,
+            video=StubManager.fingerprint(self.input_video_path),
+            player_model=StubManager.fingerprint(models['player_tracker']['model_path']),
+            ball_model=StubManager.fingerprint(models['ball_tracker']['model_path']),
+            player_conf=models['player_tracker']['confidence_threshold'],
+            ball_conf=models['ball_tracker']['confidence_threshold'],
+            classes=[CLASS_PLAYER, CLASS_BALL],
+            tracker=[TRACKER_ACTIVATION_THRESHOLD, TRACKER_LOST_BUFFER],
+            interpolation=[MAX_PIXEL_MOVE_PER_FRAME, INTERPOLATE_LIMIT, ROLLING_WINDOW, BFILL_LIMIT],
+            ball_filter=self._ball_filter_settings(),
+            ball_search=cfg.get('ball_detection', {}),
+            player_schedule=cfg.get('player_detection', {}),
+        )
+
+    def _ball_filter_settings(self):
+        """Cache-key part for the ball filter. Kalman output depends on the mode: online (fixed lag) when streaming, offline otherwise."""
+        if self.tracker.ball_filter != "kalman":
+            return self.tracker.ball_filter
+        if cfg.get('pipeline', {}).get('streaming', False):
+            mode = ["online", cfg.get('ball_tracking', {}).get('lag', BALL_KALMAN_LAG)]
+        else:
+            mode = ["offline"]
+        return ["kalman", *mode, BALL_KALMAN_PROCESS_NOISE, BALL_KALMAN_MEASUREMENT_NOISE, BALL_KALMAN_GATE]
+
+    def _save_cached_tracks(self, tracks):
+        stub_path = self.stub_manager.put("tracks", self._tracks_cache_key(), tracks, suffix=TRACK_FILE_SUFFIX)
+        logger.info(f"Saved new tracking data to cache: {stub_path}")
+
+    def _load_cached_tracks(self, num_frames=None):
+        """Loads tracks from the cache, or migrates old unkeyed stubs. Returns None if neither applies.
+
+        Unkeyed stubs (unified_stub, legacy player/ball stubs) carry no record of what produced them,
+        so they are only imported when their frame count matches the video (if known).
+        """
+        cache_key = self._tracks_cache_key()
+
+        # 1. Primary Check: content-addressed cache entry for this exact video/model/config
+        tracks = self.stub_manager.get("tracks", cache_key, suffix=TRACK_FILE_SUFFIX)
+        if tracks is not None:
+            logger.info("Loaded tracking data from cache.")
+            return tracks
+
+        # 2. Fallback Check: import old unkeyed stubs if they exist
+        tracks = self._import_legacy_tracks(num_frames)
+        if tracks is not None:
+            self._save_cached_tracks(tracks)
+        return tracks
+
+    def _import_legacy_tracks(self, num_frames=None):
+        """Unkeyed stubs, if any exist and their frame count matches the video (if known); else None."""
+        tracks = self._load_legacy_tracks()
+        if tracks is None:
+            return None
+        if num_frames is not None and len(tracks["players"]) != num_frames:
+            logger.warning(f"Ignoring unkeyed stubs: {len(tracks['players'])} frames vs {num_frames} in the video.")
+            return None
+
+        logger.warning("Importing unkeyed stubs into the cache; their provenance cannot be verified.")
+        return tracks
+
+    def _load_legacy_tracks(self):
+        """Reads the old unified stub, or migrates the legacy player/ball stubs."""
         tracks_stub_file = cfg['paths'].get('unified_stub')
         legacy_player_stub = cfg['paths'].get('legacy_player_stub')
         legacy_ball_stub = cfg['paths'].get('legacy_ball_stub')
-        
-        # Ensure the directory for the unified stub exists
-        if tracks_stub_file:
-            os.makedirs(os.path.dirname(tracks_stub_file), exist_ok=True)
-        else:
-            logger.error("unified_stub path is missing from config.yaml!")
-            return None
 
-        # 1. Primary Check: Load unified stub if it exists
-        if os.path.exists(tracks_stub_file):
+        if tracks_stub_file and os.path.exists(tracks_stub_file):
             logger.info(f"Loading unified tracking data from: {tracks_stub_file}")
+            if is_track_file(tracks_stub_file):
+                return load_tracks(tracks_stub_file)
             with open(tracks_stub_file, 'rb') as f:
                 return pickle.load(f)
 
-        # 2. Fallback Check: Migrate legacy stubs if they exist
         if legacy_player_stub and legacy_ball_stub and os.path.exists(legacy_player_stub) and os.path.exists(legacy_ball_stub):
             logger.info("Legacy stubs detected. Triggering data migration...")
             
@@ -88,49 +736,40 @@ class Pipeline:
                 old_players = pickle.load(f)
             with open(legacy_ball_stub, 'rb') as f:
                 old_ball = pickle.load(f)
-                
-            tracks = {"players": [], "ball": []}
-            
-            # Transform Player Data
-            for frame_dict in old_players:
-                frame_players = {track_id: {"bbox": bbox} for track_id, bbox in frame_dict.items()}
-                tracks["players"].append(frame_players)
-                
-            # Transform Ball Data
-            for frame_dict in old_ball:
-                frame_ball = {ball_id: {"bbox": bbox} for ball_id, bbox in frame_dict.items()}
-                tracks["ball"].append(frame_ball)
+            tracks = tracks_from_legacy_stubs(old_players, old_ball)
                 
             # Apply new interpolation logic
             logger.info("Applying updated interpolation logic to migrated ball data...")
             tracks["ball"] = self.tracker.interpolate_ball_positions(tracks["ball"])
-            
-            # Save the new unified stub
-            logger.info(f"Migration successful. Saving unified stub to: {tracks_stub_file}")
-            with open(tracks_stub_file, 'wb') as f:
-                pickle.dump(tracks, f)
-                
+            logger.info("Migration successful.")
             return tracks
 
-        # 3. Execution: Run Models if NO stubs exist
-        logger.info("No stubs found. Running AI inference (this may take a few minutes)...")
-        
-        logger.info("[1/2] Detecting Players...")
-        player_detections = self.player_detector.detect_frames(
-            video_frames, 
-            conf=cfg['models']['player_tracker']['confidence_threshold']
-        )
-        
-        logger.info("[2/2] Detecting Ball...")
-        ball_detections = self.ball_detector.detect_frames(
-            video_frames, 
-            conf=cfg['models']['ball_tracker']['confidence_threshold']
-        )
-        
-        tracks = self.tracker.get_object_tracks(player_detections, ball_detections)
-        
-        logger.info(f"Saving new tracking data to stub: {tracks_stub_file}")
-        with open(tracks_stub_file, 'wb') as f:
-            pickle.dump(tracks, f)
-            
-        return tracks
\ No newline at end of file
+        return None
+
+
+def _zip_tracks(frames, tracks):
+    """(frame, player_dict, ball_dict) per frame of the video; raises if the cached tracks are shorter or longer."""
+    players, ball = tracks["players"], tracks["ball"]
+    num_frames = 0
+    for frame in frames:
+        if num_frames >= len(players):
+            raise ValueError(f"Cached tracks cover {len(players)} frames but the video has more")
+        yield frame, players[num_frames], ball[num_frames]
+        num_frames += 1
+    if num_frames != len(players):
+        raise ValueError(f"Cached tracks cover {len(players)} frames but the video has {num_frames}")
+
+
+def _ball_dict(box):
+    """Per-frame ball dict for a filtered box (None = no ball)."""
+    return {} if box is None else {1: {"bbox": box.tolist()}}
+
+
+def _upper_names(module):
+    """Names of the constants defined in a constants module."""
+    return [name for name in vars(module) if name.isupper()]
+
+
+def _constants(*names):
+    """{name: value} of named constants, as stage params."""
+    return {name: getattr(constants, name) for name in names}
@@ -1 +1,2 @@
-from .tracker import Tracker
\ No newline at end of file
+from .tracker import Tracker
+from .ball_kalman import BallKalmanTracker
@@ -0,0 +1,215 @@
+from collections import deque
+import numpy as np
+from constants import (
+    MAX_PIXEL_MOVE_PER_FRAME,
+    INTERPOLATE_LIMIT,
+    BFILL_LIMIT,
+    BALL_KALMAN_LAG,
+    BALL_KALMAN_PROCESS_NOISE,
+    BALL_KALMAN_MEASUREMENT_NOISE,
+    BALL_KALMAN_GATE,
+    BALL_KALMAN_INITIAL_SPEED,
+    BALL_KALMAN_INITIAL_ACCELERATION
+)
+
+# Constant-acceleration transition for one axis (position, velocity, acceleration), dt = 1 frame
+_F = np.array([[1.0, 1.0, 0.5], [0.0, 1.0, 1.0], [0.0, 0.0, 1.0]])
+# Discretized white-jerk process noise for dt = 1
+_Q = np.array([[1 / 20, 1 / 8, 1 / 6], [1 / 8, 1 / 3, 1 / 2], [1 / 6, 1 / 2, 1.0]])
+
+
+class _Record:
+    """Filter state of one frame, kept until the smoother no longer needs it."""
+    __slots__ = ("frame", "segment", "measured", "m_pred", "m_filt", "gain", "hold")
+
+    def __init__(self, frame, segment, measured, m_pred, m_filt, hold):
+        self.frame = frame
+        self.segment = segment
+        self.measured = measured
+        self.m_pred = m_pred      # (3, 4) predicted state, None when a segment starts here or there is no track
+        self.m_filt = m_filt      # (3, 4) filtered state, None when there is no track
+        self.gain = None          # RTS smoother gain, set once the next frame of the same segment is predicted
+        self.hold = hold          # (frame, filtered state) of the last accepted detection at or before this frame
+
+
+class BallKalmanTracker:
+    """Constant-acceleration Kalman filter and smoother for the ball box.
+
+    The state is (position, velocity, acceleration) of the box center, width and height.
+    All four share one covariance, since they have the same model and are measured together.
+    A detection is accepted if its center innovation passes a chi-square gate. Rejected
+    detections are dropped, but two rejected detections on consecutive frames that are within
+    MAX_PIXEL_MOVE_PER_FRAME of each other start a new track there. A track is lost after
+    `max_gap` frames without an accepted detection.
+
+    Outputs follow the legacy interpolation: gaps are bridged (here by the smoother), the
+    last position is held for up to `max_gap` frames, and nothing is output once the ball is lost.
+
+    - Online (update / flush): one frame in, the frame `lag` frames back out, fixed-lag
+      smoothed over the frames in between. The work per frame is O(lag).
+    - Offline (smooth_array): full Rauch-Tung-Striebel smoothing of a whole series; like the
+      pandas version it also backfills the start of each track.
+    """
+
+    def __init__(self, lag=BALL_KALMAN_LAG, max_gap=INTERPOLATE_LIMIT, process_noise=BALL_KALMAN_PROCESS_NOISE,
+                 measurement_noise=BALL_KALMAN_MEASUREMENT_NOISE, gate=BALL_KALMAN_GATE):
+        self.lag = lag
+        self.max_gap = max_gap
+        self.gate = gate
+        self._Q = process_noise * _Q
+        self._R = measurement_noise ** 2
+        self._P0 = np.diag([self._R, BALL_KALMAN_INITIAL_SPEED ** 2, BALL_KALMAN_INITIAL_ACCELERATION ** 2])
+        self.reset()
+
+    def reset(self):
+        self.frame_num = 0
+        self._mean = None            # (3, 4) filtered state of the current track, None when there is none
+        self._cov = None             # (3, 3) its covariance (shared by the four columns)
+        self._segment = 0
+        self._last = None            # Record of the latest frame
+        self._hold = None            # (frame, filtered state) of the last accepted detection
+        self._rejected = None        # (frame, center) of the last gated-out detection
+        self._pending = deque()      # Online: records not yet emitted
+
+        self.accepted = 0
+        self.rejected = 0
+        self.tracks = 0
+
+    # --- Online ---
+    def update(self, bbox):
+        """Feeds the next frame's raw ball box (or None). Returns the boxes finalized by it: the frame `lag` back, once there is one."""
+        self._pending.append(self._step(bbox))
+        if len(self._pending) <= self.lag:
+            return []
+        box = self._smooth(self._pending, count=1)[0]
+        self._pending.popleft()
+        return [box]
+
+    def flush(self):
+        """Boxes of every frame not yet emitted (end of stream)."""
+        boxes = self._smooth(self._pending)
+        self._pending.clear()
+        return boxes
+
+    # --- Offline ---
+    def smooth_array(self, ball_positions):
+        """Smooths a whole (n, 4) ball box array (NaN = no ball) like Tracker.interpolate_ball_array."""
+        self.reset()
+        records = [self._step(None if np.isnan(box[0]) else box) for box in np.asarray(ball_positions, dtype=np.float64)]
+        smoothed = np.full((len(records), 4), np.nan)
+        for index, box in enumerate(self._smooth(records)):
+            if box is not None:
+                smoothed[index] = box
+
+        # Backfill the frames before each track starts (interpolation limit + bfill limit, as before)
+        starts = [i for i, record in enumerate(records) if record.m_pred is None and record.m_filt is not None]
+        for start in starts:
+            first = max(0, start - self.max_gap - BFILL_LIMIT)
+            empty = np.isnan(smoothed[first:start, 0])
+            smoothed[first:start][empty] = smoothed[start]
+        return smoothed
+
+    # --- Filter ---
+    def _step(self, bbox):
+        """Runs predict + gated update for one frame and returns its record."""
+        frame = self.frame_num
+        self.frame_num += 1
+        z = None
+        if bbox is not None:
+            x1, y1, x2, y2 = bbox
+            z = np.array([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], dtype=np.float64)
+
+        # 1. Predict, or drop the track once the ball has been missing too long
+        m_pred = cov_pred = None
+        if self._mean is not None and frame - self._hold[0] - 1 > self.max_gap:
+            self._mean = self._cov = None
+        if self._mean is not None:
+            m_pred = _F @ self._mean
+            cov_pred = _F @ self._cov @ _F.T + self._Q
+            self._last.gain = self._cov @ _F.T @ np.linalg.inv(cov_pred)
+
+        # 2. Gated update
+        measured = False
+        if z is not None and m_pred is not None:
+            s = cov_pred[0, 0] + self._R
+            innovation = z - m_pred[0]
+            if (innovation[0] ** 2 + innovation[1] ** 2) / s <= self.gate:
+                k = cov_pred[:, 0] / s
+                self._mean = m_pred + np.outer(k, innovation)
+                self._cov = cov_pred - np.outer(k, cov_pred[0])
+                measured = True
+                self.accepted += 1
+            else:
+                self.rejected += 1
+                if self._agrees_with_rejected(frame, z):
+                    # The ball really moved there: restart the track from both detections
+                    velocity = z[:2] - self._rejected[1]
+                    m_pred = None
+                    self._start_track(z, velocity)
+                    measured = True
+                else:
+                    self._rejected = (frame, z[:2])
+                    self._mean, self._cov = m_pred, cov_pred
+        elif z is not None:
+            self._start_track(z)
+            measured = True
+        elif m_pred is not None:
+            self._mean, self._cov = m_pred, cov_pred
+
+        # 3. Record the frame
+        if measured:
+            self._hold = (frame, self._mean)
+            self._rejected = None
+        record = _Record(frame, self._segment, measured, m_pred, self._mean, self._hold)
+        self._last = record
+        return record
+
+    def _start_track(self, z, velocity=None):
+        self._segment += 1
+        self.tracks += 1
+        self._mean = np.zeros((3, 4))
+        self._mean[0] = z
+        if velocity is not None:
+            self._mean[1, :2] = velocity
+        self._cov = self._P0.copy()
+
+    def _agrees_with_rejected(self, frame, z):
+        if self._rejected is None or self._rejected[0] != frame - 1:
+            return False
+        return np.hypot(*(z[:2] - self._rejected[1])) <= MAX_PIXEL_MOVE_PER_FRAME
+
+    # --- Smoother ---
+    def _smooth(self, records, count=None):
+        """RTS-smoothed boxes of the first `count` (default: all) consecutive records, given all of them (None = no ball).
+
+        Frames after the last detection of their track hold that detection's state for up to max_gap frames.
+        """
+        count = len(records) if count is None else count
+        boxes = [None] * count
+        following, following_mean = None, None
+        for index in range(len(records) - 1, -1, -1):
+            record = records[index]
+            mean = None
+            if record.m_filt is not None:
+                if following_mean is not None and following.segment == record.segment and following.m_pred is not None:
+                    mean = record.m_filt + record.gain @ (following_mean - following.m_pred)
+                elif record.measured:
+                    mean = record.m_filt
+            following, following_mean = record, mean
+
+            if mean is None and record.hold is not None and record.m_filt is not None \
+                    and record.frame - record.hold[0] <= self.max_gap:
+                mean = record.hold[1]
+            if mean is not None and index < count:
+                boxes[index] = _to_box(mean[0])
+        return boxes
+
+    def summary(self):
+        return (f"[ball filter] {self.frame_num} frames | {self.accepted} detections accepted, "
+                f"{self.rejected} gated out | {self.tracks} tracks")
+
+
+def _to_box(state):
+    """(cx, cy, w, h) -> [x1, y1, x2, y2]."""
+    cx, cy, w, h = state
+    return np.array([cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2])
@@ -1,8 +1,10 @@
-import supervision as sv
 import numpy as np
-import pandas as pd
 from utils.logger import logger
+from utils.profiler import profiler
 from utils.bbox_utils import get_center_of_bbox, get_foot_position
+from utils.track_store import TrackStore, is_columnar
+from core.detection.detections import FrameDetections
+from .ball_kalman import BallKalmanTracker
 from constants import (
     CLASS_PLAYER, 
     CLASS_BALL, 
@@ -15,61 +17,118 @@ from constants import (
 )
 
 class Tracker:
-    def __init__(self):
-        logger.info("Initializing ByteTrack Tracker for Tennis.")
-        self.tracker = sv.ByteTrack(
-            track_activation_threshold=TRACKER_ACTIVATION_THRESHOLD, 
-            lost_track_buffer=TRACKER_LOST_BUFFER
-        )
+    BALL_FILTERS = ("interpolate", "kalman")
+
+    def __init__(self, ball_filter="interpolate"):
+        """ball_filter: 'interpolate' (pandas gap filling + rolling mean) or 'kalman' (BallKalmanTracker)."""
+        if ball_filter not in self.BALL_FILTERS:
+            raise ValueError(f"Unknown ball filter '{ball_filter}'. Choose from {self.BALL_FILTERS}.")
+        self.ball_filter = ball_filter
+        self._byte_track = None
+        self.chosen_players = None
+
+    @property
+    def tracker(self):
+        """ByteTrack, built on first use: filtering cached tracks never imports supervision."""
+        if self._byte_track is None:
+            import supervision as sv
+            logger.info("Initializing ByteTrack Tracker for Tennis.")
+            self._byte_track = sv.ByteTrack(
+                track_activation_threshold=TRACKER_ACTIVATION_THRESHOLD, 
+                lost_track_buffer=TRACKER_LOST_BUFFER
+            )
+        return self._byte_track
 
     def get_object_tracks(self, player_detections, ball_detections):
+        """Tracks a whole video. Returns columnar tracks (see TrackStore).
+
+        Boxes and track ids are copied straight from the tracker's arrays into preallocated
+        columns; nothing is converted per object.
+        """
         logger.info("Assigning tracking IDs to tennis players and extracting ball positions...")
-        
-        tracks = {"players": [], "ball": []}
+        num_frames = len(player_detections)
+
+        # Player rows grow by doubling; ball boxes have exactly one (possibly NaN) row per frame
+        capacity = max(16, 4 * num_frames)
+        frames = np.empty(capacity, dtype=np.int64)
+        track_ids = np.empty(capacity, dtype=np.int64)
+        bboxes = np.empty((capacity, 4), dtype=np.float64)
+        num_rows = 0
 
         # Loop through frames based on the length of our detections
-        for frame_num in range(len(player_detections)):
-            # 1. Handle Players (using player_detections)
-            p_det = player_detections[frame_num]
-            p_inv_names = {v: k for k, v in p_det.names.items()}
-            p_supervision = sv.Detections.from_ultralytics(p_det)
-            p_with_tracks = self.tracker.update_with_detections(p_supervision)
-            
-            tracks["players"].append({})
-            for frame_detection in p_with_tracks:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-                track_id = frame_detection[4]
-                if cls_id == p_inv_names.get(CLASS_PLAYER):
-                    tracks["players"][frame_num][track_id] = {"bbox": bbox}
-
-            # 2. Handle Ball (using ball_detections)
-            b_det = ball_detections[frame_num]
-            b_inv_names = {v: k for k, v in b_det.names.items()}
-            b_supervision = sv.Detections.from_ultralytics(b_det)
-            
-            tracks["ball"].append({})
-            for frame_detection in b_supervision:
-                bbox = frame_detection[0].tolist()
-                cls_id = frame_detection[3]
-                if cls_id == b_inv_names.get(CLASS_BALL):
-                    tracks["ball"][frame_num][1] = {"bbox": bbox}
+        for frame_num in range(num_frames):
+            xyxy, ids = self._track_players(player_detections[frame_num])
+            end = num_rows + len(ids)
+            if end > capacity:
+                capacity = max(2 * capacity, end)
+                frames, track_ids, bboxes = (np.resize(a, (capacity,) + a.shape[1:]) for a in (frames, track_ids, bboxes))
+            frames[num_rows:end] = frame_num
+            track_ids[num_rows:end] = ids
+            bboxes[num_rows:end] = xyxy
+            num_rows = end
 
         logger.info("Tracking complete. Interpolating ball positions...")
-        tracks["ball"] = self.interpolate_ball_positions(tracks["ball"])
-        return tracks
+        ball = self.smooth_ball_array(_best_ball_boxes(ball_detections))
+        has_ball = ~np.isnan(ball[:, 0])
+        return {
+            "players": TrackStore(num_frames, frames[:num_rows], track_ids[:num_rows], bboxes[:num_rows]),
+            "ball": TrackStore(num_frames, np.flatnonzero(has_ball), np.ones(int(has_ball.sum())), ball[has_ball]),
+        }
+
+    def track_frame(self, p_det, b_det):
+        """Updates ByteTrack with one frame of detections. Returns (player_dict, ball_dict) for that frame.
+
+        b_det may be None when ball detection was skipped for the frame (empty ball_dict).
+        """
+        # 1. Handle Players (using player detections)
+        xyxy, ids = self._track_players(p_det)
+        player_dict = {track_id: {"bbox": bbox} for track_id, bbox in zip(ids.tolist(), xyxy.tolist())}
+
+        # 2. Handle Ball (using ball detections): the most confident ball box
+        ball_dict = {}
+        best = _best_ball_box(b_det) if b_det is not None else None
+        if best is not None:
+            ball_dict[1] = {"bbox": best.tolist()}
+
+        return player_dict, ball_dict
+
+    @profiler.span()
+    def _track_players(self, p_det):
+        """Runs ByteTrack on all detections, then keeps the player class. Returns (xyxy, track_ids) arrays."""
+        tracked = self.tracker.update_with_detections(_to_supervision(p_det))
+        is_player = tracked.class_id == _class_id(p_det.names, CLASS_PLAYER)
+        return tracked.xyxy[is_player], tracked.tracker_id[is_player]
 
     def interpolate_ball_positions(self, ball_positions):
-        # 1. Convert to DataFrame
-        processed_positions = []
-        for x in ball_positions:
+        """Legacy per-frame dict version of smooth_ball_array."""
+        # 1. Convert to an array
+        processed_positions = np.full((len(ball_positions), 4), np.nan)
+        for frame_num, x in enumerate(ball_positions):
             bbox = x.get(1, {}).get('bbox', [])
-            if not bbox:
-                processed_positions.append([np.nan, np.nan, np.nan, np.nan])
+            if bbox:
+                processed_positions[frame_num] = bbox
+
+        final_positions = []
+        for row in self.smooth_ball_array(processed_positions):
+            if np.isnan(row[0]):
+                final_positions.append({}) 
             else:
-                processed_positions.append(bbox)
-        
-        df_ball_positions = pd.DataFrame(processed_positions, columns=['x1', 'y1', 'x2', 'y2'])
+                final_positions.append({1: {"bbox": row.tolist()}})
+
+        return final_positions
+
+    def smooth_ball_array(self, ball_positions):
+        """Cleans a whole (n, 4) ball box array (NaN = no ball) with the configured ball filter."""
+        if self.ball_filter == "kalman":
+            return BallKalmanTracker().smooth_array(ball_positions)
+        return self.interpolate_ball_array(ball_positions)
+
+    @staticmethod
+    def interpolate_ball_array(ball_positions):
+        """Outlier removal, gap interpolation, smoothing and edge filling of an (n, 4) ball box array (NaN = no ball)."""
+        import pandas as pd
+        # 1. Convert to DataFrame
+        df_ball_positions = pd.DataFrame(ball_positions, columns=['x1', 'y1', 'x2', 'y2'])
 
         # 2. Filter False Positives (Sudden jumps)
         df_ball_positions['center_x'] = (df_ball_positions['x1'] + df_ball_positions['x2']) / 2
@@ -95,23 +154,29 @@ class Tracker:
         # 5. Fill remaining edges
         df_ball_positions = df_ball_positions.bfill(limit=BFILL_LIMIT)
 
-        # Reconstruct format
-        final_positions = []
-        for row in df_ball_positions.to_numpy():
-            if np.isnan(row[0]):
-                final_positions.append({}) 
-            else:
-                final_positions.append({1: {"bbox": row[:4].tolist()}})
+        return df_ball_positions[['x1', 'y1', 'x2', 'y2']].to_numpy()
 
-        return final_positions
+    def choose_and_filter_players(self, court_keypoints, tracks, chosen_players=None):
+        """Filters out the audience/umpires, keeping only the 2 actual players.
 
-    def choose_and_filter_players(self, court_keypoints, tracks):
-        """Filters out the audience/umpires, keeping only the 2 actual players."""
+        If chosen_players is None they are picked from the first frame of tracks;
+        the choice is kept on self.chosen_players so later windows can reuse it.
+        """
         logger.info("Filtering audience/umpires based on spatial distance to court lines...")
         
         # Use the first frame to identify the two players
-        player_detections_first_frame = tracks["players"][0]
-        chosen_players = self._choose_players(court_keypoints, player_detections_first_frame)
+        if chosen_players is None:
+            if np.ndim(court_keypoints) == 2:
+                # Per-frame court keypoints: use the first frame's set
+                court_keypoints = court_keypoints[0]
+            player_detections_first_frame = tracks["players"][0]
+            chosen_players = self._choose_players(court_keypoints, player_detections_first_frame)
+        self.chosen_players = chosen_players
+
+        if is_columnar(tracks):
+            store = tracks["players"]
+            tracks["players"] = store.select(np.isin(store.track_id, list(chosen_players)))
+            return tracks
         
         # Rebuild the tracks dictionary keeping only the chosen IDs
         filtered_player_tracks = []
@@ -157,6 +222,18 @@ class Tracker:
     @staticmethod
     def add_position_to_tracks(tracks):
         logger.info("Calculating real-world spatial positions (feet/center) for players and ball...")
+        if is_columnar(tracks):
+            for obj, store in tracks.items():
+                bbox = store.get("bbox")
+                # int() truncation, as in get_center_of_bbox / get_foot_position
+                x = np.trunc((bbox[:, 0] + bbox[:, 2]) / 2)
+                if obj == "tennis ball":
+                    y = np.trunc((bbox[:, 1] + bbox[:, 3]) / 2)
+                else:
+                    y = np.trunc(bbox[:, 3])
+                store.set("position", np.stack([x, y], axis=1))
+            return tracks
+
         for obj, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
                 for track_id, track_info in track.items():
@@ -166,4 +243,65 @@ class Tracker:
                     else:
                         position = get_foot_position(bbox)
                     tracks[obj][frame_num][track_id]['position'] = position
-        return tracks
\ No newline at end of file
+        return tracks
+
+
+def _to_supervision(detections):
+    """sv.Detections from compact FrameDetections (or a raw ultralytics result)."""
+    import supervision as sv
+    if isinstance(detections, FrameDetections):
+        return sv.Detections(xyxy=detections.xyxy, confidence=detections.confidence, class_id=detections.class_id)
+    return sv.Detections.from_ultralytics(detections)
+
+
+_class_ids = {}
+
+
+def _class_id(names, class_name):
+    """Class id of class_name in a model's names map (memoized per map, as every frame shares it)."""
+    cached = _class_ids.get(id(names))
+    if cached is None or cached[0] is not names:
+        cached = (names, {name: cls_id for cls_id, name in names.items()})
+        _class_ids[id(names)] = cached
+    return cached[1].get(class_name)
+
+
+def _best_ball_boxes(ball_detections):
+    """(num_frames, 4) boxes of the most confident ball per frame (NaN rows where there is none), in one vectorized pass."""
+    ball = np.full((len(ball_detections), 4), np.nan)
+    if not all(isinstance(b_det, FrameDetections) for b_det in ball_detections):
+        for frame_num, b_det in enumerate(ball_detections):
+            best = _best_ball_box(b_det)
+            if best is not None:
+                ball[frame_num] = best
+        return ball
+    if not ball_detections:
+        return ball
+
+    # 1. All detections of the video as flat columns
+    counts = [len(b_det) for b_det in ball_detections]
+    frames = np.repeat(np.arange(len(ball_detections)), counts)
+    xyxy = np.concatenate([b_det.xyxy for b_det in ball_detections])
+    confidence = np.concatenate([b_det.confidence for b_det in ball_detections])
+    class_id = np.concatenate([b_det.class_id for b_det in ball_detections])
+
+    # 2. Per frame, the first of the most confident ball rows
+    rows = np.flatnonzero(class_id == _class_id(ball_detections[0].names, CLASS_BALL))
+    rows = rows[np.lexsort((-confidence[rows], frames[rows]))]
+    first = np.r_[True, frames[rows][1:] != frames[rows][:-1]] if len(rows) else np.zeros(0, dtype=bool)
+    ball[frames[rows[first]]] = xyxy[rows[first]]
+    return ball
+
+
+def _best_ball_box(b_det):
+    """xyxy of the most confident ball detection, or None."""
+    if isinstance(b_det, FrameDetections):
+        xyxy, confidence, class_id = b_det.xyxy, b_det.confidence, b_det.class_id
+    else:
+        import supervision as sv
+        detections = sv.Detections.from_ultralytics(b_det)
+        xyxy, confidence, class_id = detections.xyxy, detections.confidence, detections.class_id
+    is_ball = np.flatnonzero(class_id == _class_id(b_det.names, CLASS_BALL))
+    if len(is_ball) == 0:
+        return None
+    return xyxy[is_ball[np.argmax(confidence[is_ball])]]
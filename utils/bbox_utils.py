@@ -1,3 +1,5 @@
+import numpy as np
+
 def get_center_of_bbox(bbox):
     x1, y1, x2, y2 = bbox
     return int((x1+x2)/2), int((y1+y2)/2)
@@ -29,8 +31,33 @@ def get_closest_keypoint_index(point, keypoints, valid_indices):
             key_point_ind = keypoint_indix
     return key_point_ind
 
+def get_closest_keypoint_indices(points, keypoints, valid_indices):
+    """Vectorized get_closest_keypoint_index for an (n, 2) array of points (same vertical-distance rule and tie-breaking).
+
+    keypoints is one flat (28,) set shared by all points, or an (n, 28) array with one set per point.
+    """
+    valid_indices = np.asarray(valid_indices)
+    keypoints_y = np.asarray(keypoints, dtype=np.float64)[..., valid_indices * 2 + 1]
+    distance = np.abs(np.asarray(points, dtype=np.float64)[:, 1:2] - np.atleast_2d(keypoints_y))
+    # Missing (NaN) keypoints never win; if all are missing the first valid index is used
+    distance[np.isnan(distance)] = np.inf
+    return valid_indices[np.argmin(distance, axis=1)] if len(distance) else valid_indices[:0]
+
 def convert_pixel_distance_to_meters(pixel_distance, reference_height_in_meters, reference_height_in_pixels):
     return (pixel_distance * reference_height_in_meters) / reference_height_in_pixels
 
 def convert_meters_to_pixel_distance(meters, reference_width_in_meters, reference_width_in_pixels):
-    return (meters * reference_width_in_pixels) / reference_width_in_meters
\ No newline at end of file
+    return (meters * reference_width_in_pixels) / reference_width_in_meters
+
+
+def get_iou_matrix(boxes_a, boxes_b):
+    """Pairwise IoU of (n, 4) and (m, 4) xyxy box arrays -> (n, m)."""
+    boxes_a = np.asarray(boxes_a, dtype=np.float64).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float64).reshape(-1, 4)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
@@ -1,4 +1,5 @@
-import yaml
+import logging
+from collections.abc import MutableMapping
 from pathlib import Path
 
 class ConfigLoader:
@@ -24,13 +25,42 @@ class ConfigLoader:
         if not config_path.exists():
             raise FileNotFoundError(f"[CRITICAL BOOTSTRAP] Config file missing at: {config_path}")
         
+        import yaml
+        # The C loader (when PyYAML was built with libyaml) parses the same safe subset, much faster
+        loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
         with open(config_path, 'r') as f:
-            self._config = yaml.safe_load(f)
-            print(f"[BOOTSTRAP] Configuration loaded successfully from {config_path}")
+            self._config = yaml.load(f, Loader=loader)
+
+        # The logger exists before the config does; its level is applied here
+        system_logger = logging.getLogger("TennisSystem")
+        system_logger.setLevel(getattr(logging, self._config['system'].get('log_level', 'INFO').upper()))
+        system_logger.debug(f"[BOOTSTRAP] Configuration loaded successfully from {config_path}")
 
     @property
     def config(self):
         return self._config
 
-# Expose a single global instance dictionary
-cfg = ConfigLoader().config
\ No newline at end of file
+class LazyConfig(MutableMapping):
+    """The config dict, read from config.yaml on first access instead of at import time."""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        return ConfigLoader().config[key]
+
+    def __setitem__(self, key, value):
+        ConfigLoader().config[key] = value
+
+    def __delitem__(self, key):
+        del ConfigLoader().config[key]
+
+    def __iter__(self):
+        return iter(ConfigLoader().config)
+
+    def __len__(self):
+        return len(ConfigLoader().config)
+
+    def __repr__(self):
+        return repr(ConfigLoader().config)
+
+# Expose a single global instance dictionary (loaded on first use)
+cfg = LazyConfig()
@@ -0,0 +1,82 @@
+from collections import deque
+import numpy as np
+from constants.pipeline_consts import LIVE_COST_SMOOTHING, LIVE_PROBE_INTERVAL, LIVE_LATENCY_WINDOW
+
+FULL = "full"
+DEGRADED = "degraded"
+
+
+class LatencyBudget:
+    """Decides how much work a live frame gets, so it is emitted within the latency budget.
+
+    Keeps a moving average of the processing cost of full frames. A frame that arrives `waited`
+    seconds after capture runs in full if waited + full cost fits the budget, is dropped if it
+    is already over budget, and otherwise runs degraded (best effort). While degraded, a
+    full frame is tried every `probe_interval` frames so a one-off slow frame does not keep the
+    pipeline degraded for good.
+    """
+
+    def __init__(self, budget_s, smoothing=LIVE_COST_SMOOTHING, probe_interval=LIVE_PROBE_INTERVAL):
+        self.budget_s = budget_s
+        self.smoothing = smoothing
+        self.probe_interval = probe_interval
+        self._full_cost = 0.0
+        self._degraded_run = 0
+
+    def plan(self, waited):
+        """FULL, DEGRADED or None (drop) for a frame that has already waited `waited` seconds."""
+        if waited + self._full_cost <= self.budget_s or self._degraded_run >= self.probe_interval:
+            return FULL
+        if waited <= self.budget_s:
+            return DEGRADED
+        return None
+
+    def observe(self, level, cost):
+        """Feeds back the processing time of a frame run at `level`."""
+        if level == DEGRADED:
+            self._degraded_run += 1
+            return
+        self._degraded_run = 0
+        previous = self._full_cost
+        self._full_cost = cost if previous == 0.0 else previous + self.smoothing * (cost - previous)
+
+
+class LatencyStats:
+    """End-to-end latency (capture -> emit) of live frames, and what was done to keep it down.
+
+    Counts and the max cover the whole run; only the last `window` latencies are kept for the percentiles.
+    """
+
+    def __init__(self, window=LIVE_LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.emitted = 0
+        self.max_latency = 0.0
+        self.levels = {FULL: 0, DEGRADED: 0}
+        self.dropped = 0
+
+    def record(self, latency, level):
+        self.latencies.append(latency)
+        self.emitted += 1
+        self.max_latency = max(self.max_latency, latency)
+        self.levels[level] += 1
+
+    def as_dict(self, last=None):
+        """Counts over the whole run; latency stats over the `last` emitted frames (default: the window, max over the run)."""
+        latencies = list(self.latencies)[-last:] if last else self.latencies
+        latencies_ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+        max_ms = latencies_ms.max() if last else self.max_latency * 1000
+        return {
+            "emitted": self.emitted,
+            "full": self.levels[FULL],
+            "degraded": self.levels[DEGRADED],
+            "dropped": self.dropped,
+            "latency_ms_p50": round(float(np.percentile(latencies_ms, 50)), 1),
+            "latency_ms_p95": round(float(np.percentile(latencies_ms, 95)), 1),
+            "latency_ms_max": round(float(max_ms), 1),
+        }
+
+    def summary(self, last=None):
+        stats = self.as_dict(last)
+        return (f"[live] {stats['emitted']} frames emitted ({stats['full']} full, {stats['degraded']} degraded), "
+                f"{stats['dropped']} dropped | latency p50 {stats['latency_ms_p50']:.0f} ms, "
+                f"p95 {stats['latency_ms_p95']:.0f} ms, max {stats['latency_ms_max']:.0f} ms")
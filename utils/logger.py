@@ -1,6 +1,5 @@
 import logging
 import sys
-from .config_loader import cfg
 
 def setup_logger(name="TennisSystem"):
     """
@@ -13,10 +12,9 @@ def setup_logger(name="TennisSystem"):
     if logger.hasHandlers():
         return logger
 
-    # Set Level from Config
-    level_str = cfg['system'].get('log_level', 'INFO')
-    level = getattr(logging, level_str.upper())
-    logger.setLevel(level)
+    # Default level until the config is loaded; ConfigLoader then applies system.log_level
+    if logger.level == logging.NOTSET:
+        logger.setLevel(logging.INFO)
 
     # Create Console Handler
     handler = logging.StreamHandler(sys.stdout)
@@ -0,0 +1,292 @@
+"""
+Per-stage profiling: wall/CPU time, throughput and memory for each pipeline stage, plus optional
+per-call spans inside hot functions. Results go to a JSON report and a Chrome trace
+(open it in chrome://tracing or https://ui.perfetto.dev).
+
+    with profiler.stage("detection", frames=len(frames)):
+        ...
+    frames = profiler.iter_stage("decode", iter_video(path))   # time spent producing each item
+
+    @profiler.span()
+    def detect_batch(...): ...
+
+Stages nest. Each one reports inclusive time (wall_s) and self time (self_s, and process CPU
+time cpu_s, both without nested stages), so generator pipelines that pull from each other
+still add up. Spans are timed
+calls inside stages; they appear in the trace and in their own table, and do not count as
+nested stages. Disabled (the default), stage() returns a shared no-op context and spans cost
+one flag check.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from utils.logger import logger
+from constants.pipeline_consts import PROFILER_MAX_TRACE_EVENTS
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows: peak RSS is reported as None
+    resource = None
+
+_MB = 1024 * 1024
+
+
+def _peak_rss_mb():
+    """Process high-water mark RSS (MB), or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak / _MB if os.uname().sysname == "Darwin" else peak / 1024
+
+
+class _NullStage:
+    """What stage() hands out while profiling is off."""
+    frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "frames", "stack", "child_s", "child_cpu_s", "mem_start", "mem_peak", "rss_start",
+                 "cpu_start", "start")
+
+    def __init__(self, profiler, name, frames):
+        self.profiler = profiler
+        self.name = name
+        self.frames = frames    # May also be set inside the with block, once known
+
+    def __enter__(self):
+        self.stack = self.profiler._stack()
+        self.child_s = self.child_cpu_s = 0.0
+        if self.profiler.memory:
+            # Fold the allocation peak seen so far into the parent before resetting it for this stage
+            self.mem_start, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                self.stack[-1].mem_peak = max(self.stack[-1].mem_peak, peak)
+            tracemalloc.reset_peak()
+            self.mem_peak = self.mem_start
+        self.rss_start = _peak_rss_mb()
+        self.stack.append(self)
+        self.cpu_start = time.process_time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        cpu_s = time.process_time() - self.cpu_start
+        self.stack.pop()
+        wall_s = end - self.start
+        if self.stack:
+            self.stack[-1].child_s += wall_s
+            self.stack[-1].child_cpu_s += cpu_s
+
+        alloc_peak = None
+        if self.profiler.memory:
+            self.mem_peak = max(self.mem_peak, tracemalloc.get_traced_memory()[1])
+            alloc_peak = self.mem_peak - self.mem_start
+            if self.stack:
+                self.stack[-1].mem_peak = max(self.stack[-1].mem_peak, self.mem_peak)
+            tracemalloc.reset_peak()
+        rss_end = _peak_rss_mb()
+        rss_growth = rss_end - self.rss_start if rss_end is not None else None
+
+        self.profiler._record_stage(self, end, wall_s, cpu_s, alloc_peak, rss_growth)
+        return False
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.profiler._record_span(self.name, self.start, end)
+        return False
+
+
+class Profiler:
+    """Collects stage and span timings. Use the module-level `profiler` instance."""
+
+    def __init__(self):
+        self.enabled = False
+        self.spans = False
+        self.memory = False
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._origin = time.perf_counter()
+        self._cpu_origin = time.process_time()
+        self._stages = {}
+        self._span_stats = {}
+        self._events = []
+        self._dropped_events = 0
+
+    def enable(self, spans=False, memory=False):
+        """Starts a fresh profile. memory=True tracks Python allocations (tracemalloc), which slows allocation-heavy code."""
+        self._reset()
+        self.enabled = True
+        self.spans = spans
+        self.memory = memory
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = self.spans = False
+        if self.memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.memory = False
+
+    # --- Instrumentation ---
+    def stage(self, name, frames=0):
+        """Context manager timing one pipeline stage. frames feeds the stage's fps."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, frames)
+
+    def iter_stage(self, name, iterable):
+        """Wraps an iterable so the time spent producing each item counts as `name` (one frame per item)."""
+        if not self.enabled:
+            return iterable
+        return self._iter_stage(name, iterable)
+
+    def _iter_stage(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name, frames=1) as stage:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    stage.frames = 0
+                    return
+            yield item
+
+    def span(self, name=None):
+        """Decorator timing every call of a hot function (only while spans are enabled)."""
+        def decorate(fn):
+            label = name or fn.__qualname__
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.spans:
+                    return fn(*args, **kwargs)
+                with _Span(self, label):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _record_stage(self, stage, end, wall_s, cpu_s, alloc_peak, rss_growth):
+        with self._lock:
+            stats = self._stages.setdefault(stage.name, {
+                "calls": 0, "frames": 0, "wall_s": 0.0, "self_s": 0.0, "cpu_s": 0.0,
+                "alloc_peak_mb": None, "rss_growth_mb": 0.0 if rss_growth is not None else None,
+            })
+            stats["calls"] += 1
+            stats["frames"] += stage.frames
+            stats["wall_s"] += wall_s
+            stats["self_s"] += wall_s - stage.child_s
+            stats["cpu_s"] += cpu_s - stage.child_cpu_s
+            if alloc_peak is not None:
+                stats["alloc_peak_mb"] = max(stats["alloc_peak_mb"] or 0.0, alloc_peak / _MB)
+            if rss_growth is not None:
+                stats["rss_growth_mb"] += rss_growth
+            self._add_event(stage.name, "stage", stage.start, end, {"frames": stage.frames} if stage.frames else None)
+
+    def _record_span(self, name, start, end):
+        with self._lock:
+            stats = self._span_stats.setdefault(name, {"calls": 0, "total_s": 0.0, "max_s": 0.0})
+            stats["calls"] += 1
+            stats["total_s"] += end - start
+            stats["max_s"] = max(stats["max_s"], end - start)
+            self._add_event(name, "span", start, end, None)
+
+    def _add_event(self, name, category, start, end, args):
+        if len(self._events) >= PROFILER_MAX_TRACE_EVENTS:
+            self._dropped_events += 1
+            return
+        event = {"name": name, "cat": category, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                 "ts": round((start - self._origin) * 1e6, 1), "dur": round((end - start) * 1e6, 1)}
+        if args:
+            event["args"] = args
+        self._events.append(event)
+
+    # --- Output ---
+    def report(self):
+        """The profile so far as a JSON-serializable dict. Stage fps is frames per second of self time."""
+        with self._lock:
+            stages = {}
+            for name, stats in self._stages.items():
+                stages[name] = {key: round(value, 4) if isinstance(value, float) else value for key, value in stats.items()}
+                stages[name]["fps"] = round(stats["frames"] / stats["self_s"], 2) if stats["frames"] and stats["self_s"] > 0 else None
+            spans = {name: {"calls": stats["calls"], "total_s": round(stats["total_s"], 4),
+                            "mean_ms": round(stats["total_s"] / stats["calls"] * 1000, 4),
+                            "max_ms": round(stats["max_s"] * 1000, 4)}
+                     for name, stats in self._span_stats.items()}
+            return {
+                "wall_s": round(time.perf_counter() - self._origin, 4),
+                "cpu_s": round(time.process_time() - self._cpu_origin, 4),
+                "peak_rss_mb": _peak_rss_mb(),
+                "stages": stages,
+                "spans": spans,
+                "trace_events": len(self._events),
+                "trace_events_dropped": self._dropped_events,
+            }
+
+    def save(self, report_path=None, trace_path=None):
+        """Writes the JSON report and/or the Chrome trace, and logs the stage table."""
+        report = self.report()
+        if report_path:
+            os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+            with open(report_path, "w") as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"[profile] Report written to {report_path}")
+        if trace_path:
+            os.makedirs(os.path.dirname(trace_path) or ".", exist_ok=True)
+            with self._lock:
+                events = list(self._events)
+            with open(trace_path, "w") as f:
+                json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+            logger.info(f"[profile] Chrome trace written to {trace_path} ({len(events)} events)")
+        for line in self.summary_lines(report):
+            logger.info(line)
+        return report
+
+    @staticmethod
+    def summary_lines(report):
+        lines = [f"[profile] {report['wall_s']:.2f}s wall, {report['cpu_s']:.2f}s CPU, peak RSS {report['peak_rss_mb'] or 0:.0f} MB"]
+        for name, stats in sorted(report["stages"].items(), key=lambda item: -item[1]["self_s"]):
+            fps = f", {stats['fps']:.1f} fps" if stats["fps"] else ""
+            lines.append(f"[profile]   {name}: {stats['self_s']:.3f}s self / {stats['wall_s']:.3f}s total, "
+                         f"{stats['cpu_s']:.3f}s CPU, {stats['calls']} calls{fps}")
+        return lines
+
+
+# Expose a single global instance
+profiler = Profiler()
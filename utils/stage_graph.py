@@ -0,0 +1,162 @@
+"""
+A DAG of named stages with persisted outputs and incremental recomputation.
+
+    graph = StageGraph(stub_manager)
+    graph.add("decode", decode, params=lambda: {"video": fingerprint}, persist=False)
+    graph.add("court", detect_court, inputs=("decode",), params=court_params)
+    graph.run("court")
+
+Each stage declares its inputs (earlier stages) and its params (a callable returning
+JSON-serializable values, read at run time). A stage's key hashes its name, version, params
+and the keys of its inputs, so a change anywhere upstream changes every key below it, and
+unchanged stages keep their keys. Persisted stages store their output in the StubManager
+cache under that key; a stage with an established cache entry can supply its own key
+instead.
+
+run(target) works backwards from the target. A persisted stage whose key is cached is loaded
+and its inputs are never touched. Otherwise the stage runs, and reads only the inputs it
+actually asks for, through a lazy mapping. Frames and other outputs too large to keep
+(persist=False) are recomputed whenever a stage that runs needs them.
+"""
+
+import os
+from utils.logger import logger
+from utils.profiler import profiler
+from utils.stub_manager import StubManager
+
+CACHED, RAN = "cached", "ran"
+
+
+class Stage:
+    __slots__ = ("name", "fn", "inputs", "params", "version", "persist", "suffix", "cache_name", "key", "valid")
+
+    def __init__(self, name, fn, inputs, params, version, persist, suffix, cache_name, key, valid):
+        self.name = name
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.params = params
+        self.version = version
+        self.persist = persist
+        self.suffix = suffix
+        self.cache_name = cache_name or name
+        self.key = key
+        self.valid = valid
+
+
+class StageInputs:
+    """What a running stage receives: its declared inputs, each computed (or loaded) on first access."""
+
+    def __init__(self, graph, stage):
+        self._graph = graph
+        self._stage = stage
+
+    def __getitem__(self, name):
+        if name not in self._stage.inputs:
+            raise KeyError(f"Stage '{self._stage.name}' did not declare input '{name}'")
+        return self._graph._output(name)
+
+
+class StageGraph:
+    def __init__(self, stub_manager):
+        self.stub_manager = stub_manager
+        self.stages = {}
+        self._keys = {}
+        self._outputs = {}
+        self.status = {}
+
+    def add(self, name, fn, inputs=(), params=None, version=1, persist=True, suffix=".pkl", cache_name=None, key=None,
+            valid=None):
+        """Declares a stage. fn(inputs) computes its output from a StageInputs mapping.
+
+        params: callable returning the settings the output depends on. key: callable returning a
+        ready-made cache key instead (it must cover the inputs itself). valid: callable deciding
+        whether a loaded output is still usable (e.g. a file it points to still exists).
+        Inputs must be declared before the stages that read them, so the graph cannot have cycles.
+        """
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already declared")
+        unknown = [dep for dep in inputs if dep not in self.stages]
+        if unknown:
+            raise ValueError(f"Stage '{name}' reads undeclared stages {unknown}")
+        self.stages[name] = Stage(name, fn, inputs, params, version, persist, suffix, cache_name, key, valid)
+
+    def key(self, name):
+        """Content address of a stage's output: its name, version, params and (recursively) its inputs' keys."""
+        if name not in self._keys:
+            stage = self.stages[name]
+            if stage.key is not None:
+                self._keys[name] = stage.key()
+            else:
+                self._keys[name] = StubManager.make_key(
+                    name,
+                    version=stage.version,
+                    params=stage.params() if stage.params is not None else None,
+                    inputs={dep: self.key(dep) for dep in stage.inputs},
+                )
+        return self._keys[name]
+
+    def plan(self, target):
+        """What run(target) would do, without running anything: {stage: 'cached' | 'run'} for every stage it may reach.
+
+        A stage that runs may not actually read every input it declares, so 'run' is an upper bound.
+        """
+        self._keys = {}
+        plan = {}
+
+        def visit(name):
+            if name in plan:
+                return
+            if self._is_cached(self.stages[name]):
+                plan[name] = CACHED
+                return
+            plan[name] = "run"
+            for dep in self.stages[name].inputs:
+                visit(dep)
+
+        visit(target)
+        return {name: plan[name] for name in self.stages if name in plan}
+
+    def _is_cached(self, stage):
+        """Whether run() would load the stage: its entry exists and, if the stage checks loaded outputs, passes."""
+        if not stage.persist:
+            return False
+        key = self.key(stage.name)
+        if stage.valid is None:
+            return os.path.exists(self.stub_manager.path_for(stage.cache_name, key, stage.suffix))
+        output = self.stub_manager.get(stage.cache_name, key, suffix=stage.suffix)
+        return output is not None and stage.valid(output)
+
+    def run(self, target):
+        """Produces the target's output, loading cached stages and recomputing only the rest."""
+        self._keys = {}
+        self._outputs = {}
+        self.status = {}
+        try:
+            output = self._output(target)
+        finally:
+            # Outputs (frames above all) are not kept past the run
+            self._outputs = {}
+        logger.info("[stages] " + " | ".join(f"{name}: {self.status.get(name, 'skipped')}" for name in self.stages))
+        return output
+
+    def _output(self, name):
+        if name in self._outputs:
+            return self._outputs[name]
+        stage = self.stages[name]
+        key = self.key(name)
+
+        if stage.persist:
+            with profiler.stage("cache"):
+                output = self.stub_manager.get(stage.cache_name, key, suffix=stage.suffix)
+            if output is not None and (stage.valid is None or stage.valid(output)):
+                self._outputs[name] = output
+                self.status[name] = CACHED
+                return output
+
+        output = stage.fn(StageInputs(self, stage))
+        if stage.persist:
+            with profiler.stage("cache"):
+                self.stub_manager.put(stage.cache_name, key, output, suffix=stage.suffix)
+        self._outputs[name] = output
+        self.status[name] = RAN
+        return output
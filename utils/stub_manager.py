@@ -1,9 +1,32 @@
-import pickle
+import hashlib
+import json
 import os
+import pickle
+import tempfile
+from utils.logger import logger
+from utils.track_file import TRACK_FILE_SUFFIX, load_tracks, save_tracks
 
 
 class StubManager:
-    """Manages reading and writing of stub (cached) data to avoid re-computation."""
+    """Manages reading and writing of stub (cached) data to avoid re-computation.
+
+    The static load/save pair handles a single stub file. An instance manages a
+    content-addressed cache directory: each entry is keyed by a hash of everything
+    that produced it (input video, model weights, relevant config), entries are
+    evicted least-recently-used once the directory grows past max_bytes, and every
+    write is atomic (temp file + rename), so an interrupted run never leaves a
+    truncated stub behind. Entries are pickles, or binary track files (suffix=".tracks")
+    which load as copy-on-write memory maps.
+    """
+
+    # Read size when hashing files
+    FINGERPRINT_CHUNK = 1 << 20
+    _fingerprints = {}
+
+    def __init__(self, cache_dir, max_bytes=None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
 
     @staticmethod
     def load(stub_path):
@@ -11,15 +34,104 @@ class StubManager:
         if stub_path is not None and os.path.exists(stub_path):
             with open(stub_path, 'rb') as f:
                 data = pickle.load(f)
-            print(f"[STUB] Loaded cached data from {stub_path}")
+            logger.info(f"[STUB] Loaded cached data from {stub_path}")
             return data
         return None
 
     @staticmethod
     def save(data, stub_path):
-        """Save data to a stub file for future reuse."""
+        """Save data to a stub file for future reuse (atomically)."""
         if stub_path is not None:
-            os.makedirs(os.path.dirname(stub_path), exist_ok=True)
-            with open(stub_path, 'wb') as f:
-                pickle.dump(data, f)
-            print(f"[STUB] Saved cached data to {stub_path}")
+            directory = os.path.dirname(stub_path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, stub_path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            logger.info(f"[STUB] Saved cached data to {stub_path}")
+
+    # --- Content addressing ---
+    @classmethod
+    def fingerprint(cls, path):
+        """Content hash (SHA-256) of the whole file.
+
+        Sampling a few chunks would be cheaper, but two videos of the same size that differ only
+        between the samples (re-encodes, edits padded back to length) would then share a key and
+        silently share cached tracks. Hashing reads the file once (~1 GB/s) per (path, size, mtime)
+        and process; later calls are memoized. Missing files get a stable marker so a key can still
+        be built (e.g. stub-only runs).
+        """
+        if path is None or not os.path.exists(path):
+            return f"missing:{path}"
+        stat = os.stat(path)
+        memo_key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if memo_key not in cls._fingerprints:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(cls.FINGERPRINT_CHUNK), b""):
+                    digest.update(chunk)
+            cls._fingerprints[memo_key] = digest.hexdigest()
+        return cls._fingerprints[memo_key]
+
+    @staticmethod
+    def make_key(stage, **inputs):
+        """Hash of a stage name and its (JSON-serializable) inputs."""
+        payload = json.dumps({"stage": stage, **inputs}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path_for(self, stage, key, suffix=".pkl"):
+        return os.path.join(self.cache_dir, f"{stage}-{key[:24]}{suffix}")
+
+    # --- Cache entries ---
+    def get(self, stage, key, suffix=".pkl"):
+        """Returns the cached entry, or None on a miss. A hit refreshes the entry's LRU position."""
+        stub_path = self.path_for(stage, key, suffix)
+        if not os.path.exists(stub_path):
+            return None
+        try:
+            if suffix == TRACK_FILE_SUFFIX:
+                data = load_tracks(stub_path)
+                logger.info(f"[STUB] Memory-mapped cached tracks from {stub_path}")
+            else:
+                data = self.load(stub_path)
+        except (EOFError, ValueError, pickle.UnpicklingError) as e:
+            logger.warning(f"[STUB] Discarding unreadable cache entry {stub_path}: {e}")
+            os.unlink(stub_path)
+            return None
+        os.utime(stub_path)
+        return data
+
+    def put(self, stage, key, data, suffix=".pkl"):
+        stub_path = self.path_for(stage, key, suffix)
+        if suffix == TRACK_FILE_SUFFIX:
+            save_tracks(data, stub_path)
+            logger.info(f"[STUB] Saved cached tracks to {stub_path}")
+        else:
+            self.save(data, stub_path)
+        self.evict(keep=stub_path)
+        return stub_path
+
+    def evict(self, keep=None):
+        """Deletes least-recently-used entries until the cache fits in max_bytes."""
+        if self.max_bytes is None:
+            return
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith((".pkl", TRACK_FILE_SUFFIX)):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            os.unlink(path)
+            total -= size
+            logger.info(f"[STUB] Evicted {path} from cache")
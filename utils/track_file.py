@@ -0,0 +1,205 @@
+"""
+Binary track file (.tracks), a pickle-free replacement for the track stubs.
+
+Layout (little-endian):
+    8 bytes   magic b"TNSTRK\\0\\0"
+    4 bytes   uint32 format version
+    4 bytes   uint32 header length
+    N bytes   JSON header: {"objects": {name: {"num_frames", "num_rows", "arrays": {key: {dtype, shape, offset}}}}}
+    ...       raw C-order arrays, each starting on a 64-byte boundary
+
+Per object class the arrays are the TrackStore columns: "offsets" (num_frames + 1 row offsets),
+"track_id", and "<field>" / "<field>.valid" for every field that has at least one valid row.
+Rows are sorted by frame, so a frame range maps to one contiguous row range of every array.
+"""
+
+import argparse
+import json
+import os
+import pickle
+import struct
+import tempfile
+import numpy as np
+from utils.logger import logger
+from utils.track_store import TrackStore, to_columnar
+
+MAGIC = b"TNSTRK\0\0"
+FORMAT_VERSION = 1
+TRACK_FILE_SUFFIX = ".tracks"
+
+_PREAMBLE = struct.Struct("<8sII")
+_ALIGN = 64
+# Only plain numeric dtypes are ever read back, so a file can't smuggle in objects
+_DTYPES = {"<i8", "<f8", "|b1"}
+
+
+def _align(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def save_tracks(tracks, path):
+    """Writes a tracks dict (either layout) to a binary track file, atomically."""
+    tracks = to_columnar(tracks)
+
+    # 1. Collect arrays and lay them out after the header
+    objects, blobs = {}, []
+    for obj, store in tracks.items():
+        arrays = {"offsets": store.offsets, "track_id": store.track_id}
+        for name in TrackStore.FIELDS:
+            if store.valid[name].any():
+                arrays[name] = store.columns[name]
+                arrays[f"{name}.valid"] = store.valid[name]
+        entries = {}
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+            entries[key] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": None}
+            blobs.append((entries[key], array))
+        objects[obj] = {"num_frames": store.num_frames, "num_rows": store.num_rows, "arrays": entries}
+
+    # 2. Offsets depend on the header length, which depends on the offsets' digits: reserve room and iterate
+    data_start = 0
+    while True:
+        offset = data_start
+        for entry, array in blobs:
+            offset = _align(offset)
+            entry["offset"] = offset
+            offset += array.nbytes
+        header = json.dumps({"objects": objects}).encode()
+        needed = _align(_PREAMBLE.size + len(header))
+        if needed <= data_start:
+            break
+        data_start = needed
+
+    # 3. Write to a temp file and rename, so readers never see a partial file
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+            f.write(header)
+            for entry, array in blobs:
+                f.seek(entry["offset"])
+                f.write(array.tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def read_header(path):
+    """Returns the parsed header of a track file. Raises ValueError on anything that isn't one."""
+    with open(path, "rb") as f:
+        preamble = f.read(_PREAMBLE.size)
+        if len(preamble) < _PREAMBLE.size:
+            raise ValueError(f"{path} is not a track file (truncated)")
+        magic, version, header_len = _PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a track file")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"{path} uses track format v{version}; this build reads up to v{FORMAT_VERSION}")
+        header = json.loads(f.read(header_len))
+    header["version"] = version
+    return header
+
+
+def load_tracks(path, start=0, stop=None, mmap=True):
+    """Loads a track file as a columnar tracks dict, optionally only frames [start, stop).
+
+    With mmap=True the columns are copy-on-write memory maps: only the pages of the requested
+    frames are ever read, and stages can still write to them without touching the file.
+    """
+    header = read_header(path)
+    file_size = os.path.getsize(path)
+
+    tracks = {}
+    for obj, meta in header["objects"].items():
+        first, last, _ = slice(start, stop).indices(meta["num_frames"])
+        last = max(first, last)
+
+        offsets = _read_array(path, file_size, obj, meta, "offsets", first, last + 1, mmap=False)
+        row_start, row_stop = int(offsets[0]), int(offsets[-1])
+
+        columns, valid = {}, {}
+        for name in TrackStore.FIELDS:
+            if name in meta["arrays"]:
+                columns[name] = _read_array(path, file_size, obj, meta, name, row_start, row_stop, mmap)
+                valid[name] = _read_array(path, file_size, obj, meta, f"{name}.valid", row_start, row_stop, mmap)
+        track_id = _read_array(path, file_size, obj, meta, "track_id", row_start, row_stop, mmap=False)
+        tracks[obj] = TrackStore.from_columns(last - first, offsets - row_start, track_id, columns, valid)
+    return tracks
+
+
+def _read_array(path, file_size, obj, meta, key, row_start, row_stop, mmap):
+    """Reads rows [row_start, row_stop) of one stored array, validating dtype and bounds."""
+    entry = meta["arrays"][key]
+    if entry["dtype"] not in _DTYPES:
+        raise ValueError(f"{path}: unsupported dtype {entry['dtype']} for {obj}/{key}")
+    dtype = np.dtype(entry["dtype"])
+    shape = tuple(entry["shape"])
+    row_items = int(np.prod(shape[1:], dtype=np.int64))
+    if entry["offset"] + shape[0] * row_items * dtype.itemsize > file_size:
+        raise ValueError(f"{path} is truncated ({obj}/{key})")
+
+    count = row_stop - row_start
+    offset = entry["offset"] + row_start * row_items * dtype.itemsize
+    if mmap and count > 0:
+        return np.memmap(path, dtype=dtype, mode="c", offset=offset, shape=(count,) + shape[1:])
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return np.fromfile(f, dtype=dtype, count=count * row_items).reshape((count,) + shape[1:])
+
+
+def is_track_file(path):
+    try:
+        read_header(path)
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+# --- Pickle stub conversion ---
+def tracks_from_legacy_stubs(old_players, old_ball):
+    """Wraps the legacy per-frame {track_id: bbox} stubs into the tracks layout (ball not yet interpolated)."""
+    return {
+        "players": [{track_id: {"bbox": bbox} for track_id, bbox in frame_dict.items()} for frame_dict in old_players],
+        "ball": [{ball_id: {"bbox": bbox} for ball_id, bbox in frame_dict.items()} for frame_dict in old_ball],
+    }
+
+
+def convert_pickle_stub(stub_path, output_path, ball_stub_path=None, interpolate_ball=None):
+    """Converts a pickle stub to a track file.
+
+    stub_path is either a unified {"players": [...], "ball": [...]} stub, or (with ball_stub_path)
+    the legacy player stub; legacy ball positions are passed through interpolate_ball if given.
+    Only convert stubs you trust: reading them still means unpickling.
+    """
+    with open(stub_path, "rb") as f:
+        tracks = pickle.load(f)
+    if ball_stub_path is not None:
+        with open(ball_stub_path, "rb") as f:
+            tracks = tracks_from_legacy_stubs(tracks, pickle.load(f))
+        if interpolate_ball is not None:
+            tracks["ball"] = interpolate_ball(tracks["ball"])
+    save_tracks(tracks, output_path)
+    logger.info(f"Converted {stub_path} -> {output_path} ({os.path.getsize(output_path)} bytes)")
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pickle track stubs to the binary track format.")
+    parser.add_argument("stub", help="Unified tracks stub, or the legacy player stub when --ball is given")
+    parser.add_argument("output", help=f"Output track file (*{TRACK_FILE_SUFFIX})")
+    parser.add_argument("--ball", help="Legacy ball stub; its positions are interpolated like the pipeline's migration")
+    args = parser.parse_args()
+
+    interpolate_ball = None
+    if args.ball:
+        from core.trackers import Tracker
+        from utils.config_loader import cfg
+        interpolate_ball = Tracker(cfg.get('ball_tracking', {}).get('filter', 'interpolate')).interpolate_ball_positions
+    convert_pickle_stub(args.stub, args.output, args.ball, interpolate_ball)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import numpy as np
+
+
+class TrackStore:
+    """Columnar (struct-of-arrays) storage for one object class of a match.
+
+    One row per (frame, track) observation, rows sorted by frame. Every field is a
+    NumPy column with a validity mask, so stages can read and write whole matches
+    with vectorized operations instead of walking a dict per object per frame.
+
+    The store also behaves as a read-only sequence of the legacy per-frame dicts
+    (`store[frame_num] -> {track_id: {"bbox": [...], ...}}`), so existing readers
+    keep working. Use to_frames()/from_frames() for a mutable round trip.
+    """
+
+    # Field name -> number of components (1 for scalars)
+    FIELDS = {
+        "bbox": 4,
+        "position": 2,
+        "mini_court_position": 2,
+        "speed": 1,
+        "distance": 1,
+    }
+
+    def __init__(self, num_frames, frame, track_id, bbox):
+        frame = np.asarray(frame, dtype=np.int64).reshape(-1)
+        order = np.argsort(frame, kind="stable")
+
+        self.num_frames = int(num_frames)
+        self.frame = frame[order]
+        self.track_id = np.asarray(track_id, dtype=np.int64).reshape(-1)[order]
+        # offsets[f]:offsets[f+1] are the rows of frame f
+        self.offsets = np.searchsorted(self.frame, np.arange(self.num_frames + 1))
+
+        n = len(self.frame)
+        self.columns = {}
+        self.valid = {}
+        for name, dim in self.FIELDS.items():
+            shape = (n,) if dim == 1 else (n, dim)
+            self.columns[name] = np.full(shape, np.nan, dtype=np.float64)
+            self.valid[name] = np.zeros(n, dtype=bool)
+        self.set("bbox", np.asarray(bbox, dtype=np.float64).reshape(n, 4)[order])
+
+    # --- Construction & conversion ---
+    @classmethod
+    def empty(cls, num_frames):
+        return cls(num_frames, [], [], np.empty((0, 4)))
+
+    @classmethod
+    def from_columns(cls, num_frames, offsets, track_id, columns, valid):
+        """Wraps existing arrays (e.g. memory maps) without copying. Missing fields start empty."""
+        store = cls.__new__(cls)
+        store.num_frames = int(num_frames)
+        store.offsets = np.asarray(offsets, dtype=np.int64)
+        store.track_id = track_id
+        store.frame = np.repeat(np.arange(store.num_frames), np.diff(store.offsets))
+        n = len(store.frame)
+        store.columns = {}
+        store.valid = {}
+        for name, dim in cls.FIELDS.items():
+            if name in columns:
+                store.columns[name] = columns[name]
+                store.valid[name] = valid[name]
+            else:
+                store.columns[name] = np.full((n,) if dim == 1 else (n, dim), np.nan, dtype=np.float64)
+                store.valid[name] = np.zeros(n, dtype=bool)
+        return store
+
+    @classmethod
+    def from_frames(cls, frames):
+        """Builds a store from the legacy list of {track_id: {field: value}} dicts."""
+        frame, track_id, rows = [], [], []
+        for frame_num, frame_dict in enumerate(frames):
+            for tid, info in frame_dict.items():
+                frame.append(frame_num)
+                track_id.append(tid)
+                rows.append(info)
+
+        store = cls(len(frames), frame, track_id, [info["bbox"] for info in rows] or np.empty((0, 4)))
+        for name in cls.FIELDS:
+            if name == "bbox":
+                continue
+            present = np.array([name in info and info[name] is not None for info in rows], dtype=bool)
+            if present.any():
+                values = [info[name] for info, ok in zip(rows, present) if ok]
+                store.set(name, np.asarray(values, dtype=np.float64), rows=present)
+        return store
+
+    def to_frames(self):
+        """Returns a mutable legacy list of per-frame dicts (a copy)."""
+        return [self.frame_dict(frame_num) for frame_num in range(self.num_frames)]
+
+    # --- Legacy sequence view ---
+    def __len__(self):
+        return self.num_frames
+
+    def __iter__(self):
+        for frame_num in range(self.num_frames):
+            yield self.frame_dict(frame_num)
+
+    def __getitem__(self, frame_num):
+        if isinstance(frame_num, slice):
+            return [self.frame_dict(i) for i in range(*frame_num.indices(self.num_frames))]
+        if frame_num < 0:
+            frame_num += self.num_frames
+        if not 0 <= frame_num < self.num_frames:
+            raise IndexError("frame index out of range")
+        return self.frame_dict(frame_num)
+
+    def frame_dict(self, frame_num):
+        frame_dict = {}
+        for row in range(self.offsets[frame_num], self.offsets[frame_num + 1]):
+            info = {}
+            for name, dim in self.FIELDS.items():
+                if not self.valid[name][row]:
+                    continue
+                value = self.columns[name][row]
+                if name == "bbox":
+                    info[name] = value.tolist()
+                elif dim == 1:
+                    info[name] = float(value)
+                else:
+                    info[name] = tuple(value.tolist())
+            frame_dict[int(self.track_id[row])] = info
+        return frame_dict
+
+    # --- Columnar access ---
+    def __repr__(self):
+        return f"TrackStore(frames={self.num_frames}, rows={len(self.frame)})"
+
+    @property
+    def num_rows(self):
+        return len(self.frame)
+
+    @property
+    def nbytes(self):
+        arrays = [self.frame, self.track_id, self.offsets, *self.columns.values(), *self.valid.values()]
+        return sum(a.nbytes for a in arrays)
+
+    def rows(self, frame_num):
+        """Row slice for one frame."""
+        return slice(self.offsets[frame_num], self.offsets[frame_num + 1])
+
+    def get(self, name):
+        return self.columns[name]
+
+    def set(self, name, values, rows=None):
+        """Writes a field for all rows (or a boolean mask / index array of rows) and marks them valid."""
+        if rows is None:
+            rows = slice(None)
+        self.columns[name][rows] = values
+        self.valid[name][rows] = True
+
+    def invalidate(self, name, rows=None):
+        if rows is None:
+            rows = slice(None)
+        self.columns[name][rows] = np.nan
+        self.valid[name][rows] = False
+
+    def track_ids(self):
+        """Unique track ids in order of first appearance."""
+        ids, first = np.unique(self.track_id, return_index=True)
+        return ids[np.argsort(first, kind="stable")]
+
+    def select(self, mask):
+        """Returns a new store containing only the rows where mask is True."""
+        mask = np.asarray(mask, dtype=bool)
+        store = TrackStore(self.num_frames, self.frame[mask], self.track_id[mask], self.columns["bbox"][mask])
+        for name in self.FIELDS:
+            store.columns[name] = self.columns[name][mask].copy()
+            store.valid[name] = self.valid[name][mask].copy()
+        return store
+
+    def dense(self, name, track_ids=None):
+        """Scatters a field into a (num_frames, num_tracks[, dim]) array.
+
+        Returns (values, present) where missing or invalid entries are NaN / False.
+        """
+        if track_ids is None:
+            track_ids = self.track_ids()
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        column = self.columns[name]
+
+        values = np.full((self.num_frames, len(track_ids)) + column.shape[1:], np.nan)
+        present = np.zeros((self.num_frames, len(track_ids)), dtype=bool)
+        col_index, in_ids = self.track_columns(track_ids)
+        rows = in_ids & self.valid[name]
+        values[self.frame[rows], col_index[rows]] = column[rows]
+        present[self.frame[rows], col_index[rows]] = True
+        return values, present
+
+    def set_dense(self, name, values, track_ids, present=None):
+        """Inverse of dense(): writes (num_frames, num_tracks[, dim]) values back into the matching rows."""
+        track_ids = np.asarray(track_ids, dtype=np.int64)
+        col_index, in_ids = self.track_columns(track_ids)
+        rows = np.flatnonzero(in_ids)
+        if present is not None:
+            rows = rows[present[self.frame[rows], col_index[rows]]]
+        self.set(name, values[self.frame[rows], col_index[rows]], rows=rows)
+
+    def track_columns(self, track_ids):
+        """Maps each row to its column in track_ids (and whether it is there at all)."""
+        if len(track_ids) == 0:
+            return np.zeros(self.num_rows, dtype=np.int64), np.zeros(self.num_rows, dtype=bool)
+        order = np.argsort(track_ids)
+        pos = np.searchsorted(track_ids, self.track_id, sorter=order)
+        pos = np.clip(pos, 0, len(track_ids) - 1)
+        col_index = order[pos]
+        return col_index, track_ids[col_index] == self.track_id
+
+
+def is_columnar(tracks):
+    """True if a tracks dict holds TrackStores rather than lists of per-frame dicts."""
+    return isinstance(tracks.get("players"), TrackStore)
+
+
+def to_columnar(tracks):
+    """Converts a legacy tracks dict ({"players": [...], "ball": [...]}) to TrackStores."""
+    if is_columnar(tracks):
+        return tracks
+    return {obj: TrackStore.from_frames(frames) for obj, frames in tracks.items()}
+
+
+def to_frames(tracks):
+    """Converts a columnar tracks dict back to the legacy list-of-dicts layout."""
+    if not is_columnar(tracks):
+        return tracks
+    return {obj: store.to_frames() for obj, store in tracks.items()}
@@ -0,0 +1,268 @@
+import queue
+import threading
+import time
+import cv2
+import numpy as np
+from utils.logger import logger
+from utils.profiler import profiler
+from constants.pipeline_consts import FRAME_QUEUE_SIZE
+
+# Marks the end of a frame queue
+_END = object()
+
+
+class QueueStats:
+    """Occupancy and stall-time counters for one bounded frame queue.
+
+    producer_stall_s: time the producer waited on a full queue (the consumer is the bottleneck).
+    consumer_stall_s: time the consumer waited on an empty queue (the producer is the bottleneck).
+    """
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.frames = 0
+        self.producer_stall_s = 0.0
+        self.consumer_stall_s = 0.0
+        self._occupancy_sum = 0
+        self.max_occupancy = 0
+
+    def sample(self, occupancy):
+        self._occupancy_sum += occupancy
+        self.max_occupancy = max(self.max_occupancy, occupancy)
+
+    @property
+    def mean_occupancy(self):
+        return self._occupancy_sum / self.frames if self.frames else 0.0
+
+    def as_dict(self):
+        return {
+            "name": self.name,
+            "frames": self.frames,
+            "queue_size": self.maxsize,
+            "mean_occupancy": round(self.mean_occupancy, 2),
+            "max_occupancy": self.max_occupancy,
+            "producer_stall_s": round(self.producer_stall_s, 4),
+            "consumer_stall_s": round(self.consumer_stall_s, 4),
+        }
+
+    def summary(self):
+        return (f"[{self.name}] {self.frames} frames | queue {self.mean_occupancy:.1f}/{self.maxsize} avg, "
+                f"{self.max_occupancy} max | producer stalled {self.producer_stall_s:.2f}s, "
+                f"consumer stalled {self.consumer_stall_s:.2f}s")
+
+
+def _timed_put(q, item, stats):
+    start = time.perf_counter()
+    q.put(item)
+    stats.producer_stall_s += time.perf_counter() - start
+
+
+def _timed_get(q, stats):
+    start = time.perf_counter()
+    item = q.get()
+    stats.consumer_stall_s += time.perf_counter() - start
+    return item
+
+
+class FrameSource:
+    """Decodes a video on a background thread into a bounded queue. Iterate it to get frames in order."""
+
+    def __init__(self, video_path, queue_size=FRAME_QUEUE_SIZE):
+        self.video_path = video_path
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = QueueStats("decode", queue_size)
+        self._error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._decode_loop, name="FrameSource", daemon=True)
+        self._thread.start()
+
+    def _decode_loop(self):
+        cap = cv2.VideoCapture(self.video_path)
+        try:
+            if not cap.isOpened():
+                logger.error(f"Failed to open video file: {self.video_path}")
+                return
+            while not self._stop.is_set():
+                with profiler.stage("decode") as stage:
+                    ret, frame = cap.read()
+                    stage.frames = int(ret)
+                if not ret:
+                    break
+                _timed_put(self.queue, frame, self.stats)
+        except Exception as e:
+            self._error = e
+        finally:
+            cap.release()
+            self.queue.put(_END)
+
+    def __iter__(self):
+        logger.info(f"Opening video file (threaded decode): {self.video_path}")
+        while True:
+            frame = _timed_get(self.queue, self.stats)
+            if frame is _END:
+                break
+            self.stats.frames += 1
+            self.stats.sample(self.queue.qsize())
+            yield frame
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        logger.info(f"Successfully read {self.stats.frames} frames from {self.video_path}")
+
+    def close(self):
+        """Stops decoding early (e.g. if the consumer bails out) and drains the queue."""
+        self._stop.set()
+        while self._thread.is_alive():
+            try:
+                self.queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._thread.join()
+
+
+class FrameSink:
+    """Encodes frames on a background thread. write() only blocks when the bounded queue is full."""
+
+    def __init__(self, output_video_path, fps=24.0, queue_size=FRAME_QUEUE_SIZE):
+        self.output_video_path = output_video_path
+        self.fps = fps
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = QueueStats("encode", queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._encode_loop, name="FrameSink", daemon=True)
+        self._thread.start()
+
+    def _encode_loop(self):
+        out = None
+        try:
+            while True:
+                frame = _timed_get(self.queue, self.stats)
+                if frame is _END:
+                    break
+                if out is None:
+                    logger.info(f"Initializing video writer for: {self.output_video_path} at {self.fps} FPS")
+                    height, width, _ = frame.shape
+                    out = cv2.VideoWriter(self.output_video_path, cv2.VideoWriter_fourcc(*'MJPG'), self.fps, (width, height))
+                with profiler.stage("encode", frames=1):
+                    out.write(frame)
+        except Exception as e:
+            self._error = e
+            # Keep draining so the producer never blocks forever on a dead writer
+            while self.queue.get() is not _END:
+                pass
+        finally:
+            if out is not None:
+                out.release()
+
+    def write(self, frame: np.ndarray):
+        if self._error is not None:
+            raise self._error
+        self.stats.frames += 1
+        self.stats.sample(self.queue.qsize())
+        _timed_put(self.queue, frame, self.stats)
+
+    def close(self):
+        """Flushes the queue, finalizes the file and re-raises any encoder error."""
+        self.queue.put(_END)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        if self.stats.frames == 0:
+            logger.error("No frames provided to save. Aborting.")
+            raise ValueError("No frames provided to save.")
+        logger.info(f"Successfully saved video to {self.output_video_path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.queue.put(_END)
+            self._thread.join()
+        return False
+
+
+class LiveFrameSource:
+    """A live feed: frames arrive at source rate whether or not anyone keeps up.
+
+    Reads a camera (an integer device index) or a video file played back in real time. A
+    background thread keeps only the newest frame, so a slow consumer misses frames instead of
+    falling further and further behind. Iterating yields (frame, capture_time) pairs, where
+    capture_time is a time.perf_counter() timestamp.
+    """
+
+    def __init__(self, video_path, fps=None):
+        self.video_path = video_path
+        self.is_camera = str(video_path).isdigit()
+        self.fps = fps
+        self.captured = 0
+        self.missed = 0     # Frames overwritten before the consumer took them
+        self._latest = None
+        self._done = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._opened = threading.Event()
+        self._thread = threading.Thread(target=self._capture_loop, name="LiveFrameSource", daemon=True)
+        self._thread.start()
+        self._opened.wait()
+
+    def _capture_loop(self):
+        cap = cv2.VideoCapture(int(self.video_path) if self.is_camera else self.video_path)
+        try:
+            if not cap.isOpened():
+                logger.error(f"Failed to open live source: {self.video_path}")
+                return
+            if self.fps is None:
+                self.fps = cap.get(cv2.CAP_PROP_FPS) or 24.0
+            self._opened.set()
+            start = time.perf_counter()
+            while not self._stop.is_set():
+                if not self.is_camera:
+                    # A file plays back at its frame rate, like a camera would deliver it
+                    delay = start + self.captured / self.fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                with profiler.stage("decode") as stage:
+                    ret, frame = cap.read()
+                    stage.frames = int(ret)
+                if not ret:
+                    break
+                with self._cond:
+                    if self._latest is not None:
+                        self.missed += 1
+                    self._latest = (frame, time.perf_counter())
+                    self.captured += 1
+                    self._cond.notify()
+        except Exception as e:
+            self._error = e
+        finally:
+            cap.release()
+            self._opened.set()
+            with self._cond:
+                self._done = True
+                self._cond.notify()
+
+    def __iter__(self):
+        logger.info(f"Opening live source at {self.fps} FPS: {self.video_path}")
+        while True:
+            with self._cond:
+                while self._latest is None and not self._done:
+                    self._cond.wait()
+                if self._latest is None:
+                    break
+                item, self._latest = self._latest, None
+            yield item
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self):
+        return f"[live source] {self.captured} frames captured at {self.fps or 0.0:.1f} FPS | {self.missed} missed (consumer too slow)"
@@ -1,41 +1,60 @@
+import itertools
 import cv2
 import numpy as np
-from typing import List
+from typing import Iterable, Iterator, List
 from utils.logger import logger
+from utils.profiler import profiler
 
 def read_video(video_path: str) -> List[np.ndarray]:
     """Reads a video and returns a list of frames."""
+    return list(iter_video(video_path))
+
+def video_frame_count(video_path: str):
+    """Frame count from the container header (no decoding), or None if the container does not say."""
+    cap = cv2.VideoCapture(video_path)
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+    cap.release()
+    return count if count > 0 else None
+
+def iter_video(video_path: str) -> Iterator[np.ndarray]:
+    """Lazily yields the frames of a video one at a time, so only one decoded frame is alive."""
     logger.info(f"Opening video file: {video_path}")
     cap = cv2.VideoCapture(video_path)
-    frames = []
     
     if not cap.isOpened():
         logger.error(f"Failed to open video file: {video_path}")
-        return frames
+        return
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        frames.append(frame)
-        
-    cap.release()
-    logger.info(f"Successfully read {len(frames)} frames from {video_path}")
-    return frames
+    frame_count = 0
+    try:
+        while True:
+            with profiler.stage("decode") as stage:
+                ret, frame = cap.read()
+                stage.frames = int(ret)
+            if not ret:
+                break
+            frame_count += 1
+            yield frame
+    finally:
+        cap.release()
+    logger.info(f"Successfully read {frame_count} frames from {video_path}")
 
-def save_video(output_video_frames: List[np.ndarray], output_video_path: str, fps: float = 24.0):
-    """Saves a list of frames to a video file."""
-    if not output_video_frames:
+def save_video(output_video_frames: Iterable[np.ndarray], output_video_path: str, fps: float = 24.0):
+    """Saves a list (or any iterable, e.g. a generator) of frames to a video file."""
+    frames = iter(output_video_frames)
+    first_frame = next(frames, None)
+    if first_frame is None:
         logger.error("No frames provided to save. Aborting.")
         raise ValueError("No frames provided to save.")
         
     logger.info(f"Initializing video writer for: {output_video_path} at {fps} FPS")
     fourcc = cv2.VideoWriter_fourcc(*'MJPG')
-    height, width, _ = output_video_frames[0].shape
+    height, width, _ = first_frame.shape
     out = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
     
-    for i, frame in enumerate(output_video_frames):
-        out.write(frame)
+    for frame in itertools.chain([first_frame], frames):
+        with profiler.stage("encode", frames=1):
+            out.write(frame)
         
     out.release()
-    logger.info(f"Successfully saved video to {output_video_path}")
\ No newline at end of file
+    logger.info(f"Successfully saved video to {output_video_path}")